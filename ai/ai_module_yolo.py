@@ -6,37 +6,117 @@ Replaces the old Haar + LBPH implementation with more robust detection and recog
 import cv2
 import os
 import numpy as np
-import pickle
-from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from typing import Any, Callable, Iterable, List, Tuple, Dict, Optional
 import warnings
 import urllib.request
 import sys
+import json
+import time
+import hashlib
+import importlib.metadata
+import importlib.util
+import re
+import logging
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings('ignore')
 
-# YOLOv8 imports
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
+# YOLOv8 / DeepFace are imported by FaceRecognizer.load_models (in parallel, possibly in the
+# background) rather than here, so importing this module stays fast
+YOLO = None
+YOLO_AVAILABLE = importlib.util.find_spec("ultralytics") is not None
+if not YOLO_AVAILABLE:
     print("[WARNING] ultralytics not installed. Install with: pip install ultralytics")
 
-# DeepFace imports
-try:
-    from deepface import DeepFace
-    DEEPFACE_AVAILABLE = True
-except ImportError:
-    DEEPFACE_AVAILABLE = False
+DeepFace = None
+DEEPFACE_AVAILABLE = importlib.util.find_spec("deepface") is not None
+if not DEEPFACE_AVAILABLE:
     print("[WARNING] deepface not installed. Install with: pip install deepface")
 
+
+def _import_ultralytics() -> bool:
+    global YOLO, YOLO_AVAILABLE
+    if YOLO is None and YOLO_AVAILABLE:
+        try:
+            from ultralytics import YOLO as yolo_class
+            YOLO = yolo_class
+        except Exception as e:
+            print(f"[WARNING] Failed to import ultralytics: {e}")
+            YOLO_AVAILABLE = False
+    return YOLO is not None
+
+
+def _import_deepface() -> bool:
+    global DeepFace, DEEPFACE_AVAILABLE
+    if DeepFace is None and DEEPFACE_AVAILABLE:
+        try:
+            from deepface import DeepFace as deepface_module
+            DeepFace = deepface_module
+        except Exception as e:
+            print(f"[WARNING] Failed to import deepface: {e}")
+            DEEPFACE_AVAILABLE = False
+    return DeepFace is not None
+
+
+_DEEPFACE_PREPROCESSING = None
+
+
+def _deepface_skip_preprocessing() -> Tuple[bool, bool]:
+    """
+    (letterbox, reverse_channels): how DeepFace.represent(detector_backend="skip") prepares a
+    crop in the installed deepface. 0.0.89 plain-resizes the BGR crop, 0.0.90-0.0.93 letterbox
+    it and reverse it to RGB, 0.0.94+ letterbox it and keep BGR (the reversal is undone on load).
+    Without deepface (ONNX-only installs) the current behavior is assumed.
+    """
+    global _DEEPFACE_PREPROCESSING
+    if _DEEPFACE_PREPROCESSING is None:
+        try:
+            version = tuple(int(part) for part in re.findall(r"\d+", importlib.metadata.version("deepface"))[:3])
+        except importlib.metadata.PackageNotFoundError:
+            version = None
+        if version is not None and version < (0, 0, 90):
+            _DEEPFACE_PREPROCESSING = (False, False)
+        elif version is not None and version < (0, 0, 94):
+            _DEEPFACE_PREPROCESSING = (True, True)
+        else:
+            _DEEPFACE_PREPROCESSING = (True, False)
+    return _DEEPFACE_PREPROCESSING
+
+
+from embedding_gallery import EmbeddingGallery
+from prototypes import select_prototypes
+from ann_index import IVFFlatIndex
+from embedding_store import EmbeddingStore
+import metrics
+from detection_profiles import ProfileRegistry
+from frame_gate import GateRegistry
+from embedding_cache import crop_key, make_embedding_cache
+from gallery_refresh import GalleryRefresh
+import face_quality
+from face_quality import QUALITY_ENABLED
+from face_alignment import CROP_MODE, align_faces, face_landmarks
+from face_detectors import FALLBACK_DETECTOR, build_fallback_detector, deepface_weights_path
+from inference_backends import (OnnxFaceDetector, OnnxArcFace, ONNX_YOLO_PATH, ONNX_ARCFACE_PATH,
+                                ONNX_PRECISION, onnx_model_path)
+
+logger = logging.getLogger("AI")
+
 DATASET_DIR = "dataset"
 FRAMES_DIR = "frames"  # Backend frames directory
-EMBEDDINGS_FILE = "encodings.npy"  # Store embeddings for known students (numpy format)
+EMBEDDINGS_FILE = "encodings.npy"  # Legacy pickled dict of embeddings (migrated automatically)
+LEGACY_PICKLE_FILE = "student_embeddings.pkl"  # Older legacy format (migrated automatically)
+EMBEDDINGS_STORE_DIR = "embeddings_store"  # Memory-mapped snapshot + append log (see embedding_store.py)
+TRAINING_CACHE_DIR = "training_cache"  # Per-frame embeddings so interrupted training can resume
+TRAIN_DECODE_WORKERS = 4  # Threads decoding enrollment frames in parallel
+TRAIN_BATCH_FRAMES = 16  # Frames per batched detection/embedding pass during training
+TRAIN_MIN_FACE_CONFIDENCE = 0.5  # Higher than MIN_FACE_CONFIDENCE to ensure quality references
+TRAIN_BEST_FRAMES = int(os.environ.get("AI_TRAIN_BEST_FRAMES", "40"))  # Highest-quality faces kept per student (0 = all)
 # YOLOv8-face model for face detection
 YOLO_MODEL_PATH = "yolov8n-face.pt"  # YOLOv8-face model specifically for faces
 YOLO_MODEL_URL = "https://github.com/derronqi/yolov8-face/releases/download/v0.0.0/yolov8n-face.pt"
 FACE_SIZE = (112, 112)  # Standard face size for ArcFace
+EMBEDDING_BATCH_SIZE = 32  # Max face crops per batched ArcFace forward pass
 # YOLO detection confidence thresholds
 # Note: 0.95 is too strict - YOLO typically returns 0.3-0.9 for faces
 # Using more reasonable thresholds that balance accuracy and detection rate
@@ -44,22 +124,163 @@ DETECTION_CONFIDENCE = 0.35  # Increased from 0.15 to reduce false positives
 MIN_FACE_CONFIDENCE = 0.45   # Lowered from 0.60 to be more inclusive but still quality
 RECOGNITION_THRESHOLD = 0.60  # Sweet spot (higher than 0.75, lower than 0.85)
 FRAME_MATCH_PERCENTAGE = 0.25  # If 25% of frames match, mark attendance
+# Multi-frame voting: frames go through detection/embedding in chunks, and voting stops as soon
+# as the leader's share is above FRAME_MATCH_PERCENTAGE with this confidence (Wilson lower bound)
+VOTE_CHUNK_FRAMES = 4
+VOTE_CONFIDENCE_Z = 1.96  # 95% confidence; higher = more frames before stopping early
+# Gallery search: "exact" (single matmul) or "ivf" (approximate, for multi-campus rosters)
+GALLERY_SEARCH_BACKEND = "exact"
+ANN_NPROBE = 32  # IVF buckets scanned per query - raise for recall, lower for latency
+ANN_MIN_GALLERY_SIZE = 20000  # Exact search is used below this many students
+# Inference backend: "default" (ultralytics + DeepFace/TensorFlow) or "onnx" (ONNX Runtime,
+# models exported with `python inference_backends.py export`)
+INFERENCE_BACKEND = os.environ.get("AI_INFERENCE_BACKEND", "default")
+# Startup
+OFFLINE_MODE = os.environ.get("AI_OFFLINE", "0") == "1"  # Never download model weights
+WARMUP_FRAME_SHAPE = (640, 640, 3)  # Dummy frame for the warm-up detection
 
 os.makedirs(DATASET_DIR, exist_ok=True)
 
 
+def wilson_lower_bound(successes: int, trials: int, z: float = VOTE_CONFIDENCE_Z) -> float:
+    """Lower end of the Wilson score interval for a proportion (0 when there are no trials)"""
+    if trials <= 0:
+        return 0.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = p + z * z / (2 * trials)
+    margin = z * np.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials))
+    return float((centre - margin) / denominator)
+
+
+def best_quality(scored: List[Tuple[Any, float]], limit: int = TRAIN_BEST_FRAMES) -> List[Tuple[Any, float]]:
+    """
+    The limit highest-quality (embedding, quality score) enrollment faces, best first
+    (stable sort: ties keep frame order). All of them, in frame order, when limit is 0 or not exceeded.
+    """
+    if limit > 0 and len(scored) > limit:
+        return sorted(scored, key=lambda item: -item[1])[:limit]
+    return scored
+
+
 class FaceRecognizer:
     """YOLO + ArcFace based face recognizer"""
     
-    def __init__(self):
+    def __init__(self, load_models: bool = True, offline: Optional[bool] = None, backend: Optional[str] = None,
+                 precision: Optional[str] = None, create_store: bool = True):
+        """
+        Args:
+            load_models: Load models now; pass False and call start_loading() to load them
+                in the background while the server starts
+            offline: Never download weights (default OFFLINE_MODE)
+            backend: "default" or "onnx" (default INFERENCE_BACKEND)
+            precision: ONNX model precision, "fp32" or "int8" (default ONNX_PRECISION)
+            create_store: Create or migrate the embedding store if it is missing; pass False in
+                processes that only load and sync it (see prepare_embedding_store)
+        """
         self.yolo_model = None
         self._model_logged = False  # Track if we've logged the active model
-        self.student_embeddings = {}  # {student_id: aggregated_embedding}
+        self._arcface_model = None  # Built by load_models (or lazily on first use)
+        self._arcface_lock = threading.Lock()
+        self.fallback_detector = None  # RetinaFace / OpenCV, built when YOLO is unavailable or fails
+        self._fallback_lock = threading.Lock()
+        self.offline = OFFLINE_MODE if offline is None else offline
+        self.backend = INFERENCE_BACKEND if backend is None else backend
+        self.precision = ONNX_PRECISION if precision is None else precision
+        self.ready = threading.Event()  # Set once models are loaded and warmed up
+        self.model_status = {"yolo": "pending", "arcface": "pending", "warmup": "pending"}
+        self.load_seconds: Dict[str, float] = {}
+        self.gallery = EmbeddingGallery(index=self._make_ann_index())  # Contiguous matrix of student prototype embeddings
+        self.crop_mode = CROP_MODE  # "aligned" or "box"; follows the store once it is loaded
+        self.store = EmbeddingStore(EMBEDDINGS_STORE_DIR, crop_mode=CROP_MODE)
+        self.create_store = create_store
+        self.profiles = ProfileRegistry.load()  # Per-camera detection settings (see detection_profiles.py)
+        self.gates = GateRegistry()  # Per-camera motion gating (see frame_gate.py)
+        self.embedding_cache = make_embedding_cache()  # Crop hash -> embedding (see embedding_cache.py)
+        self.refresh = GalleryRefresh(EMBEDDINGS_STORE_DIR)  # Online prototype updates (see gallery_refresh.py)
+        self._store_lock = threading.Lock()  # Training and refresh both append to the store
         
-        # Load YOLO model if available
-        if not YOLO_AVAILABLE:
+        # Load saved embeddings
+        self.load_embeddings()
+        
+        if load_models:
+            self.load_models()
+    
+    def load_models(self, warm_up: bool = True):
+        """
+        Load YOLO and ArcFace concurrently, then run a warm-up inference.
+        Sets self.ready when done (also when a model turned out to be unavailable).
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            loads = [executor.submit(self._timed_load, "yolo", self._load_yolo),
+                     executor.submit(self._timed_load, "arcface", self._load_arcface)]
+            for load in loads:
+                load.result()
+        if self.yolo_model is None:
+            self._timed_load("fallback_detector", lambda: self._get_fallback_detector() is not None)
+        if warm_up:
+            self._timed_load("warmup", self.warm_up)
+        self.load_seconds["total"] = round(time.perf_counter() - start, 3)
+        self.ready.set()
+        print(f"[AI] ✓ Models ready in {self.load_seconds['total']:.1f}s ({self.model_status})")
+    
+    def start_loading(self) -> threading.Thread:
+        """Run load_models in a background thread (wait on self.ready)"""
+        thread = threading.Thread(target=self.load_models, name="ai-model-loader", daemon=True)
+        thread.start()
+        return thread
+    
+    def _timed_load(self, name: str, loader: Callable[[], bool]):
+        self.model_status[name] = "loading"
+        start = time.perf_counter()
+        try:
+            self.model_status[name] = "loaded" if loader() else "unavailable"
+        except Exception as e:
+            print(f"[AI] ✗ Failed to load {name}: {e}")
+            self.model_status[name] = "failed"
+        self.load_seconds[name] = round(time.perf_counter() - start, 3)
+    
+    def status(self) -> Dict:
+        """Startup state for readiness probes"""
+        return {
+            "ready": self.ready.is_set(),
+            "models": dict(self.model_status),
+            "load_seconds": dict(self.load_seconds),
+            "offline": self.offline,
+            "backend": self.backend,
+            "precision": self.precision if self.backend == "onnx" else "fp32",
+            "gallery_size": self.gallery.student_count(),
+        }
+    
+    def _load_onnx(self, name: str, path: str, model_class):
+        """Load an exported ONNX model, or None (the default backend is used instead)"""
+        quantized_path = onnx_model_path(path, self.precision)
+        if os.path.exists(quantized_path):
+            path = quantized_path
+        elif quantized_path != path:
+            print(f"[AI] ⚠ {self.precision} {name} model not found: {quantized_path} - using fp32")
+        if not os.path.exists(path):
+            print(f"[AI] ⚠ ONNX {name} model not found: {path} - using the default backend")
+            return None
+        try:
+            model = model_class(path)
+            print(f"[AI] ✓ Loaded ONNX {name} model: {path}")
+            return model
+        except Exception as e:
+            print(f"[AI] ✗ Failed to load ONNX {name} model ({e}) - using the default backend")
+            return None
+    
+    def _load_yolo(self) -> bool:
+        """Load the YOLOv8-face model (local file, then download, then any .pt in the cwd)"""
+        if self.backend == "onnx":
+            self.yolo_model = self._load_onnx("YOLOv8-face", ONNX_YOLO_PATH, OnnxFaceDetector)
+            if self.yolo_model is not None:
+                return True
+        if not _import_ultralytics():
             print(f"[AI] ⚠ ultralytics not available - install with: pip install ultralytics")
-            print(f"[AI] Falling back to RetinaFace (if available)")
+            print(f"[AI] Falling back to the {FALLBACK_DETECTOR} face detector")
+            return False
         else:
             try:
                 model_loaded = False
@@ -84,8 +305,11 @@ class FaceRecognizer:
                             except:
                                 pass
                 
-                # Second: Auto-download if model doesn't exist
-                if not model_loaded:
+                # Second: Auto-download if model doesn't exist (never in offline mode)
+                if not model_loaded and self.offline:
+                    print(f"[AI] ⚠ YOLOv8-face model not found: {abs_model_path}")
+                    print(f"[AI] Offline mode: not downloading {YOLO_MODEL_PATH}")
+                elif not model_loaded:
                     print(f"[AI] ⚠ YOLOv8-face model not found: {abs_model_path}")
                     print(f"[AI] Attempting to auto-download yolov8n-face.pt...")
                     print(f"[AI] Source: {YOLO_MODEL_URL}")
@@ -148,31 +372,62 @@ class FaceRecognizer:
                 
                 if not model_loaded:
                     print(f"[AI] ⚠ YOLOv8-face model not available")
-                    print(f"[AI] System will use DeepFace RetinaFace detection")
-                    print(f"[AI] These work well, but YOLOv8-face provides better accuracy")
+                    print(f"[AI] System will use the {FALLBACK_DETECTOR} fallback face detector")
+                    print(f"[AI] YOLOv8-face provides better accuracy and throughput")
             except Exception as e:
                 print(f"[AI] ⚠ Failed to initialize YOLO: {e}")
                 import traceback
                 traceback.print_exc()
-        
-        # Load saved embeddings
-        self.load_embeddings()
+        return self.yolo_model is not None
+    
+    def _load_arcface(self) -> bool:
+        """Import DeepFace and build the ArcFace model"""
+        if self.backend == "onnx":
+            self._arcface_model = self._load_onnx("ArcFace", ONNX_ARCFACE_PATH, OnnxArcFace)
+            if self._arcface_model is not None:
+                return True
+        if not _import_deepface():
+            return False
+        if self.offline and not os.path.exists(deepface_weights_path("arcface_weights.h5")):
+            print(f"[AI] Offline mode: ArcFace weights not found at {deepface_weights_path('arcface_weights.h5')}")
+            return False
+        self._get_arcface_model()
+        return True
+    
+    def warm_up(self) -> bool:
+        """Run a dummy detection and embedding so the first real request skips graph building and allocation"""
+        if self.yolo_model is not None or self.fallback_detector:
+            self.detect_faces_yolo(np.zeros(WARMUP_FRAME_SHAPE, dtype=np.uint8))
+        if self._arcface_model is not None:
+            self.generate_embeddings([np.zeros(FACE_SIZE + (3,), dtype=np.uint8)])
+        return self.yolo_model is not None or bool(self.fallback_detector) or self._arcface_model is not None
+    
+    def _make_ann_index(self):
+        """Create the optional ANN index for the gallery (None = exact search only)"""
+        if GALLERY_SEARCH_BACKEND == "ivf":
+            return IVFFlatIndex(nprobe=ANN_NPROBE, min_gallery_size=ANN_MIN_GALLERY_SIZE)
+        return None
+    
+    @property
+    def student_embeddings(self) -> Dict[str, np.ndarray]:
+        """{gallery key: embedding} view of the gallery (kept for backward compatibility)"""
+        return self.gallery.as_dict()
     
-    def detect_faces_yolo(self, frame: np.ndarray, min_conf: float = None) -> List[Tuple[int, int, int, int, float]]:
+    @student_embeddings.setter
+    def student_embeddings(self, embeddings: Dict[str, np.ndarray]):
+        self.gallery = EmbeddingGallery.from_dict(embeddings, index=self._make_ann_index())
+    
+    def detect_faces_yolo(self, frame: np.ndarray, min_conf: float = None) -> List[Tuple]:
         """
         Detect faces using YOLOv8-face.
-        Falls back to DeepFace RetinaFace (best), then Haar cascade if YOLO is not available.
+        Falls back to RetinaFace, then OpenCV (see face_detectors.py) if YOLO is not available.
         Filters out low-confidence detections based on MIN_FACE_CONFIDENCE.
-        Returns list of (x1, y1, x2, y2, confidence) tuples.
+        Returns list of (x1, y1, x2, y2, confidence, landmarks) tuples; landmarks are the
+        5 (x, y) face keypoints in frame pixels (see face_alignment.py) or None.
         """
         if self.yolo_model is None:
-            # Try DeepFace RetinaFace first (best face detector)
-            if DEEPFACE_AVAILABLE:
-                print("[AI] YOLO model not loaded, using DeepFace RetinaFace detector...")
-                return self._detect_faces_retinaface(frame, min_conf)
-            # Fallback to nothing if RetinaFace also fails/not available
-            print("[AI] YOLO model not loaded, standard detection unavailable.")
-            return []
+            logger.debug("YOLO model not loaded, using the fallback face detector")
+            return self._detect_faces_fallback(frame, min_conf)
         
         if min_conf is None:
             min_conf = MIN_FACE_CONFIDENCE
@@ -183,39 +438,12 @@ class FaceRecognizer:
             if not self._model_logged and self.yolo_model:
                 try:
                     # Log the actual model file being used
-                    print(f"[AI] DEBUG: Performing detection using model file: {self.yolo_model.model.pt_path}")
+                    print(f"[AI] DEBUG: Performing detection using model file: {getattr(self.yolo_model, 'model_path', None) or self.yolo_model.model.pt_path}")
                     self._model_logged = True
                 except:
                     print(f"[AI] DEBUG: Performing detection using YOLO model (path check failed)")
             
-            results = self.yolo_model(frame, conf=DETECTION_CONFIDENCE, verbose=False)
-            detections = []
-            all_detections_raw = []  # Store all detections for logging
-            
-            for result in results:
-                boxes = result.boxes
-                if boxes is None or len(boxes) == 0:
-                    continue
-                
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    confidence = float(box.conf[0].cpu().numpy())
-                    all_detections_raw.append(confidence)
-                    
-                    # Filter based on minimum confidence threshold
-                    if confidence >= min_conf:
-                        detections.append((int(x1), int(y1), int(x2), int(y2), confidence))
-            
-            # Log detection statistics for debugging
-            if len(all_detections_raw) > 0:
-                max_conf = max(all_detections_raw)
-                # avg_conf = sum(all_detections_raw) / len(all_detections_raw)
-                # print(f"[AI] YOLOv8-face detected {len(all_detections_raw)} faces (max conf: {max_conf:.3f})")
-                
-                if len(detections) == 0:
-                    # Try with even lower threshold if no faces passed
-                    # print(f"[AI] No faces passed {min_conf} threshold, trying with lower threshold...")
-                    pass
+            detections = self._run_yolo([frame], min_conf)[0]
             
             if len(detections) == 0:
                 # Optional: Failover to RetinaFace if YOLO finds nothing? 
@@ -224,93 +452,132 @@ class FaceRecognizer:
             
             return detections
         except Exception as e:
-            print(f"[AI] Error in YOLO detection: {e}")
-            import traceback
-            traceback.print_exc()
-            # Fallback to RetinaFace on error
-            return self._detect_faces_retinaface(frame, min_conf)
+            logger.exception(f"Error in YOLO detection: {e}")
+            # Fallback detector on error
+            return self._detect_faces_fallback(frame, min_conf)
+    
+    def _run_yolo(self, frames: List[np.ndarray], min_conf: float, imgsz: Optional[int] = None) -> List[List[Tuple]]:
+        """One detector call over the frames (ultralytics or ONNX Runtime), detections per frame"""
+        if isinstance(self.yolo_model, OnnxFaceDetector):
+            return [
+                [(int(x1), int(y1), int(x2), int(y2), float(conf), kps) for (x1, y1, x2, y2, conf), kps
+                 in zip(boxes[:, :5], self._onnx_keypoints(boxes)) if conf >= min_conf]
+                for boxes in self.yolo_model.detect(frames, conf=DETECTION_CONFIDENCE, imgsz=imgsz)
+            ]
+        options = {"imgsz": imgsz} if imgsz else {}
+        results = self.yolo_model(frames[0] if len(frames) == 1 else list(frames), conf=DETECTION_CONFIDENCE,
+                                  verbose=False, **options)
+        return [self._parse_yolo_boxes(result, min_conf) for result in results]
+    
+    @staticmethod
+    def _onnx_keypoints(boxes: np.ndarray) -> List[Optional[np.ndarray]]:
+        """(5, 2) landmarks of each decoded ONNX row ((x, y, visibility) * 5 after the box), or None"""
+        if boxes.shape[1] < 20:
+            return [None] * len(boxes)
+        return list(boxes[:, 5:20].reshape(-1, 5, 3)[:, :, :2])
+    
+    def _parse_yolo_boxes(self, result, min_conf: float) -> List[Tuple]:
+        """Convert one ultralytics result into (x1, y1, x2, y2, confidence, landmarks) tuples above min_conf"""
+        detections = []
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return detections
+        
+        xyxy = boxes.xyxy.cpu().numpy()
+        confs = boxes.conf.cpu().numpy()
+        # yolov8-face is a pose model: 5 keypoints per box (eyes, nose, mouth corners)
+        keypoints = getattr(result, "keypoints", None)
+        landmarks = keypoints.xy.cpu().numpy() if keypoints is not None else None
+        if landmarks is None or landmarks.shape[:2] != (len(xyxy), 5):
+            landmarks = [None] * len(xyxy)
+        for (x1, y1, x2, y2), confidence, kps in zip(xyxy, confs, landmarks):
+            # Filter based on minimum confidence threshold
+            if confidence >= min_conf:
+                detections.append((int(x1), int(y1), int(x2), int(y2), float(confidence), kps))
+        return detections
     
-    def _detect_faces_retinaface(self, frame: np.ndarray, min_conf: float = None) -> List[Tuple[int, int, int, int, float]]:
+    def detect_faces_yolo_batch(self, frames: List[np.ndarray], min_conf: float = None,
+                                profiles: Optional[List] = None) -> List[List[Tuple[int, int, int, int, float]]]:
         """
-        Detect faces using DeepFace's RetinaFace detector (most accurate face detector).
-        This uses DeepFace's built-in face detection which is more robust than YOLO for faces.
-        Returns list of (x1, y1, x2, y2, confidence) tuples.
+        Detect faces in several frames with a single YOLO call.
+        Args:
+            profiles: Optional DetectionProfile per frame (None entries use the full frame)
+        Returns one detection list per frame, in the same format as detect_faces_yolo.
         """
-        if not DEEPFACE_AVAILABLE:
-            return []
+        if profiles and any(profiles):
+            return self._detect_with_profiles(frames, profiles, min_conf)
+        if self.yolo_model is None or len(frames) <= 1:
+            return [self.detect_faces_yolo(frame, min_conf) for frame in frames]
         
         if min_conf is None:
-            min_conf = 0.5  # Default confidence for RetinaFace
+            min_conf = MIN_FACE_CONFIDENCE
         
         try:
-            # Try to use DeepFace's RetinaFace detector via functions module
-            try:
-                from deepface.commons import functions
-                
-                # Create a temporary file for DeepFace (works better with file paths)
-                import tempfile
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-                    cv2.imwrite(tmp_file.name, frame)
-                    tmp_path = tmp_file.name
-                
+            return self._run_yolo(frames, min_conf)
+        except Exception as e:
+            logger.warning(f"Error in batched YOLO detection, falling back to per-frame: {e}")
+            return [self.detect_faces_yolo(frame, min_conf) for frame in frames]
+    
+    def _detect_with_profiles(self, frames: List[np.ndarray], profiles: List, min_conf: float = None) -> List[List[Tuple[int, int, int, int, float]]]:
+        """
+        Detection following per-frame DetectionProfiles: ROI crops and tiles of every frame
+        that share an inference size go through one detector call, then are merged per frame.
+        """
+        if min_conf is None:
+            min_conf = MIN_FACE_CONFIDENCE
+        
+        frame_crops = [profile.crops(frame) if profile else [frame] for frame, profile in zip(frames, profiles)]
+        groups: Dict[Optional[int], List[Tuple[int, int]]] = {}  # imgsz -> [(frame index, crop index)]
+        for f, (crops, profile) in enumerate(zip(frame_crops, profiles)):
+            groups.setdefault(profile.imgsz if profile else None, []).extend((f, c) for c in range(len(crops)))
+        
+        crop_detections = [[None] * len(crops) for crops in frame_crops]
+        for imgsz, members in groups.items():
+            crops = [frame_crops[f][c] for f, c in members]
+            if self.yolo_model is None:
+                found = [self._detect_faces_fallback(crop, min_conf) for crop in crops]
+            else:
                 try:
-                            # Use DeepFace's functions to extract faces with RetinaFace
-                    detector_backend = "retinaface"
-                    
-                    # Build detector model
-                    # detector_model = functions.build_model(detector_backend)
-                    
-                    # Detect faces - this returns list of dicts with facial_area
-                    img_objs = functions.extract_faces(
-                        img_path=tmp_path,
-                        detector_backend=detector_backend,
-                        grayscale=False,
-                        enforce_detection=False,
-                        align=False
-                    )
-                    
-                    detections = []
-                    # img_objs is a list - each element can be a dict with facial_area or just the face image
-                    # If it's a dict, extract coordinates; if it's just an image, we can't get coordinates easily
-                    for idx, img_obj in enumerate(img_objs):
-                        if isinstance(img_obj, dict):
-                            if 'facial_area' in img_obj:
-                                region = img_obj['facial_area']
-                                x = int(region.get('x', 0))
-                                y = int(region.get('y', 0))
-                                w = int(region.get('w', 0))
-                                h = int(region.get('h', 0))
-                                confidence = float(region.get('confidence', 0.95))
-                                
-                                if confidence >= min_conf and w > 20 and h > 20:
-                                    detections.append((x, y, x + w, y + h, confidence))
-                    
-                    if detections:
-                        # conf_str = ", ".join([f"{d[4]:.3f}" for d in detections])
-                        # print(f"[AI] RetinaFace detected {len(detections)} face(s)")
-                        os.unlink(tmp_path)
-                        return detections
-                    
-                    os.unlink(tmp_path)
-                except Exception as e2:
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
-                    # print(f"[AI] RetinaFace error: {e2}")
-                    
-            except ImportError as import_err:
-                print(f"[AI] DeepFace functions module not available: {import_err}")
-            except Exception as e:
-                print(f"[AI] RetinaFace detection error: {e}")
-            
-            # Fallback to nothing
+                    found = self._run_yolo(crops, min_conf, imgsz)
+                except Exception as e:
+                    logger.warning(f"Error in YOLO detection with detection profiles, using the fallback detector: {e}")
+                    found = [self._detect_faces_fallback(crop, min_conf) for crop in crops]
+            for (f, c), detections in zip(members, found):
+                crop_detections[f][c] = detections
+        
+        return [profile.merge(frame.shape, detections) if profile else detections[0]
+                for frame, profile, detections in zip(frames, profiles, crop_detections)]
+    
+    def _get_fallback_detector(self):
+        """Build the fallback detector once (None if none can be built)"""
+        if self.fallback_detector is None:
+            with self._fallback_lock:
+                if self.fallback_detector is None:
+                    try:
+                        self.fallback_detector = build_fallback_detector(offline=self.offline)
+                    except Exception as e:
+                        print(f"[AI] ✗ No fallback face detector available: {e}")
+                        self.fallback_detector = False  # Don't retry on every frame
+        return self.fallback_detector or None
+    
+    def _detect_faces_fallback(self, frame: np.ndarray, min_conf: float = None) -> List[Tuple]:
+        """
+        Detect faces on the in-memory frame with the fallback detector (RetinaFace or OpenCV).
+        Returns list of (x1, y1, x2, y2, confidence[, landmarks]) tuples.
+        """
+        detector = self._get_fallback_detector()
+        if detector is None:
             return []
-            
+        
+        if min_conf is None:
+            min_conf = 0.5  # Default confidence for the fallback detectors
+        
+        try:
+            return detector.detect(frame, min_conf)
         except Exception as e:
-            print(f"[AI] Error in RetinaFace detection: {e}")
+            print(f"[AI] Error in {detector.name} detection: {e}")
             return []
     
-
-    
     def preprocess_face(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
         """
         Preprocess face: Crop with margin, but KEEP ORIGINAL RESOLUTION.
@@ -350,6 +617,27 @@ class FaceRecognizer:
         # Pass the high-quality BGR crop directly to DeepFace
         return face_crop
     
+    def face_crops(self, frame: np.ndarray, detections: List[Tuple]) -> List[Optional[np.ndarray]]:
+        """
+        Embedder input for each detection of one frame.
+        Detections carrying landmarks are aligned to the ArcFace template in one batched warp
+        (FACE_SIZE, so the embedder skips its resize); the others fall back to preprocess_face.
+        Returns one BGR uint8 crop (or None) per detection.
+        """
+        crops: List[Optional[np.ndarray]] = [None] * len(detections)
+        aligned_idx = []
+        if self.crop_mode == "aligned":
+            landmarks = [face_landmarks(d) for d in detections]
+            aligned_idx = [i for i, kps in enumerate(landmarks) if kps is not None and kps.shape == (5, 2)]
+            if aligned_idx:
+                aligned = align_faces(frame, np.stack([landmarks[i] for i in aligned_idx]), FACE_SIZE)
+                for i, face in zip(aligned_idx, aligned):
+                    crops[i] = face
+        for i, d in enumerate(detections):
+            if crops[i] is None:
+                crops[i] = self.preprocess_face(frame, d[:4])
+        return crops
+    
     def generate_embedding(self, face_img: np.ndarray) -> Optional[np.ndarray]:
         """
         Generate ArcFace embedding for a face image.
@@ -358,9 +646,23 @@ class FaceRecognizer:
         Returns:
             Embedding vector or None
         """
-        if not DEEPFACE_AVAILABLE:
+        if isinstance(self._arcface_model, OnnxArcFace):
+            return self.generate_embeddings([face_img])[0]
+        if not self._embedder_available():
             return None
         
+        key = crop_key(face_img) if self.embedding_cache is not None else None
+        if key is not None:
+            cached = self.embedding_cache.get(key)
+            if cached is not None:
+                return cached
+        embedding = self._represent(face_img)
+        if key is not None and embedding is not None:
+            self.embedding_cache.put(key, embedding)
+        return embedding
+    
+    def _represent(self, face_img: np.ndarray) -> Optional[np.ndarray]:
+        """One crop through DeepFace.represent (unit-normalized embedding or None)"""
         try:
             # Generate embedding using ArcFace
             # Pass BGR image directly (DeepFace handles BGR/RGB conversion if needed, usually expects RGB or BGR path)
@@ -390,12 +692,142 @@ class FaceRecognizer:
             # print(f"[AI] Error generating embedding: {e}")
             return None
     
+    def _embedder_available(self) -> bool:
+        """DeepFace is importable and (in offline mode) ArcFace weights are already on disk"""
+        if self._arcface_model is not None:
+            return True
+        if not _import_deepface():
+            return False
+        return not self.offline or os.path.exists(deepface_weights_path("arcface_weights.h5"))
+    
+    def _get_arcface_model(self):
+        """Build (once) and return the underlying ArcFace Keras model used by DeepFace"""
+        with self._arcface_lock:
+            if self._arcface_model is None:
+                _import_deepface()
+                model = DeepFace.build_model("ArcFace")
+                # DeepFace >= 0.0.86 wraps the Keras model in a client object
+                self._arcface_model = getattr(model, "model", model)
+        return self._arcface_model
+    
+    def _arcface_input(self, face_img: np.ndarray) -> np.ndarray:
+        """
+        Prepare a BGR crop exactly like DeepFace.represent(detector_backend="skip") does in the
+        installed deepface (see _deepface_skip_preprocessing): optional channel reversal,
+        letterbox-resize to FACE_SIZE keeping aspect ratio with zero padding (plain resize in
+        0.0.89), then scale to [0, 1].
+        Returns a (112, 112, 3) float32 array.
+        """
+        letterbox, reverse_channels = _deepface_skip_preprocessing()
+        img = np.ascontiguousarray(face_img[:, :, ::-1]) if reverse_channels else face_img
+        target_h, target_w = FACE_SIZE
+        if img.shape[:2] == FACE_SIZE:
+            pass  # Already aligned to the template size (face_crops): the resize is the identity
+        elif not letterbox:
+            img = cv2.resize(img, (target_w, target_h))
+        else:
+            factor = min(target_h / img.shape[0], target_w / img.shape[1])
+            img = cv2.resize(img, (int(img.shape[1] * factor), int(img.shape[0] * factor)))
+            diff_h = target_h - img.shape[0]
+            diff_w = target_w - img.shape[1]
+            img = np.pad(
+                img,
+                ((diff_h // 2, diff_h - diff_h // 2), (diff_w // 2, diff_w - diff_w // 2), (0, 0)),
+                "constant"
+            )
+            if img.shape[:2] != FACE_SIZE:
+                img = cv2.resize(img, (target_w, target_h))
+        img = img.astype(np.float32)
+        # Same condition as DeepFace: crops that are already in [0, 1] are not rescaled
+        if img.max() > 1:
+            img /= 255
+        return img
+    
+    def generate_embeddings(self, face_imgs: List[np.ndarray], batch_size: int = None) -> List[Optional[np.ndarray]]:
+        """
+        Generate ArcFace embeddings for many face crops with batched forward passes.
+        Produces the same normalized vectors as generate_embedding, one forward pass per
+        batch_size crops instead of one per crop.
+        Args:
+            face_imgs: List of BGR face crops (uint8), any size
+            batch_size: Max crops per forward pass (default EMBEDDING_BATCH_SIZE)
+        Returns:
+            List of embedding vectors (or None for failed crops), aligned with face_imgs
+        """
+        if not face_imgs or not self._embedder_available():
+            return [None] * len(face_imgs)
+        if self.embedding_cache is None:
+            return self._compute_embeddings(face_imgs, batch_size)
+        
+        # Only crops the cache has not seen go through the model
+        keys = [crop_key(img) for img in face_imgs]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self._compute_embeddings([face_imgs[i] for i in missing], batch_size)
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                if embedding is not None:
+                    self.embedding_cache.put(keys[i], embedding)
+        return embeddings
+    
+    def _compute_embeddings(self, face_imgs: List[np.ndarray], batch_size: int = None) -> List[Optional[np.ndarray]]:
+        """Batched ArcFace forward passes over face_imgs (no cache)"""
+        if batch_size is None:
+            batch_size = EMBEDDING_BATCH_SIZE
+        batch_size = max(1, batch_size)
+        
+        try:
+            model = self._get_arcface_model()
+            embeddings = []
+            for start in range(0, len(face_imgs), batch_size):
+                batch = np.stack([self._arcface_input(img) for img in face_imgs[start:start + batch_size]])
+                output = model(batch, training=False)
+                output = np.asarray(output.numpy() if hasattr(output, "numpy") else output, dtype=np.float32)
+                norms = np.linalg.norm(output, axis=1, keepdims=True)
+                output = np.divide(output, norms, out=output, where=norms > 0)
+                embeddings.extend(output)
+            return embeddings
+        except Exception as e:
+            logger.warning(f"Batched embedding failed, falling back to per-face: {e}")
+            if isinstance(self._arcface_model, OnnxArcFace):
+                return [None] * len(face_imgs)
+            return [self._represent(img) for img in face_imgs]
+    
     def cosine_similarity(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
         """Calculate cosine similarity between two embeddings"""
         # Both should already be normalized
         similarity = np.dot(emb1, emb2)
         return max(0.0, min(1.0, similarity))  # Clamp to [0, 1]
     
+    def match_embeddings(self, embeddings: np.ndarray, log_top_k: int = 0, runner_up: bool = False) -> List[Tuple]:
+        """
+        Match a batch of embeddings against the whole gallery in one matmul.
+        Args:
+            embeddings: (num_faces, dim) array of normalized embeddings
+            log_top_k: If > 0, log up to this many candidates with similarity > 0.5 (debugging accuracy)
+            runner_up: Also return the similarity of the second-best student
+        Returns:
+            List of (best_student_id, similarity) per embedding, or (best_student_id, similarity,
+            runner_up_similarity) with runner_up; (None, 0.0) if the gallery is empty or no
+            student is more similar than 0 (the gallery clamps similarities to [0, 1])
+        """
+        if not logger.isEnabledFor(logging.DEBUG):
+            log_top_k = 0
+        metrics.set_gallery_size(self.gallery.student_count())
+        matches = self.gallery.search(embeddings, top_k=max(2 if runner_up else 1, log_top_k))
+        best = []
+        for candidates in matches:
+            if log_top_k:
+                for student_id, similarity in candidates:
+                    if similarity > 0.5:
+                        logger.debug(f"Similarity with {student_id}: {similarity:.4f}")
+            match = candidates[0] if candidates and candidates[0][1] > 0 else (None, 0.0)
+            if runner_up:
+                match = (*match, candidates[1][1] if len(candidates) > 1 else 0.0)
+            best.append(match)
+        return best
+    
     def aggregate_embeddings(self, embeddings: List[np.ndarray], method: str = "median") -> Optional[np.ndarray]:
         """
         Aggregate multiple embeddings into one.
@@ -422,12 +854,68 @@ class FaceRecognizer:
         
         return aggregated
     
-    def train_from_frames(self, frames_dir: str, student_id: str) -> bool:
+    def _embedding_config(self) -> Dict:
+        """Settings that change which faces a frame yields and the embeddings they produce"""
+        return {
+            "backend": self.backend,
+            "precision": self.precision if self.backend == "onnx" else None,
+            "preprocessing": _deepface_skip_preprocessing(),
+            "crop_mode": self.crop_mode,
+            "quality": [face_quality.QUALITY_MIN_SIZE, face_quality.QUALITY_MIN_SHARPNESS,
+                        face_quality.QUALITY_MIN_BRIGHTNESS, face_quality.QUALITY_MAX_BRIGHTNESS,
+                        face_quality.QUALITY_MAX_YAW] if QUALITY_ENABLED else None,
+        }
+    
+    def _training_cache_path(self, frames_dir: str, student_id: str) -> str:
+        # Keyed by the embedding config too, so changing backend, precision, alignment or quality
+        # gating never resumes from embeddings computed under the old settings
+        source = json.dumps([os.path.abspath(frames_dir), self._embedding_config()], sort_keys=True)
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(TRAINING_CACHE_DIR, f"{student_id}-{digest}.npz")
+    
+    def _load_training_cache(self, path: str) -> Dict[str, Optional[Tuple[np.ndarray, float]]]:
+        """{frame key: (embedding, quality score), or None if the frame had no usable face}"""
+        if not os.path.exists(path):
+            return {}
+        try:
+            data = np.load(path, allow_pickle=False)
+            keys = json.loads(str(data["keys"]))
+            has_face = data["has_face"]
+            embeddings = data["embeddings"]
+            # Caches written before quality scoring rank all their faces equally
+            quality = data["quality"] if "quality" in data.files else np.ones(len(keys), dtype=np.float32)
+            return {k: ((embeddings[i], float(quality[i])) if has_face[i] else None) for i, k in enumerate(keys)}
+        except Exception as e:
+            print(f"[AI] Ignoring unreadable training cache {path}: {e}")
+            return {}
+    
+    def _save_training_cache(self, path: str, cache: Dict[str, Optional[Tuple[np.ndarray, float]]]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        keys = list(cache.keys())
+        dim = next((len(v[0]) for v in cache.values() if v is not None), 0)
+        embeddings = np.zeros((len(keys), dim), dtype=np.float32)
+        quality = np.zeros(len(keys), dtype=np.float32)
+        has_face = np.zeros(len(keys), dtype=bool)
+        for i, k in enumerate(keys):
+            if cache[k] is not None:
+                embeddings[i], quality[i] = cache[k]
+                has_face[i] = True
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, keys=json.dumps(keys), embeddings=embeddings, has_face=has_face, quality=quality)
+        os.replace(tmp_path, path)
+    
+    def train_from_frames(self, frames_dir: str, student_id: str,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          lock=None) -> bool:
         """
         Train model from frames directory.
+        Frames are decoded in parallel, detected and embedded in batches, and every processed
+        frame's embedding is checkpointed, so an interrupted run resumes where it stopped.
         Args:
             frames_dir: Path to frames directory (e.g., "frames/696230c059be41d32ea65c4a")
             student_id: Student ID
+            progress: Optional callback(frames_done, frames_total)
+            lock: Optional lock held around model calls (shared with live recognition)
         """
         frames_dir = os.path.abspath(frames_dir)
         if not os.path.exists(frames_dir):
@@ -445,58 +933,56 @@ class FaceRecognizer:
         
         print(f"[AI] Found {len(frame_files)} frame files")
         
-        all_embeddings = []
-        frames_with_faces = 0
+        # Frames are keyed by name, size and mtime so replaced frames are re-processed
+        def frame_key(frame_file):
+            st = os.stat(os.path.join(frames_dir, frame_file))
+            return f"{frame_file}:{st.st_size}:{int(st.st_mtime)}"
         
-        # Process each frame
-        processed_count = 0
-        for idx, frame_file in enumerate(frame_files):
-            frame_path = os.path.join(frames_dir, frame_file)
-            frame = cv2.imread(frame_path)
-            
-            if frame is None:
-                print(f"[AI] Failed to read frame: {frame_file}")
-                continue
-            
-            processed_count += 1
-            
-            # Detect faces using YOLO (use higher threshold for training to ensure high-quality reference)
-            detections = self.detect_faces_yolo(frame, min_conf=0.5)  # Increased from 0.3 to ensure quality
-            
-            if not detections:
-                if idx < 5 or idx % 10 == 0:  # Log first few and every 10th
-                    print(f"[AI] Frame {idx+1}/{len(frame_files)} ({frame_file}): No faces detected")
-                continue
-            
-            # Use largest face (first detection after sorting by area)
-            detections_sorted = sorted(
-                detections,
-                key=lambda d: (d[2] - d[0]) * (d[3] - d[1]),
-                reverse=True
-            )
-            largest_detection = detections_sorted[0]
-            
-            # Preprocess face
-            face_preprocessed = self.preprocess_face(frame, largest_detection[:4])
-            
-            if face_preprocessed is None:
-                print(f"[AI] Frame {idx+1}: Failed to preprocess face")
-                continue
-            
-            # Generate embedding
-            embedding = self.generate_embedding(face_preprocessed)
-            
-            if embedding is not None:
-                all_embeddings.append(embedding)
-                frames_with_faces += 1
-                if frames_with_faces <= 5:  # Log first few successes
-                    print(f"[AI] Frame {idx+1}/{len(frame_files)}: Successfully processed face")
-            else:
-                print(f"[AI] Frame {idx+1}: Failed to generate embedding")
+        keys = [frame_key(f) for f in frame_files]
+        cache_path = self._training_cache_path(frames_dir, student_id)
+        cached = self._load_training_cache(cache_path)
+        cache = {k: cached[k] for k in keys if k in cached}
+        todo = [(f, k) for f, k in zip(frame_files, keys) if k not in cache]
+        if cache:
+            print(f"[AI] Resuming: {len(cache)}/{len(frame_files)} frames already processed")
+        if progress:
+            progress(len(cache), len(frame_files))
+        
+        processed_count = len(cache)
+        with ThreadPoolExecutor(max_workers=TRAIN_DECODE_WORKERS) as decoder:
+            for start in range(0, len(todo), TRAIN_BATCH_FRAMES):
+                chunk = todo[start:start + TRAIN_BATCH_FRAMES]
+                # Parallel decode (cv2.imread releases the GIL)
+                frames = list(decoder.map(lambda item: cv2.imread(os.path.join(frames_dir, item[0])), chunk))
+                
+                valid = []
+                for (frame_file, key), frame in zip(chunk, frames):
+                    if frame is None:
+                        print(f"[AI] Failed to read frame: {frame_file}")
+                        cache[key] = None
+                    else:
+                        valid.append((key, frame))
+                
+                if valid:
+                    if lock is not None:
+                        with lock:
+                            embeddings = self._embed_training_frames([frame for _, frame in valid], with_quality=True)
+                    else:
+                        embeddings = self._embed_training_frames([frame for _, frame in valid], with_quality=True)
+                    for (key, _), embedding in zip(valid, embeddings):
+                        cache[key] = embedding
+                
+                processed_count += len(chunk)
+                self._save_training_cache(cache_path, cache)
+                if progress:
+                    progress(processed_count, len(frame_files))
         
         print(f"[AI] Processed {processed_count}/{len(frame_files)} frames")
         
-        if not all_embeddings:
+        scored = [cache[k] for k in keys if cache.get(k) is not None]
+        frames_with_faces = len(scored)
+        
+        if not scored:
             print(f"[AI] ERROR: No faces detected in any of {processed_count} processed frames for {student_id}")
             print(f"[AI] Troubleshooting:")
             print(f"   - Check if frames contain clear, frontal faces")
@@ -506,31 +992,73 @@ class FaceRecognizer:
         
         print(f"[AI] Detected faces in {frames_with_faces}/{len(frame_files)} frames")
         
-        # Aggregate embeddings (use median for robustness)
-        aggregated_embedding = self.aggregate_embeddings(all_embeddings, method="median")
+        scored = best_quality(scored)
+        if len(scored) < frames_with_faces:
+            print(f"[AI] Using the {len(scored)} highest-quality of {frames_with_faces} faces "
+                  f"(quality >= {scored[-1][1]:.2f})")
+        all_embeddings = [embedding for embedding, _ in scored]
         
-        if aggregated_embedding is None:
-            return False
+        # Cluster into up to MAX_PROTOTYPES prototypes (a single median when enrollment is unimodal)
+        prototypes = select_prototypes(all_embeddings)
         
-        # Store aggregated embedding for this student
-        self.student_embeddings[student_id] = aggregated_embedding
+        if prototypes is None:
+            return False
         
-        # Save embeddings to file
-        self.save_embeddings()
+        # Replace this student's rows and append them to the embedding store (no full rewrite)
+        with self._store_lock:
+            for key in self.gallery.set_prototypes(student_id, prototypes):
+                self.persist_embedding(key)
+            if self.refresh is not None:
+                self.refresh.set_anchors(student_id, prototypes)  # New drift reference for online refresh
         
-        print(f"[AI] ✓ Trained student {student_id} with {len(all_embeddings)} face embeddings")
+        print(f"[AI] ✓ Trained student {student_id} with {len(all_embeddings)} face embeddings "
+              f"({len(prototypes)} prototype{'s' if len(prototypes) != 1 else ''})")
         return True
     
+    def _embed_training_frames(self, frames: List[np.ndarray], with_quality: bool = False) -> List[Optional[Any]]:
+        """
+        Largest face of each enrollment frame -> embedding (None if no usable face).
+        Faces below the quality floors (see face_quality.py) are not embedded.
+        with_quality: Return (embedding, quality score) tuples instead of bare embeddings
+        """
+        detections = self.detect_faces_yolo_batch(frames, min_conf=TRAIN_MIN_FACE_CONFIDENCE)
+        crops = []
+        crop_idx = []
+        for i, (frame, dets) in enumerate(zip(frames, detections)):
+            if not dets:
+                continue
+            # Use largest face
+            largest = max(dets, key=lambda d: (d[2] - d[0]) * (d[3] - d[1]))
+            face = self.face_crops(frame, [largest])[0]
+            if face is None:
+                continue
+            if QUALITY_ENABLED:
+                quality = face_quality.gate(face, largest)
+                if not quality["usable"]:
+                    continue
+            else:
+                quality = face_quality.assess(face, largest, face_landmarks(largest))
+            crops.append(face)
+            crop_idx.append((i, quality["score"]))
+        
+        embeddings: List[Optional[Any]] = [None] * len(frames)
+        for (i, score), embedding in zip(crop_idx, self.generate_embeddings(crops)):
+            if embedding is not None:
+                embeddings[i] = (embedding, score) if with_quality else embedding
+        return embeddings
+    
     def recognize_face(self, frame: np.ndarray) -> Optional[str]:
         """
         Recognize face from a single frame.
         Returns student_id if recognized, None otherwise.
         """
-        if not self.student_embeddings:
+        if len(self.gallery) == 0:
             return None
         
         # Detect faces
-        detections = self.detect_faces_yolo(frame)
+        with metrics.stage("detect"):
+            detections = self.detect_faces_yolo(frame)
+        metrics.record_faces(len(detections))
         
         if not detections:
             return None
@@ -544,30 +1072,22 @@ class FaceRecognizer:
         largest_detection = detections_sorted[0]
         
         # Preprocess face
-        face_preprocessed = self.preprocess_face(frame, largest_detection[:4])
+        with metrics.stage("preprocess"):
+            face_preprocessed = self.face_crops(frame, [largest_detection])[0]
         
         if face_preprocessed is None:
             return None
         
         # Generate embedding
-        query_embedding = self.generate_embedding(face_preprocessed)
+        with metrics.stage("embed"):
+            query_embedding = self.generate_embedding(face_preprocessed)
         
         if query_embedding is None:
             return None
         
-        # Compare with known embeddings
-        best_match = None
-        best_similarity = 0.0
-        
-        for student_id, known_embedding in self.student_embeddings.items():
-            similarity = self.cosine_similarity(query_embedding, known_embedding)
-            # Log all comparisons for debugging accuracy
-            if similarity > 0.5:
-                print(f"[AI] Similarity with {student_id}: {similarity:.4f}")
-            
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = student_id
+        # Compare with known embeddings (single matmul against the gallery)
+        with metrics.stage("match"):
+            best_match, best_similarity = self.match_embeddings(query_embedding[None, :], log_top_k=5)[0]
         
         # Check if similarity meets threshold
         # Check if similarity meets threshold
@@ -585,59 +1105,112 @@ class FaceRecognizer:
         If X% of frames match a student, return that student_id.
         Args:
             frames: List of frame images
-            min_match_percentage: Minimum percentage of frames that must match (default 0.6 = 60%)
+            min_match_percentage: Minimum percentage of frames that must match (default 0.25 = 25%)
         Returns:
             student_id if enough frames match, None otherwise
         """
-        if not frames or not self.student_embeddings:
-            return None
-        
-        recognition_results = {}  # {student_id: count of matches}
+        vote = self.recognize_frames_voting(frames, min_match_percentage)
+        best_student = vote["best_match"]
+        if vote["student_id"]:
+            score = vote["scores"][best_student]
+            print(f"[AI] ✓ Recognized {best_student} in {score['votes']}/{vote['frames_processed']} frames "
+                  f"({score['share']*100:.1f}%)")
+        elif best_student:
+            print(f"[AI] Best match {best_student} but only {vote['scores'][best_student]['share']*100:.1f}% "
+                  f"frames matched (required {min_match_percentage*100:.1f}%)")
+        return vote["student_id"]
+    
+    def recognize_frames_voting(self, frames: Iterable[np.ndarray], min_match_percentage: float = FRAME_MATCH_PERCENTAGE,
+                                chunk_size: int = VOTE_CHUNK_FRAMES, z: float = VOTE_CONFIDENCE_Z) -> Dict:
+        """
+        Vote over a sequence of frames (largest face per frame) with batched detection and
+        embedding per chunk of frames. Stops early once the leading student's vote share is
+        above min_match_percentage with confidence z (Wilson score lower bound), so frames
+        after that are never decoded or processed when frames is a lazy iterable.
+        Args:
+            frames: Frames (None entries are skipped), a list or any iterable
+            min_match_percentage: Share of frames a student must match
+            chunk_size: Frames per batched detection/embedding pass
+            z: Confidence for the early exit (normal quantile)
+        Returns:
+            {"student_id": winner or None, "best_match", "frames_processed", "early_exit",
+             "scores": {student_id: {"votes", "share", "lower_bound", "mean_similarity", "max_similarity"}}}
+            early_exit is True whenever the confidence bound stopped the vote, even if that
+            happened on the last frame
+        """
+        votes: Dict[str, List[float]] = {}  # student_id -> similarities of the frames it won
+        processed = 0
+        early_exit = False
+        frames = iter(frames)
         
-        # Process each frame
-        valid_frames = 0
-        for frame in frames:
-            if frame is None:
+        while len(self.gallery) > 0:
+            chunk = list(itertools.islice(frames, max(1, chunk_size)))
+            if not chunk:
+                break
+            chunk = [frame for frame in chunk if frame is not None]
+            if not chunk:
                 continue
+            processed += len(chunk)
             
-            student_id = self.recognize_face(frame)
-            valid_frames += 1
+            with metrics.stage("detect"):
+                all_detections = self.detect_faces_yolo_batch(chunk)
+            crops = []
+            with metrics.stage("preprocess"):
+                for frame, detections in zip(chunk, all_detections):
+                    metrics.record_faces(len(detections))
+                    if detections:
+                        largest = max(detections, key=lambda d: (d[2] - d[0]) * (d[3] - d[1]))
+                        face = self.face_crops(frame, [largest])[0]
+                        if face is not None:
+                            crops.append(face)
+            with metrics.stage("embed"):
+                embeddings = [e for e in self.generate_embeddings(crops) if e is not None]
+            if embeddings:
+                with metrics.stage("match"):
+                    matches = self.match_embeddings(np.stack(embeddings))
+                for best_match, best_similarity in matches:
+                    if best_match and best_similarity >= RECOGNITION_THRESHOLD:
+                        votes.setdefault(best_match, []).append(float(best_similarity))
             
-            if student_id:
-                recognition_results[student_id] = recognition_results.get(student_id, 0) + 1
-        
-        if valid_frames == 0:
-            return None
-        
-        # Find student with highest match percentage
-        best_student = None
-        best_percentage = 0.0
-        
-        for student_id, match_count in recognition_results.items():
-            percentage = match_count / valid_frames
-            if percentage > best_percentage:
-                best_percentage = percentage
-                best_student = student_id
+            leader = max(votes, key=lambda s: len(votes[s]), default=None)
+            if leader and wilson_lower_bound(len(votes[leader]), processed, z) >= min_match_percentage:
+                # Not probing for a next frame: with a lazy iterable that would decode one more
+                early_exit = True
+                break
         
-        # Check if best match meets minimum percentage threshold
-        if best_student and best_percentage >= min_match_percentage:
-            print(f"[AI] ✓ Recognized {best_student} in {recognition_results[best_student]}/{valid_frames} frames ({best_percentage*100:.1f}%)")
-            return best_student
-        else:
-            if best_student:
-                print(f"[AI] Best match {best_student} but only {best_percentage*100:.1f}% frames matched (required {min_match_percentage*100:.1f}%)")
-            return None
+        scores = {
+            student_id: {
+                "votes": len(similarities),
+                "share": round(len(similarities) / processed, 4),
+                "lower_bound": round(wilson_lower_bound(len(similarities), processed, z), 4),
+                "mean_similarity": round(float(np.mean(similarities)), 4),
+                "max_similarity": round(float(np.max(similarities)), 4),
+            }
+            for student_id, similarities in sorted(votes.items(), key=lambda item: -len(item[1]))
+        }
+        best_match = next(iter(scores), None)
+        recognized = best_match is not None and scores[best_match]["share"] >= min_match_percentage
+        return {
+            "student_id": best_match if recognized else None,
+            "best_match": best_match,
+            "frames_processed": processed,
+            "early_exit": early_exit,
+            "scores": scores,
+        }
     
     def recognize_face_with_coords(self, frame: np.ndarray) -> Tuple[Optional[str], Optional[Tuple[int, int, int, int]], float]:
         """
         Recognize face and return student_id, bounding box, and confidence.
-        Returns (student_id, (x, y, w, h), confidence)
+        Returns (student_id, (x, y, w, h), confidence); the best match regardless of the
+        threshold, or student_id None with confidence 0.0 if no student is more similar than 0
         """
-        if not self.student_embeddings:
+        if len(self.gallery) == 0:
             return None, None, 0.0
         
         # Detect faces
-        detections = self.detect_faces_yolo(frame)
+        with metrics.stage("detect"):
+            detections = self.detect_faces_yolo(frame)
+        metrics.record_faces(len(detections))
         
         if not detections:
             return None, None, 0.0
@@ -653,29 +1226,21 @@ class FaceRecognizer:
         bbox = (x1, y1, x2 - x1, y2 - y1)  # Convert to (x, y, w, h)
         
         # Preprocess and recognize
-        face_preprocessed = self.preprocess_face(frame, largest_detection[:4])
+        with metrics.stage("preprocess"):
+            face_preprocessed = self.face_crops(frame, [largest_detection])[0]
         
         if face_preprocessed is None:
             return None, None, 0.0
         
-        query_embedding = self.generate_embedding(face_preprocessed)
+        with metrics.stage("embed"):
+            query_embedding = self.generate_embedding(face_preprocessed)
         
         if query_embedding is None:
             return None, None, 0.0
         
-        # Compare with known embeddings
-        best_match = None
-        best_similarity = 0.0
-        
-        for student_id, known_embedding in self.student_embeddings.items():
-            similarity = self.cosine_similarity(query_embedding, known_embedding)
-            # Log all comparisons
-            if similarity > 0.5:
-                print(f"[AI] Similarity with {student_id}: {similarity:.4f}")
-            
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = student_id
+        # Compare with known embeddings (single matmul against the gallery)
+        with metrics.stage("match"):
+            best_match, best_similarity = self.match_embeddings(query_embedding[None, :], log_top_k=5)[0]
         
         # Return best match regardless of threshold, so backend can decide
         return best_match, bbox, float(best_similarity)
@@ -685,68 +1250,140 @@ class FaceRecognizer:
         Optimized single-pass recognition for multiple faces.
         Returns a list of dictionaries with student_id, confidence, and bounding box.
         """
-        results = []
-        if not self.student_embeddings:
-            # Still detect faces even if none are registered
-            detections = self.detect_faces_yolo(frame)
-            for d in detections:
+        return self.recognize_all_faces_batch([frame])[0]
+    
+    def recognize_all_faces_batch(self, frames: List[np.ndarray], trackers: Optional[List] = None,
+                                  camera_ids: Optional[List[Optional[str]]] = None) -> List[List[Dict]]:
+        """
+        Multi-face recognition for several frames at once: one YOLO call for all frames,
+        one batched ArcFace pass for all faces, and one gallery matmul.
+        Args:
+            frames: BGR frames
+            trackers: Optional FaceTracker per frame (None entries allowed). Tracked faces get a
+                "track_id" and are only re-embedded when the tracker asks for it.
+            camera_ids: Optional camera ID per frame, selecting its detection profile; frames of a
+                camera that did not change since its last full pass reuse that pass's results
+        Returns one recognize_all_faces-style result list per frame.
+        """
+        gates = [self.gates.get(c) for c in camera_ids] if camera_ids and self.gates.enabled else None
+        if not gates or not any(gates):
+            return self._recognize_all_faces_batch(frames, trackers, camera_ids)
+        
+        checks = [gate.check(frame) if gate else (None, None) for frame, gate in zip(frames, gates)]
+        todo = [f for f, (cached, _) in enumerate(checks) if cached is None]
+        all_results = [cached for cached, _ in checks]
+        if todo:
+            fresh = self._recognize_all_faces_batch([frames[f] for f in todo],
+                                                    [trackers[f] for f in todo] if trackers else None,
+                                                    [camera_ids[f] for f in todo])
+            for f, results in zip(todo, fresh):
+                all_results[f] = results
+                if gates[f]:
+                    gates[f].update(checks[f][1], results)
+        return all_results
+    
+    def _recognize_all_faces_batch(self, frames: List[np.ndarray], trackers: Optional[List] = None,
+                                   camera_ids: Optional[List[Optional[str]]] = None) -> List[List[Dict]]:
+        profiles = [self.profiles.get(c) for c in camera_ids] if camera_ids and self.profiles else None
+        with metrics.stage("detect"):
+            all_detections = self.detect_faces_yolo_batch(frames, profiles=profiles)
+        for detections in all_detections:
+            metrics.record_faces(len(detections))
+        logger.debug(f"Batch processing: faces={sum(len(d) for d in all_detections)} frames={len(frames)}")
+        
+        all_results = []
+        face_imgs = []
+        crop_idx = []  # (frame index, detection index, track) for each crop
+        preprocess_start = time.perf_counter()
+        for f, (frame, detections) in enumerate(zip(frames, all_detections)):
+            tracker = trackers[f] if trackers else None
+            tracks = tracker.update(detections) if tracker else [None] * len(detections)
+            results = []
+            wanted = []  # Detections of this frame that need an embedding
+            for i, d in enumerate(detections):
                 x1, y1, x2, y2 = d[:4]
-                results.append({
+                result = {
                     "student_id": None,
                     "confidence": 0.0,
                     "bbox": [int(x1), int(y1), int(x2-x1), int(y2-y1)],
                     "recognized": False
-                })
-            return results
-
-        # Detect faces once
-        detections = self.detect_faces_yolo(frame)
-        print(f"[AI] Batch processing: {len(detections)} faces detected")
-        
-        for d in detections:
-            x1, y1, x2, y2 = d[:4]
-            bbox_h = [int(x1), int(y1), int(x2-x1), int(y2-y1)]
-            
-            # Recognition for this face
-            face_img = self.preprocess_face(frame, d[:4])
-            if face_img is None:
-                results.append({
-                    "student_id": None,
-                    "confidence": 0.0,
-                    "bbox": bbox_h,
-                    "recognized": False
-                })
-                continue
+                }
+                results.append(result)
+                track = tracks[i]
+                if track is not None:
+                    result["track_id"] = track.track_id
                 
-            emb = self.generate_embedding(face_img)
-            if emb is None:
-                results.append({
-                    "student_id": None,
-                    "confidence": 0.0,
-                    "bbox": bbox_h,
-                    "recognized": False
-                })
-                continue
-            
-            best_match = None
-            best_similarity = 0.0
-            
-            for student_id, known_emb in self.student_embeddings.items():
-                sim = self.cosine_similarity(emb, known_emb)
-                if sim > best_similarity:
-                    best_similarity = sim
-                    best_match = student_id
-            
+                # Still detect faces even if none are registered, but skip embedding
+                if len(self.gallery) == 0:
+                    continue
+                if track is not None and not tracker.needs_embedding(track):
+                    # Known track: reuse its cached identity instead of re-embedding
+                    self._apply_track_identity(result, track)
+                    tracker.reuses += 1
+                    continue
+                wanted.append(i)
+            # All faces of the frame aligned in one warp batch
+            for i, face_img in zip(wanted, self.face_crops(frame, [detections[i] for i in wanted])):
+                if face_img is None:
+                    continue
+                if QUALITY_ENABLED:
+                    # Blurred, tiny, badly lit or profile faces would never match: skip ArcFace
+                    quality = face_quality.gate(face_img, detections[i])
+                    results[i]["quality"] = quality["score"]
+                    if not quality["usable"]:
+                        results[i]["quality_issue"] = quality["issue"]
+                        continue
+                face_imgs.append(face_img)
+                crop_idx.append((f, i, tracks[i]))
+                if tracker:
+                    tracker.embeds += 1
+            all_results.append(results)
+        metrics.observe("stage", "preprocess", time.perf_counter() - preprocess_start)
+        
+        if not face_imgs:
+            return all_results
+        
+        # One batched ArcFace pass for every face in every frame
+        embeddings = []
+        embedded_idx = []
+        with metrics.stage("embed"):
+            face_embeddings = self.generate_embeddings(face_imgs)
+        for idx, emb in zip(crop_idx, face_embeddings):
+            if emb is not None:
+                embeddings.append(emb)
+                embedded_idx.append(idx)
+        
+        if not embeddings:
+            return all_results
+        
+        # Match every face against every student in one pass
+        refreshing = self.refresh is not None and self.refresh.enabled
+        with metrics.stage("match"):
+            matches = self.match_embeddings(np.stack(embeddings), runner_up=refreshing)
+        for (f, i, track), embedding, (best_match, best_similarity, *runner_up) in zip(embedded_idx, embeddings, matches):
             is_rec = bool(best_match and best_similarity >= RECOGNITION_THRESHOLD)
+            result = all_results[f][i]
+            result["student_id"] = best_match if is_rec else None
+            result["confidence"] = float(best_similarity)
+            result["recognized"] = is_rec
+            if track is not None:
+                track.record_match(best_match, float(best_similarity), is_rec)
+                self._apply_track_identity(result, track)
+            if refreshing and is_rec:
+                x1, y1, x2, y2, conf = all_detections[f][i][:5]
+                self.refresh.offer(best_match, embedding, best_similarity, runner_up[0], conf, min(x2 - x1, y2 - y1))
+        
+        if refreshing and self.refresh.apply_locally:
+            self.apply_gallery_refresh(self.refresh.drain())
             
-            results.append({
-                "student_id": best_match if is_rec else None,
-                "confidence": float(best_similarity),
-                "bbox": bbox_h,
-                "recognized": is_rec
-            })
-            
-        return results
+        return all_results
+    
+    def _apply_track_identity(self, result: Dict, track):
+        """Report a track's voted identity (stable across frames) in a face result"""
+        identity = track.identity
+        result["student_id"] = identity
+        result["confidence"] = float(track.last_similarity)
+        result["recognized"] = identity is not None
     
     def detect_all_faces(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
@@ -762,32 +1399,98 @@ class FaceRecognizer:
         
         return faces
     
+    def persist_embedding(self, student_id: str):
+        """Append one gallery row's current embedding (or its removal) to the embedding store"""
+        try:
+            embedding = self.gallery.get(student_id)
+            if embedding is None:
+                self.store.append_delete(self.gallery, student_id)
+            else:
+                self.store.append_upsert(self.gallery, student_id, embedding)
+        except Exception as e:
+            print(f"[AI] Error persisting embedding for {student_id}: {e}")
+    
+    def apply_gallery_refresh(self, proposals: Dict[str, List[np.ndarray]]) -> int:
+        """
+        Fold high-confidence live samples into the gallery (see gallery_refresh.py) and append
+        the updated prototypes to the embedding store. Must run in the store's single writer.
+        Returns the number of prototypes updated.
+        """
+        if not proposals or self.refresh is None:
+            return 0
+        try:
+            with self._store_lock:
+                keys = self.refresh.apply(self.gallery, proposals)
+                for key in keys:
+                    self.persist_embedding(key)
+        except Exception as e:
+            print(f"[AI] Error refreshing gallery: {e}")
+            return 0
+        if keys:
+            print(f"[AI] ✓ Refreshed {len(keys)} prototype(s) from live recognitions")
+        return len(keys)
+    
+    def sync_embeddings(self):
+        """Apply gallery changes another process has written to the embedding store"""
+        try:
+            if self.store.exists():
+                self.gallery = self.store.sync(self.gallery, index=self._make_ann_index())
+        except Exception as e:
+            print(f"[AI] Error syncing embeddings: {e}")
+    
     def save_embeddings(self):
-        """Save student embeddings to file (numpy format)"""
+        """Save all student embeddings as a new compacted store snapshot"""
         try:
-            np.save(EMBEDDINGS_FILE, self.student_embeddings)
-            print(f"[AI] ✓ Saved embeddings for {len(self.student_embeddings)} students to {EMBEDDINGS_FILE}")
+            self.store.compact(self.gallery)
+            print(f"[AI] ✓ Saved embeddings for {self.gallery.student_count()} students to {EMBEDDINGS_STORE_DIR}")
         except Exception as e:
             print(f"[AI] Error saving embeddings: {e}")
     
     def load_embeddings(self):
-        """Load student embeddings from file (numpy format)"""
-        if os.path.exists(EMBEDDINGS_FILE):
-            try:
-                # Load numpy file, allowing pickle for dictionary structure
-                self.student_embeddings = np.load(EMBEDDINGS_FILE, allow_pickle=True).item()
-                print(f"[AI] ✓ Loaded embeddings for {len(self.student_embeddings)} students from {EMBEDDINGS_FILE}")
-            except Exception as e:
-                print(f"[AI] Error loading embeddings: {e}")
-                # Try loading old pickle format as fallback if migration
-                try:
-                    with open("student_embeddings.pkl", 'rb') as f:
-                        self.student_embeddings = pickle.load(f)
-                    print(f"[AI] ✓ Loaded legacy pickle embeddings. Will save as npy on next update.")
-                    # Immediately save as npy
-                    self.save_embeddings()
-                except:
-                    self.student_embeddings = {}
+        """Load student embeddings from the store (creating or migrating it first if this process owns it)"""
+        try:
+            if self.create_store:
+                prepare_embedding_store(self.store)
+            if self.store.exists():
+                self.gallery = self.store.load_gallery(index=self._make_ann_index())
+                print(f"[AI] ✓ Loaded {len(self.gallery)} gallery embeddings from {EMBEDDINGS_STORE_DIR}")
+                if self.store.crop_mode != self.crop_mode:
+                    # Embeddings of the other crop mode would not be comparable with the gallery
+                    print(f"[AI] ⚠ {EMBEDDINGS_STORE_DIR} was enrolled from {self.store.crop_mode} crops; "
+                          f"using {self.store.crop_mode} crops instead of {self.crop_mode} "
+                          f"(re-enroll into a fresh store to switch)")
+                    self.crop_mode = self.store.crop_mode
+            else:
+                print(f"[AI] ⚠ No embedding store at {EMBEDDINGS_STORE_DIR} yet; starting with an empty gallery")
+        except Exception as e:
+            print(f"[AI] Error loading embeddings: {e}")
+            self.gallery = EmbeddingGallery(index=self._make_ann_index())
+
+
+def prepare_embedding_store(store: Optional[EmbeddingStore] = None) -> EmbeddingStore:
+    """
+    Create the embedding store if it does not exist yet, migrating legacy encodings.npy / pickle files.
+    An empty store is switched to the configured crop mode (AI_ALIGN_FACES); a store holding
+    embeddings keeps the crop mode it was enrolled with.
+    Call this once from the process that owns the store before starting processes that only read it
+    (e.g. the inference pool's workers), so they never race to migrate or compact it.
+    """
+    store = store or EmbeddingStore(EMBEDDINGS_STORE_DIR, crop_mode=CROP_MODE)
+    if store.exists():
+        crop_mode = store.crop_mode
+        gallery = store.load_gallery()
+        if len(gallery) == 0 and store.crop_mode != crop_mode:
+            # Nothing enrolled yet, so the store can switch to the configured crop mode
+            store.crop_mode = crop_mode
+            store.compact(gallery)
+        return store
+    gallery = store.migrate_legacy(EMBEDDINGS_FILE, LEGACY_PICKLE_FILE)
+    if gallery is not None:
+        print(f"[AI] ✓ Migrated embeddings for {gallery.student_count()} students to {EMBEDDINGS_STORE_DIR}")
+    else:
+        # Fresh install - create an empty store so appends have somewhere to go
+        store.compact(EmbeddingGallery())
+    return store
 
 
 # Global recognizer instance
@@ -1,29 +1,200 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 import cv2
 import numpy as np
 import os
 import sys
 import threading
 
-# Global lock for thread safety with ML models
+# Global lock for thread safety with ML models (single-process mode only)
 processing_lock = threading.Lock()
 
 # Ensure we can import the package
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from ai_module_yolo import FaceRecognizer, RECOGNITION_THRESHOLD
-    recognizer = FaceRecognizer()
-    print(f"[AI Server] Initialized Face Detection System (YOLOv8-face: {recognizer.yolo_model.model.pt_path if recognizer and recognizer.yolo_model else 'Unknown'})")
-except Exception as e:
-    print(f"[AI Server] Error initializing face detection: {e}")
-    recognizer = None
+import queue
+import json
+import time
+import logging
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+import metrics
+from inference_pool import InferencePool, PoolBusy, FrameDecodeError, CLIP_FRAME_STRIDE, iter_batch_frames, decode_frame
+from frame_stream import FrameStreamServer
+from batch_scheduler import MicroBatcher
+from camera_ingest import IngestionPipeline, WebhookPublisher
+from face_tracker import TrackerRegistry
+from frame_gate import GATE_ENABLED
+from gallery_refresh import REFRESH_ENABLED, REFRESH_OUTCOMES
+from training_jobs import TrainingJobManager
+
+# Worker-pool mode: N model replicas in separate processes (0 = single in-process recognizer)
+INFERENCE_WORKERS = int(os.environ.get("AI_INFERENCE_WORKERS", "0"))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("AI_INFERENCE_QUEUE_SIZE", "32"))  # Pending frames before 503
+INFERENCE_TIMEOUT = float(os.environ.get("AI_INFERENCE_TIMEOUT", "30"))  # Seconds to wait for a worker
+TRAIN_TIMEOUT = float(os.environ.get("AI_TRAIN_TIMEOUT", "600"))
+# Micro-batching of /recognize-live frames across requests (0 ms = disabled)
+BATCH_WINDOW_MS = float(os.environ.get("AI_BATCH_WINDOW_MS", "0"))
+BATCH_MAX_SIZE = int(os.environ.get("AI_BATCH_MAX_SIZE", "8"))
+# Camera ingestion: recognition events for pulled streams are POSTed here (optional)
+EVENTS_WEBHOOK = os.environ.get("AI_EVENTS_WEBHOOK")
+# Add a per-request "timing" breakdown to recognition responses (or pass ?timing=1 per request)
+RESPONSE_TIMING = os.environ.get("AI_RESPONSE_TIMING", "0") == "1"
+EVENT_STREAM_QUEUE = 100  # Events buffered per /events client before the oldest are dropped
+# Streaming frame transport (see frame_stream.py): TCP port and/or Unix socket path, off by default
+STREAM_PORT = int(os.environ.get("AI_STREAM_PORT", "0"))
+STREAM_SOCKET = os.environ.get("AI_STREAM_SOCKET")
+MAX_BATCH_FRAMES = int(os.environ.get("AI_MAX_BATCH_FRAMES", "64"))  # Frames voted on per /recognize-batch request
+TRAIN_BUSY_RETRY = 1.0  # Seconds a queued training job waits before retrying a full worker queue
+
+metrics.configure_logging()
+logger = logging.getLogger("AI Server")
+
+server_started = time.time()
+frame_streams = []
+recognizer = None
+pool = None
+batcher = None
+ingestion = None
+ingestion_lock = threading.Lock()
+trackers = TrackerRegistry()  # Per-camera face tracks (single-process mode; workers keep their own)
+training_jobs = None
+
+def recognize_frames_local(frames, camera_ids):
+    """Batched recognition with per-camera tracking on the in-process recognizer"""
+    recognizer.ready.wait()
+    return recognizer.recognize_all_faces_batch(frames, [trackers.get(c) for c in camera_ids], camera_ids)
+
+def run_training_job(job, progress):
+    """Training job runner: per-frame progress in-process, one pool task in worker mode"""
+    print(f"[AI Server] Training student {job.student_id} from {job.frames_dir}")
+    if pool:
+        while True:
+            try:
+                return pool.train(job.frames_dir, job.student_id, timeout=TRAIN_TIMEOUT)
+            except PoolBusy:
+                time.sleep(TRAIN_BUSY_RETRY)
+    recognizer.ready.wait()
+    # The lock is only held while models run, so live recognition interleaves with training
+    return recognizer.train_from_frames(job.frames_dir, job.student_id, progress=progress, lock=processing_lock)
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def init():
+    """
+    Build the models or worker pool, training jobs and frame stream listeners. Called once by the
+    server entry points (python ai_server.py, the ASGI lifespan); importing this module does not
+    build anything, so the pool's spawned workers, uvicorn --workers/--reload children and other
+    importers never start models or pools of their own. Safe to call more than once.
+    """
+    global _initialized, pool, recognizer, batcher, training_jobs
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        _initialized = True
+        if INFERENCE_WORKERS > 0:
+            pool = InferencePool(INFERENCE_WORKERS, queue_size=INFERENCE_QUEUE_SIZE,
+                                 batch_window_ms=BATCH_WINDOW_MS, max_batch_size=BATCH_MAX_SIZE)
+        else:
+            try:
+                from ai_module_yolo import FaceRecognizer
+                # Gallery loads now; YOLO and ArcFace load in parallel in the background (see /readyz)
+                recognizer = FaceRecognizer(load_models=False)
+                recognizer.start_loading()
+                print(f"[AI Server] Initialized Face Detection System (models loading in the background)")
+                if BATCH_WINDOW_MS > 0:
+                    batcher = MicroBatcher(lambda items: recognize_frames_local([f for f, _ in items], [c for _, c in items]),
+                                           window_ms=BATCH_WINDOW_MS,
+                                           max_batch_size=BATCH_MAX_SIZE, max_queue=INFERENCE_QUEUE_SIZE,
+                                           lock=processing_lock)
+                    print(f"[AI Server] Micro-batching enabled ({BATCH_WINDOW_MS} ms window, max {BATCH_MAX_SIZE} frames)")
+            except Exception as e:
+                print(f"[AI Server] Error initializing face detection: {e}")
+                recognizer = None
+        if recognizer or pool:
+            training_jobs = TrainingJobManager(run_training_job)
+            if STREAM_PORT:
+                frame_streams.append(FrameStreamServer(process_stream_frame, host="127.0.0.1", port=STREAM_PORT).start())
+            if STREAM_SOCKET:
+                frame_streams.append(FrameStreamServer(process_stream_frame, unix_path=STREAM_SOCKET).start())
 
 app = Flask(__name__)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    init()  # Hosted by another WSGI server (flask run, gunicorn ai_server:app): build on first request
+
+@app.after_request
+def record_request_metrics(response):
+    if request.url_rule is not None and request.url_rule.rule != "/metrics":
+        metrics.record_request(request.url_rule.rule, response.status_code,
+                               time.perf_counter() - g.request_start)
+    return response
+
+@contextmanager
+def model_lock():
+    """processing_lock, with the time spent waiting for it recorded as lock wait"""
+    wait_start = time.perf_counter()
+    with processing_lock:
+        metrics.record_wait("lock", time.perf_counter() - wait_start)
+        yield
+
+def wants_timing() -> bool:
+    return RESPONSE_TIMING or request.args.get("timing") in ("1", "true")
+
+def with_timing(body: dict, timings) -> dict:
+    """Attach the per-request stage breakdown (ms) when the client asked for it"""
+    if wants_timing() and timings is not None:
+        breakdown = timings.to_dict()
+        breakdown["total_ms"] = round((time.perf_counter() - g.request_start) * 1000, 3)
+        body["timing"] = breakdown
+    return body
+
+def models_ready() -> bool:
+    """Wait (bounded) for in-process models; pool workers simply queue tasks until they are up"""
+    return pool is not None or recognizer.ready.wait(timeout=INFERENCE_TIMEOUT)
+
+def loading_response():
+    response = jsonify({"error": "AI models are still loading, retry later", "recognized": False})
+    response.headers["Retry-After"] = "5"
+    return response, 503
+
+def busy_response():
+    """Backpressure response when every worker is busy and the queue is full"""
+    response = jsonify({"error": "AI server busy, retry later", "recognized": False})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+def timeout_response():
+    """Inference did not finish within AI_INFERENCE_TIMEOUT"""
+    return jsonify({"error": "Inference timed out", "recognized": False}), 504
+
+def wait_result(future):
+    """Wait up to AI_INFERENCE_TIMEOUT for an inference future, cancelling it on timeout so a
+    task still in the queue is dropped instead of run for a client that gave up"""
+    try:
+        return future.result(timeout=INFERENCE_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()
+        raise
+
+def resolve_frames_dir(frames_dir: str) -> str:
+    """Resolve a frames path sent by the backend"""
+    if not os.path.isabs(frames_dir):
+        # Assuming relative to backend
+        backend_frames_dir = os.path.join("..", "backend", frames_dir)
+        if os.path.exists(backend_frames_dir):
+            return os.path.abspath(backend_frames_dir)
+        return os.path.abspath(frames_dir)
+    return frames_dir
+
 @app.route("/train", methods=["POST"])
 def train():
-    if not recognizer:
+    """Queue a training job; answers 202 with a jobId (pass "wait": true to block until done)"""
+    if not training_jobs:
         return jsonify({"error": "AI module not initialized"}), 500
     
     data = request.json or {}
@@ -33,23 +204,43 @@ def train():
     if not student_id or not frames_dir:
         return jsonify({"error": "Invalid payload: studentId and framesDir required"}), 400
 
-    # Handle paths
-    if not os.path.isabs(frames_dir):
-        # Assuming relative to backend
-        backend_frames_dir = os.path.join("..", "backend", frames_dir)
-        if os.path.exists(backend_frames_dir):
-            frames_dir = os.path.abspath(backend_frames_dir)
-        else:
-            frames_dir = os.path.abspath(frames_dir)
+    job = training_jobs.submit(str(student_id), resolve_frames_dir(frames_dir))
 
-    print(f"[AI Server] Training student {student_id} from {frames_dir}")
-    
-    success = recognizer.train_from_frames(frames_dir, student_id)
-    
-    if not success:
-        return jsonify({"error": "Training failed (no faces found or other error)"}), 400
+    if data.get("wait"):
+        job.done.wait(timeout=TRAIN_TIMEOUT)
+        if job.status != "succeeded":
+            return jsonify({"error": job.error or "Training timed out", "job": job.to_dict()}), 400
+        return jsonify({"status": "trained", "message": f"Successfully trained {student_id}",
+                        "jobId": job.job_id}), 200
 
-    return jsonify({"status": "trained", "message": f"Successfully trained {student_id}"}), 200
+    return jsonify({"status": "queued", "jobId": job.job_id, "job": job.to_dict()}), 202
+
+@app.route("/train/bulk", methods=["POST"])
+def train_bulk():
+    """Queue one training job per student folder under rootDir (folder name = student ID)"""
+    if not training_jobs:
+        return jsonify({"error": "AI module not initialized"}), 500
+
+    root_dir = (request.json or {}).get("rootDir")
+    if not root_dir:
+        return jsonify({"error": "Invalid payload: rootDir required"}), 400
+    root_dir = resolve_frames_dir(root_dir)
+    if not os.path.isdir(root_dir):
+        return jsonify({"error": f"Directory not found: {root_dir}"}), 400
+
+    jobs = training_jobs.bulk_enroll(root_dir)
+    return jsonify({"status": "queued", "jobs": [job.to_dict() for job in jobs]}), 202
+
+@app.route("/train/jobs", methods=["GET"])
+def list_training_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in training_jobs.list()] if training_jobs else []})
+
+@app.route("/train/<job_id>", methods=["GET"])
+def training_job_status(job_id):
+    job = training_jobs.get(job_id) if training_jobs else None
+    if job is None:
+        return jsonify({"error": f"Unknown training job: {job_id}"}), 404
+    return jsonify(job.to_dict())
 
 @app.route("/recognize", methods=["POST"])
 def recognize():
@@ -57,53 +248,331 @@ def recognize():
     if not file:
         return jsonify({"error": "No frame received"}), 400
 
-    npimg = np.frombuffer(file.read(), np.uint8)
-    frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-
-    if recognizer:
-        with processing_lock:
-            student_id = recognizer.recognize_face(frame)
-    else:
-        student_id = None
+    timings = None
+    if recognizer and not models_ready():
+        return loading_response()
+    try:
+        if pool:
+            future = pool.submit("recognize", file.read())
+            student_id = wait_result(future)
+            timings = future.timings
+        elif recognizer:
+            with metrics.collect() as timings:
+                with metrics.stage("decode"):
+                    npimg = np.frombuffer(file.read(), np.uint8)
+                    frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+                if frame is None:
+                    raise FrameDecodeError("Failed to decode image")
+                with model_lock():
+                    student_id = recognizer.recognize_face(frame)
+        else:
+            student_id = None
+    except PoolBusy:
+        return busy_response()
+    except FutureTimeout:
+        return timeout_response()
+    except FrameDecodeError:
+        return jsonify({"error": "Failed to decode image", "recognized": False}), 400
+    except Exception as e:
+        logger.exception(f"Error in /recognize: {e}")
+        return jsonify({"error": str(e), "recognized": False}), 500
 
     if student_id is None:
-        return jsonify({"recognized": False})
+        return jsonify(with_timing({"recognized": False}, timings))
+
+    return jsonify(with_timing({"recognized": True, "studentId": student_id}, timings))
+
+@app.route("/recognize-batch", methods=["POST"])
+def recognize_batch():
+    """
+    Multi-frame check-in: several "frames" images or one short "clip" video, voted on with
+    early exit once one student clearly wins (see FaceRecognizer.recognize_frames_voting).
+    Optional form fields: minMatchPercentage, maxFrames, frameStride (clips only).
+    """
+    if not recognizer and not pool:
+        return jsonify({"error": "AI module not initialized"}), 500
+
+    frames_data = [f.read() for f in request.files.getlist("frames")]
+    clip = request.files.get("clip")
+    clip_data = clip.read() if clip else None
+    if not frames_data and not clip_data:
+        return jsonify({"error": "No frames received"}), 400
+    min_match = request.form.get("minMatchPercentage", type=float)
+    max_frames = min(request.form.get("maxFrames", MAX_BATCH_FRAMES, type=int), MAX_BATCH_FRAMES)
+    stride = request.form.get("frameStride", CLIP_FRAME_STRIDE, type=int)
+    if not models_ready():
+        return loading_response()
+
+    try:
+        if pool:
+            future = pool.submit("recognize_batch", (frames_data, clip_data, max_frames, stride, min_match))
+            vote = wait_result(future)
+            timings = future.timings
+        else:
+            with metrics.collect() as timings:
+                frames = iter_batch_frames(frames_data, clip_data, max_frames, stride)
+                with model_lock():
+                    if min_match is None:
+                        vote = recognizer.recognize_frames_voting(frames)
+                    else:
+                        vote = recognizer.recognize_frames_voting(frames, min_match)
+    except PoolBusy:
+        return busy_response()
+    except FutureTimeout:
+        return timeout_response()
+    except FrameDecodeError:
+        return jsonify({"error": "Failed to decode frames", "recognized": False}), 400
+    except Exception as e:
+        logger.exception(f"Error in /recognize-batch: {e}")
+        return jsonify({"error": str(e), "recognized": False}), 500
 
-    return jsonify({"recognized": True, "studentId": student_id})
+    body = {
+        "recognized": vote["student_id"] is not None,
+        "framesReceived": len(frames_data) if frames_data else None,
+        "framesProcessed": vote["frames_processed"],
+        "earlyExit": vote["early_exit"],
+        "scores": vote["scores"],
+    }
+    if vote["student_id"]:
+        body["studentId"] = vote["student_id"]
+    return jsonify(with_timing(body, timings))
 
 @app.route("/recognize-live", methods=["POST"])
 def recognize_live():
-    if not recognizer:
+    if not recognizer and not pool:
         return jsonify({"error": "AI module not initialized"}), 500
     
     try:
         file = request.files.get("frame")
         if not file:
             return jsonify({"error": "No frame received"}), 400
+        # Optional: lets consecutive frames of one camera share face tracks (track_id in results)
+        camera_id = request.form.get("cameraId")
+        if not models_ready():
+            return loading_response()
+
+        if pool:
+            # Decoding happens in the worker process
+            future = pool.submit("recognize_live", (file.read(), camera_id))
+            results = wait_result(future)
+            return jsonify(with_timing({
+                "results": results,
+                "recognized": any(r["recognized"] for r in results),
+                "count": len(results)
+            }, future.timings))
 
-        npimg = np.frombuffer(file.read(), np.uint8)
-        frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+        with metrics.collect() as timings:
+            with metrics.stage("decode"):
+                npimg = np.frombuffer(file.read(), np.uint8)
+                frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
         
         if frame is None:
             return jsonify({"error": "Failed to decode image", "recognized": False}), 400
 
         # Try recognition (Batch mode)
-        with processing_lock:
-            # Returns list of {"student_id", "confidence", "bbox", "recognized"}
-            results = recognizer.recognize_all_faces(frame)
+        if batcher:
+            # Coalesced with frames from other requests into one detection/embedding pass
+            future = batcher.submit((frame, camera_id))
+            results = wait_result(future)
+            timings.events.extend(future.timings.events)
+        else:
+            with metrics.collect() as recognition:
+                with model_lock():
+                    # Returns list of {"student_id", "confidence", "bbox", "recognized", "track_id"}
+                    results = recognize_frames_local([frame], [camera_id])[0]
+            timings.events.extend(recognition.events)
         
         # Backward compatibility / Summary flag
         any_recognized = any(r["recognized"] for r in results)
 
-        return jsonify({
+        return jsonify(with_timing({
             "results": results,
             "recognized": any_recognized,
             "count": len(results)
-        })
+        }, timings))
 
+    except (PoolBusy, queue.Full):
+        return busy_response()
+    except FutureTimeout:
+        return timeout_response()
+    except FrameDecodeError:
+        return jsonify({"error": "Failed to decode image", "recognized": False}), 400
     except Exception as e:
-        print(f"[AI Server] Error: {e}")
+        logger.exception(f"Error in /recognize-live: {e}")
         return jsonify({"error": str(e), "recognized": False}), 500
 
+@app.route("/batch-stats", methods=["GET"])
+def batch_stats():
+    """Micro-batching knobs and per-batch statistics"""
+    stats = pool.batch_stats if pool else (batcher.stats if batcher else None)
+    return jsonify({
+        "enabled": BATCH_WINDOW_MS > 0 and BATCH_MAX_SIZE > 1,
+        "window_ms": BATCH_WINDOW_MS,
+        "max_batch_size": BATCH_MAX_SIZE,
+        "stats": stats.snapshot() if stats else None
+    })
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is up and serving HTTP (models may still be loading)"""
+    return jsonify({"status": "ok", "uptime_s": round(time.time() - server_started, 1)})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: models loaded and warmed up (every pool worker alive and loaded, in worker-pool mode)"""
+    if pool:
+        status = {"ready": pool.ready_workers == pool.num_workers, "workers_ready": pool.ready_workers,
+                  "workers_alive": pool.alive_workers(), "workers": pool.num_workers}
+    elif recognizer:
+        status = recognizer.status()
+    else:
+        status = {"ready": False, "error": "AI module not initialized"}
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus scrape endpoint: stage latencies, wait times, faces per frame, gallery size"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/tracking-stats", methods=["GET"])
+def tracking_stats():
+    """Face tracking: active tracks and embeddings skipped thanks to cached identities"""
+    return jsonify(trackers.stats())
+
+@app.route("/gate-stats", methods=["GET"])
+def gate_stats():
+    """Motion gating: camera frames answered from the previous result vs fully processed"""
+    skipped = metrics.FRAMES_GATED.value("skipped")
+    processed = metrics.FRAMES_GATED.value("processed")
+    total = skipped + processed
+    return jsonify({
+        "enabled": GATE_ENABLED,
+        "skipped": int(skipped),
+        "processed": int(processed),
+        "skip_ratio": round(skipped / total, 4) if total else 0.0,
+    })
+
+@app.route("/embedding-cache-stats", methods=["GET"])
+def embedding_cache_stats():
+    """Embedding cache hits/misses (all workers); entry and memory usage in single-process mode"""
+    hits = metrics.EMBEDDING_CACHE.value("hit")
+    misses = metrics.EMBEDDING_CACHE.value("miss")
+    stats = {
+        "hits": int(hits),
+        "misses": int(misses),
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+    }
+    if recognizer and recognizer.embedding_cache is not None:
+        local = recognizer.embedding_cache.stats()
+        stats.update({k: v for k, v in local.items() if k not in stats})
+    return jsonify(stats)
+
+@app.route("/refresh-stats", methods=["GET"])
+def refresh_stats():
+    """Online gallery refresh (all workers): faces sampled, prototypes updated, updates rejected by gate"""
+    return jsonify({
+        "enabled": REFRESH_ENABLED,
+        **{outcome: int(metrics.GALLERY_REFRESH.value(outcome)) for outcome in REFRESH_OUTCOMES},
+    })
+
+def get_ingestion() -> IngestionPipeline:
+    """Create the camera ingestion pipeline on first use"""
+    global ingestion
+    with ingestion_lock:
+        if ingestion is None:
+            if pool:
+                # Split per worker, so each camera's frames reach the worker holding its tracks
+                process = lambda frames, camera_ids: pool.recognize_frames(frames, camera_ids,
+                                                                           timeout=INFERENCE_TIMEOUT)
+                ingestion = IngestionPipeline(process, max_batch_size=BATCH_MAX_SIZE)
+            else:
+                ingestion = IngestionPipeline(recognize_frames_local, max_batch_size=BATCH_MAX_SIZE,
+                                              lock=processing_lock)
+            if EVENTS_WEBHOOK:
+                ingestion.subscribe(WebhookPublisher(EVENTS_WEBHOOK))
+        return ingestion
+
+@app.route("/cameras", methods=["GET"])
+def list_cameras():
+    return jsonify({"cameras": ingestion.cameras() if ingestion else []})
+
+@app.route("/cameras", methods=["POST"])
+def add_camera():
+    if not recognizer and not pool:
+        return jsonify({"error": "AI module not initialized"}), 500
+
+    data = request.json or {}
+    camera_id = data.get("cameraId")
+    source = data.get("source")
+    if not camera_id or source is None:
+        return jsonify({"error": "Invalid payload: cameraId and source required"}), 400
+
+    stream = get_ingestion().add_camera(str(camera_id), source, loop=bool(data.get("loop", False)),
+                                        realtime=data.get("realtime"))
+    return jsonify({"status": "added", "camera": stream.status()}), 201
+
+@app.route("/cameras/<camera_id>", methods=["DELETE"])
+def remove_camera(camera_id):
+    if not ingestion or not ingestion.remove_camera(camera_id):
+        return jsonify({"error": f"Unknown camera: {camera_id}"}), 404
+    return jsonify({"status": "removed", "cameraId": camera_id})
+
+@app.route("/events", methods=["GET"])
+def events():
+    """Server-Sent Events stream of recognition events from pulled cameras"""
+    client_queue = queue.Queue(maxsize=EVENT_STREAM_QUEUE)
+
+    def enqueue(event):
+        while True:
+            try:
+                client_queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    client_queue.get_nowait()  # Drop the oldest event for slow clients
+                except queue.Empty:
+                    pass
+
+    pipeline = get_ingestion() if (recognizer or pool) else None
+    if pipeline is None:
+        return jsonify({"error": "AI module not initialized"}), 500
+    pipeline.subscribe(enqueue)
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event = client_queue.get(timeout=15)
+                    yield f"data: {json.dumps(event)}\n\n"
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            pipeline.unsubscribe(enqueue)
+
+    return Response(stream(), mimetype="text/event-stream")
+
+def process_stream_frame(data, frame, camera_id):
+    """Frame stream handler: encoded bytes (data) or an already-decoded frame -> /recognize-live results"""
+    if pool:
+        if frame is None:
+            return wait_result(pool.submit("recognize_live", (data, camera_id)))
+        return wait_result(pool.submit("recognize_frames", ([frame], [camera_id])))[0]
+    if not recognizer.ready.wait(timeout=INFERENCE_TIMEOUT):
+        raise RuntimeError("Models are still loading")
+    if frame is None:
+        frame = decode_frame(data)
+        if frame is None:
+            raise FrameDecodeError("Failed to decode image")
+    if batcher:
+        return wait_result(batcher.submit((frame, camera_id)))
+    with model_lock():
+        return recognize_frames_local([frame], [camera_id])[0]
+
+@app.route("/stream-stats", methods=["GET"])
+def stream_stats():
+    """Streaming transport listeners: open connections, frames answered, errors"""
+    return jsonify({"streams": [stream.stats() for stream in frame_streams]})
+
 if __name__ == "__main__":
-    app.run(port=8000, debug=False)
+    init()
+    app.run(port=8000, debug=False, threaded=True)
@@ -0,0 +1,372 @@
+"""
+ASGI version of the AI server (Starlette, served by uvicorn)
+Same /train, /recognize, /recognize-batch and /recognize-live contracts as ai_server.py, on an
+event loop instead of Flask's development server:
+  - Request bodies (multipart frame uploads, JSON) are streamed in asynchronously, so a slow
+    upload holds a coroutine, not a thread; bodies slower than AI_BODY_TIMEOUT get a 408
+  - Decoding and in-process inference run on a thread pool (AI_ASGI_THREADS threads); in
+    worker-pool mode the request just awaits the pool's future
+  - Inference is bounded by AI_INFERENCE_TIMEOUT (504). When the client disconnects while
+    its frame is waiting, the frame is cancelled: dropped from the worker-pool or micro-batch
+    queue, or skipped before it takes the model lock (the request is logged as 499)
+Every other endpoint (/metrics, /readyz, /cameras, /events, ...) is ai_server's Flask app
+mounted as WSGI; models, worker pool, micro-batcher and training jobs are the ones
+ai_server.init() builds when the app starts (lifespan).
+
+Run a single server process - each process would load its own models and write the embedding
+store - and scale inference with model worker processes (AI_INFERENCE_WORKERS):
+    AI_INFERENCE_WORKERS=4 python ai_server_asgi.py
+    AI_INFERENCE_WORKERS=4 uvicorn ai_server_asgi:app --host 127.0.0.1 --port 8000
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+import ai_server as server
+import metrics
+from inference_pool import PoolBusy, FrameDecodeError, CLIP_FRAME_STRIDE, iter_batch_frames, decode_frame
+
+SERVER_HOST = os.environ.get("AI_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("AI_SERVER_PORT", "8000"))
+ASGI_THREADS = int(os.environ.get("AI_ASGI_THREADS", "8"))  # Decode / in-process inference threads
+BODY_TIMEOUT = float(os.environ.get("AI_BODY_TIMEOUT", "30"))  # Seconds to receive a request body
+CLIENT_CLOSED_REQUEST = 499  # Status recorded for requests whose client went away (nginx convention)
+
+logger = logging.getLogger("AI Server")
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="ai-asgi")
+routes: List[Route] = []
+
+
+class BodyTimeout(Exception):
+    """Raised when the client does not finish sending the request body in time"""
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client disconnects before its result is ready"""
+
+
+class RequestCancelled(Exception):
+    """Raised inside offloaded work whose request was cancelled before it reached the models"""
+
+
+def endpoint(path: str, methods: List[str]):
+    """Register an async handler: maps timeouts, disconnects and backpressure to responses, records metrics"""
+    def register(handler: Callable[[Request], Awaitable[Response]]):
+        async def run(request: Request) -> Response:
+            request.state.start = time.perf_counter()
+            try:
+                response = await handler(request)
+            except BodyTimeout:
+                response = JSONResponse({"error": "Request body timed out"}, status_code=408)
+            except ClientDisconnected:
+                response = Response(status_code=CLIENT_CLOSED_REQUEST)
+            except asyncio.TimeoutError:
+                response = JSONResponse({"error": "Inference timed out", "recognized": False}, status_code=504)
+            except (PoolBusy, queue.Full):
+                response = busy_response()
+            except FrameDecodeError:
+                response = JSONResponse({"error": "Failed to decode image", "recognized": False}, status_code=400)
+            except Exception as e:
+                logger.exception(f"Error in {path}: {e}")
+                response = JSONResponse({"error": str(e), "recognized": False}, status_code=500)
+            metrics.record_request(path, response.status_code, time.perf_counter() - request.state.start)
+            return response
+        routes.append(Route(path, run, methods=methods))
+        return handler
+    return register
+
+async def read_json(request: Request) -> Dict:
+    """JSON request body ({} when empty or not an object)"""
+    try:
+        body = await asyncio.wait_for(request.body(), BODY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise BodyTimeout()
+    data = json.loads(body) if body else None
+    return data if isinstance(data, dict) else {}
+
+async def read_form(request: Request) -> Tuple[Dict[str, str], Dict[str, List[bytes]]]:
+    """Stream a multipart body in: (form fields, uploaded file contents by field name)"""
+    async def read():
+        form = await request.form()
+        try:
+            fields, files = {}, {}
+            for name, value in form.multi_items():
+                if isinstance(value, UploadFile):
+                    files.setdefault(name, []).append(await value.read())
+                else:
+                    fields.setdefault(name, value)
+            return fields, files
+        finally:
+            await form.close()
+
+    try:
+        return await asyncio.wait_for(read(), BODY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise BodyTimeout()
+
+def form_value(fields: Dict[str, str], name: str, cast: Callable[[str], Any], default: Any = None) -> Any:
+    """fields[name] converted by cast, or default when missing or malformed (like Flask's form.get(type=...))"""
+    try:
+        return cast(fields[name])
+    except (KeyError, ValueError):
+        return default
+
+async def _disconnected(request: Request):
+    """Return once the client disconnects (the body has already been read)"""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+async def wait_for_client(request: Request, work: Awaitable, timeout: Optional[float] = server.INFERENCE_TIMEOUT) -> Any:
+    """
+    Await work done on behalf of a client, cancelling it when the client disconnects
+    (ClientDisconnected) or after timeout seconds (asyncio.TimeoutError).
+    """
+    work = asyncio.ensure_future(work)
+    disconnect = asyncio.ensure_future(_disconnected(request))
+    try:
+        done, _ = await asyncio.wait({work, disconnect}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not work.done():
+            work.cancel()
+    if work in done:
+        return work.result()
+    if disconnect in done:
+        raise ClientDisconnected()
+    raise asyncio.TimeoutError()
+
+def offload(fn: Callable, *args) -> asyncio.Future:
+    """
+    Run fn(cancelled, *args) on the inference threads. Cancelling the returned future drops
+    fn if it has not started, and sets the cancelled event so it can skip the models if it has.
+    """
+    cancelled = threading.Event()
+    future = asyncio.get_running_loop().run_in_executor(executor, fn, cancelled, *args)
+    future.add_done_callback(lambda f: f.cancelled() and cancelled.set())
+    return future
+
+@contextmanager
+def model_lock(cancelled: threading.Event):
+    """ai_server.model_lock, giving up on the models if the request was cancelled while waiting"""
+    with server.model_lock():
+        if cancelled.is_set():
+            raise RequestCancelled()
+        yield
+
+async def models_ready() -> bool:
+    """ai_server.models_ready without blocking the event loop while models load"""
+    if server.pool is not None or server.recognizer.ready.is_set():
+        return True
+    return await asyncio.get_running_loop().run_in_executor(None, server.models_ready)
+
+def wants_timing(request: Request) -> bool:
+    return server.RESPONSE_TIMING or request.query_params.get("timing") in ("1", "true")
+
+def with_timing(request: Request, body: dict, timings) -> dict:
+    """Attach the per-request stage breakdown (ms) when the client asked for it"""
+    if wants_timing(request) and timings is not None:
+        breakdown = timings.to_dict()
+        breakdown["total_ms"] = round((time.perf_counter() - request.state.start) * 1000, 3)
+        body["timing"] = breakdown
+    return body
+
+def loading_response() -> JSONResponse:
+    return JSONResponse({"error": "AI models are still loading, retry later", "recognized": False},
+                        status_code=503, headers={"Retry-After": "5"})
+
+def busy_response() -> JSONResponse:
+    """Backpressure response when every worker is busy and the queue is full"""
+    return JSONResponse({"error": "AI server busy, retry later", "recognized": False},
+                        status_code=503, headers={"Retry-After": "1"})
+
+def not_initialized_response() -> JSONResponse:
+    return JSONResponse({"error": "AI module not initialized"}, status_code=500)
+
+# In-process work, run on the inference threads by offload()
+
+def _recognize_local(cancelled: threading.Event, data: bytes):
+    with metrics.collect() as timings:
+        frame = decode_frame(data)
+        if frame is None:
+            raise FrameDecodeError("Failed to decode image")
+        with model_lock(cancelled):
+            student_id = server.recognizer.recognize_face(frame)
+    return student_id, timings
+
+def _recognize_batch_local(cancelled: threading.Event, frames_data: List[bytes], clip_data: Optional[bytes],
+                           max_frames: int, stride: int, min_match: Optional[float]):
+    with metrics.collect() as timings:
+        frames = iter_batch_frames(frames_data, clip_data, max_frames, stride)
+        with model_lock(cancelled):
+            if min_match is None:
+                vote = server.recognizer.recognize_frames_voting(frames)
+            else:
+                vote = server.recognizer.recognize_frames_voting(frames, min_match)
+    return vote, timings
+
+def _decode_local(cancelled: threading.Event, data: bytes):
+    with metrics.collect() as timings:
+        frame = decode_frame(data)
+    if frame is None:
+        raise FrameDecodeError("Failed to decode image")
+    return frame, timings
+
+def _recognize_live_local(cancelled: threading.Event, frame, camera_id: Optional[str]):
+    with metrics.collect() as timings:
+        with model_lock(cancelled):
+            # Returns list of {"student_id", "confidence", "bbox", "recognized", "track_id"}
+            results = server.recognize_frames_local([frame], [camera_id])[0]
+    return results, timings
+
+@endpoint("/train", ["POST"])
+async def train(request: Request) -> Response:
+    """Queue a training job; answers 202 with a jobId (pass "wait": true to block until done)"""
+    if not server.training_jobs:
+        return not_initialized_response()
+
+    try:
+        data = await read_json(request)
+    except ValueError:
+        return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+    student_id = data.get("studentId")
+    frames_dir = data.get("framesDir")
+
+    if not student_id or not frames_dir:
+        return JSONResponse({"error": "Invalid payload: studentId and framesDir required"}, status_code=400)
+
+    job = server.training_jobs.submit(str(student_id), server.resolve_frames_dir(frames_dir))
+
+    if data.get("wait"):
+        # A client that leaves only abandons the wait; the job itself keeps running
+        waiting = asyncio.get_running_loop().run_in_executor(None, job.done.wait, server.TRAIN_TIMEOUT)
+        await wait_for_client(request, waiting, timeout=None)
+        if job.status != "succeeded":
+            return JSONResponse({"error": job.error or "Training timed out", "job": job.to_dict()}, status_code=400)
+        return JSONResponse({"status": "trained", "message": f"Successfully trained {student_id}",
+                             "jobId": job.job_id})
+
+    return JSONResponse({"status": "queued", "jobId": job.job_id, "job": job.to_dict()}, status_code=202)
+
+@endpoint("/recognize", ["POST"])
+async def recognize(request: Request) -> Response:
+    fields, files = await read_form(request)
+    if not files.get("frame"):
+        return JSONResponse({"error": "No frame received"}, status_code=400)
+    data = files["frame"][0]
+
+    timings = None
+    if server.recognizer and not await models_ready():
+        return loading_response()
+    if server.pool:
+        future = server.pool.submit("recognize", data)
+        student_id = await wait_for_client(request, asyncio.wrap_future(future))
+        timings = future.timings
+    elif server.recognizer:
+        student_id, timings = await wait_for_client(request, offload(_recognize_local, data))
+    else:
+        student_id = None
+
+    if student_id is None:
+        return JSONResponse(with_timing(request, {"recognized": False}, timings))
+
+    return JSONResponse(with_timing(request, {"recognized": True, "studentId": student_id}, timings))
+
+@endpoint("/recognize-batch", ["POST"])
+async def recognize_batch(request: Request) -> Response:
+    """Multi-frame check-in: "frames" images or one "clip" video, voted on (see ai_server.recognize_batch)"""
+    if not server.recognizer and not server.pool:
+        return not_initialized_response()
+
+    fields, files = await read_form(request)
+    frames_data = files.get("frames", [])
+    clip_data = files["clip"][0] if files.get("clip") else None
+    if not frames_data and not clip_data:
+        return JSONResponse({"error": "No frames received"}, status_code=400)
+    min_match = form_value(fields, "minMatchPercentage", float)
+    max_frames = min(form_value(fields, "maxFrames", int, server.MAX_BATCH_FRAMES), server.MAX_BATCH_FRAMES)
+    stride = form_value(fields, "frameStride", int, CLIP_FRAME_STRIDE)
+    if not await models_ready():
+        return loading_response()
+
+    if server.pool:
+        future = server.pool.submit("recognize_batch", (frames_data, clip_data, max_frames, stride, min_match))
+        vote = await wait_for_client(request, asyncio.wrap_future(future))
+        timings = future.timings
+    else:
+        vote, timings = await wait_for_client(request, offload(_recognize_batch_local, frames_data, clip_data,
+                                                               max_frames, stride, min_match))
+
+    body = {
+        "recognized": vote["student_id"] is not None,
+        "framesReceived": len(frames_data) if frames_data else None,
+        "framesProcessed": vote["frames_processed"],
+        "earlyExit": vote["early_exit"],
+        "scores": vote["scores"],
+    }
+    if vote["student_id"]:
+        body["studentId"] = vote["student_id"]
+    return JSONResponse(with_timing(request, body, timings))
+
+@endpoint("/recognize-live", ["POST"])
+async def recognize_live(request: Request) -> Response:
+    if not server.recognizer and not server.pool:
+        return not_initialized_response()
+
+    fields, files = await read_form(request)
+    if not files.get("frame"):
+        return JSONResponse({"error": "No frame received"}, status_code=400)
+    data = files["frame"][0]
+    # Optional: lets consecutive frames of one camera share face tracks (track_id in results)
+    camera_id = fields.get("cameraId")
+    if not await models_ready():
+        return loading_response()
+
+    if server.pool:
+        # Decoding happens in the worker process
+        future = server.pool.submit("recognize_live", (data, camera_id))
+        results = await wait_for_client(request, asyncio.wrap_future(future))
+        timings = future.timings
+    else:
+        frame, timings = await wait_for_client(request, offload(_decode_local, data))
+        if server.batcher:
+            # Coalesced with frames from other requests into one detection/embedding pass
+            future = server.batcher.submit((frame, camera_id))
+            results = await wait_for_client(request, asyncio.wrap_future(future))
+            timings.events.extend(future.timings.events)
+        else:
+            results, recognition = await wait_for_client(request, offload(_recognize_live_local, frame, camera_id))
+            timings.events.extend(recognition.events)
+
+    return JSONResponse(with_timing(request, {
+        "results": results,
+        "recognized": any(r["recognized"] for r in results),
+        "count": len(results)
+    }, timings))
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    server.init()
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# Native async routes first; everything else is served by the Flask app
+app = Starlette(routes=routes + [Mount("/", app=WSGIMiddleware(server.app))], lifespan=lifespan)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
@@ -0,0 +1,178 @@
+"""
+Approximate Nearest-Neighbour index for very large student galleries
+IVF-flat (inverted file) index implemented in NumPy: embeddings are bucketed by their
+nearest k-means centroid, and a query only scans the nprobe closest buckets.
+Used by EmbeddingGallery; the gallery falls back to exact search for small rosters.
+"""
+
+import numpy as np
+from typing import List, Optional, Tuple
+
+DEFAULT_NPROBE = 32  # Buckets scanned per query (higher = better recall, slower)
+DEFAULT_MIN_GALLERY_SIZE = 20000  # Below this, exact search is faster and perfectly accurate
+KMEANS_ITERATIONS = 10
+KMEANS_POINTS_PER_CENTROID = 40  # Training sample size per centroid
+ASSIGN_CHUNK = 65536  # Rows assigned per matmul when (re)building the lists
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index over the rows of an EmbeddingGallery matrix.
+    The index stores row numbers only; vectors stay in the gallery matrix.
+    Recall/latency trade-off is controlled by nprobe (and nlist at training time).
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = DEFAULT_NPROBE,
+                 min_gallery_size: int = DEFAULT_MIN_GALLERY_SIZE, seed: int = 0):
+        self.nlist = nlist  # None = choose sqrt(num_rows) at training time
+        self.nprobe = nprobe
+        self.min_gallery_size = min_gallery_size
+        self.seed = seed
+        self.centroids = None  # (nlist, dim) unit vectors
+        self.trained_size = 0
+        self._lists = []  # Per-bucket row arrays (with spare capacity)
+        self._list_sizes = None
+        self._list_of = np.empty(0, dtype=np.int32)  # row -> bucket
+        self._pos_of = np.empty(0, dtype=np.int64)  # row -> position in its bucket
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def needs_training(self, num_rows: int) -> bool:
+        """True when the gallery is big enough for ANN and the index is missing or stale"""
+        if num_rows < self.min_gallery_size:
+            return False
+        # Retrain once the gallery has grown 4x, as buckets get unbalanced
+        return not self.is_trained or num_rows > 4 * self.trained_size
+
+    def train(self, matrix: np.ndarray):
+        """Run spherical k-means on (a sample of) the matrix and bucket every row"""
+        num_rows = matrix.shape[0]
+        nlist = self.nlist or max(1, int(np.sqrt(num_rows)))
+        nlist = min(nlist, num_rows)
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(num_rows, nlist * KMEANS_POINTS_PER_CENTROID)
+        sample = matrix[np.sort(rng.choice(num_rows, sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty buckets with random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = num_rows
+        self._rebuild(matrix)
+
+    def _rebuild(self, matrix: np.ndarray):
+        num_rows = matrix.shape[0]
+        nlist = self.centroids.shape[0]
+        assign = np.empty(num_rows, dtype=np.int32)
+        for start in range(0, num_rows, ASSIGN_CHUNK):
+            chunk = matrix[start:start + ASSIGN_CHUNK]
+            assign[start:start + ASSIGN_CHUNK] = np.argmax(chunk @ self.centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        self._lists = []
+        for b in range(nlist):
+            rows = order[bounds[b]:bounds[b + 1]].astype(np.int64)
+            bucket = np.empty(max(16, 2 * rows.size), dtype=np.int64)
+            bucket[:rows.size] = rows
+            self._lists.append(bucket)
+        self._list_sizes = counts.astype(np.int64)
+
+        self._list_of = assign
+        self._pos_of = np.empty(num_rows, dtype=np.int64)
+        self._pos_of[order] = np.arange(num_rows) - bounds[assign[order]]
+
+    def _ensure_row_capacity(self, row: int):
+        if row < self._list_of.shape[0]:
+            return
+        capacity = max(row + 1, 2 * self._list_of.shape[0])
+        list_of = np.full(capacity, -1, dtype=np.int32)
+        list_of[:self._list_of.shape[0]] = self._list_of
+        pos_of = np.zeros(capacity, dtype=np.int64)
+        pos_of[:self._pos_of.shape[0]] = self._pos_of
+        self._list_of, self._pos_of = list_of, pos_of
+
+    def add(self, row: int, vector: np.ndarray):
+        """Bucket a new gallery row"""
+        self._ensure_row_capacity(row)
+        bucket = int(np.argmax(self.centroids @ vector))
+        size = self._list_sizes[bucket]
+        if size == self._lists[bucket].shape[0]:
+            grown = np.empty(2 * size, dtype=np.int64)
+            grown[:size] = self._lists[bucket]
+            self._lists[bucket] = grown
+        self._lists[bucket][size] = row
+        self._list_sizes[bucket] = size + 1
+        self._list_of[row] = bucket
+        self._pos_of[row] = size
+
+    def remove(self, row: int):
+        """Drop a row from its bucket (swap-with-last inside the bucket)"""
+        bucket = self._list_of[row]
+        if bucket < 0:
+            return
+        pos = self._pos_of[row]
+        last = self._list_sizes[bucket] - 1
+        moved = self._lists[bucket][last]
+        self._lists[bucket][pos] = moved
+        self._pos_of[moved] = pos
+        self._list_sizes[bucket] = last
+        self._list_of[row] = -1
+
+    def update(self, row: int, vector: np.ndarray):
+        """Re-bucket a row whose vector changed"""
+        self.remove(row)
+        self.add(row, vector)
+
+    def move(self, src: int, dst: int):
+        """The gallery moved row src into slot dst (after removing dst)"""
+        self._ensure_row_capacity(dst)
+        bucket = self._list_of[src]
+        pos = self._pos_of[src]
+        self._lists[bucket][pos] = dst
+        self._list_of[dst] = bucket
+        self._pos_of[dst] = pos
+        self._list_of[src] = -1
+
+    def search(self, queries: np.ndarray, matrix: np.ndarray, top_k: int = 1) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Approximate top-k search.
+        Args:
+            queries: (num_queries, dim) unit vectors
+            matrix: Gallery matrix the stored rows refer to
+            top_k: Results per query
+        Returns:
+            For each query, (rows, scores) sorted best first (may hold fewer than top_k)
+        """
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for query, probe in zip(queries, probes):
+            rows = np.concatenate([self._lists[b][:self._list_sizes[b]] for b in probe])
+            if rows.size == 0:
+                results.append((rows, np.empty(0, dtype=np.float32)))
+                continue
+            scores = matrix[rows] @ query
+            k = min(top_k, rows.size)
+            if k < rows.size:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(rows.size)
+            top = top[np.argsort(-scores[top])]
+            results.append((rows[top], scores[top]))
+        return results
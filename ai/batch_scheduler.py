@@ -0,0 +1,135 @@
+"""
+Dynamic micro-batching for live recognition
+Frames posted to /recognize-live by many cameras at once are coalesced: the scheduler waits
+up to window_ms after the first frame (or until max_batch_size frames are queued), runs
+YOLO + ArcFace once for the whole batch, and hands each caller its own results.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+DEFAULT_WINDOW_MS = 10.0
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_QUEUE = 64
+
+
+class BatchStats:
+    """Thread-safe per-batch statistics (batch sizes, queue wait, processing time)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.max_batch = 0
+        self.size_counts: Dict[int, int] = {}
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_process_ms = 0.0
+        self.last_batch: Optional[Dict] = None
+
+    def record(self, size: int, wait_ms: List[float], process_ms: float):
+        with self._lock:
+            self.batches += 1
+            self.frames += size
+            self.max_batch = max(self.max_batch, size)
+            self.size_counts[size] = self.size_counts.get(size, 0) + 1
+            self.total_wait_ms += sum(wait_ms)
+            self.max_wait_ms = max([self.max_wait_ms] + list(wait_ms))
+            self.total_process_ms += process_ms
+            self.last_batch = {"size": size, "process_ms": round(process_ms, 2),
+                               "max_wait_ms": round(max(wait_ms), 2) if wait_ms else 0.0}
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "frames": self.frames,
+                "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self.size_counts.items())},
+                "avg_queue_wait_ms": round(self.total_wait_ms / self.frames, 2) if self.frames else 0.0,
+                "max_queue_wait_ms": round(self.max_wait_ms, 2),
+                "avg_batch_process_ms": round(self.total_process_ms / self.batches, 2) if self.batches else 0.0,
+                "last_batch": self.last_batch,
+            }
+
+
+def collect_batch(source: "queue.Queue", first: Any, window_s: float, max_size: int) -> List[Any]:
+    """Gather items arriving within window_s of the first one, up to max_size items"""
+    batch = [first]
+    deadline = time.perf_counter() + window_s
+    while len(batch) < max_size:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(source.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+class MicroBatcher:
+    """Coalesces single-frame requests into batches processed by one background thread"""
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 window_ms: float = DEFAULT_WINDOW_MS, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_queue: int = DEFAULT_MAX_QUEUE, lock: Optional[threading.Lock] = None):
+        """
+        Args:
+            process_batch: Function mapping a list of payloads to a list of results (same order)
+            window_ms: How long to wait for more frames after the first one arrives
+            max_batch_size: Run immediately once this many frames are queued
+            max_queue: Pending frames before submit() raises queue.Full
+            lock: Optional lock held while a batch is processed (shared with other model users)
+        """
+        self.process_batch = process_batch
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.lock = lock
+        self.stats = BatchStats()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="ai-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Any) -> Future:
+        """Queue one frame. Raises queue.Full when the scheduler is saturated."""
+        future = Future()
+        self._queue.put_nowait((payload, future, time.perf_counter()))
+        return future
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = collect_batch(self._queue, first, self.window_ms / 1000.0, self.max_batch_size)
+            # Frames whose caller cancelled (e.g. the client disconnected) are dropped
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            wait_ms = [(started - queued_at) * 1000 for _, _, queued_at in batch]
+            try:
+                with metrics.collect() as shared:
+                    if self.lock is not None:
+                        lock_start = time.perf_counter()
+                        with self.lock:
+                            metrics.record_wait("lock", time.perf_counter() - lock_start)
+                            results = self.process_batch([payload for payload, _, _ in batch])
+                    else:
+                        results = self.process_batch([payload for payload, _, _ in batch])
+                for (_, future, _), result, wait in zip(batch, results, wait_ms):
+                    # Each caller's breakdown: the shared batch stages plus its own batch-window wait
+                    metrics.record_wait("batch", wait / 1000)
+                    future.timings = shared.copy()
+                    future.timings.add("wait", "batch", wait / 1000)
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.stats.record(len(batch), wait_ms, (time.perf_counter() - started) * 1000)
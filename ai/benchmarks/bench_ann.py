@@ -0,0 +1,127 @@
+"""
+ANN vs exact gallery search benchmark
+Measures recall@1 / recall@k and per-query latency of the IVF-flat index against exact
+matmul search on synthetic 512-d unit vectors.
+
+Usage (from the ai/ directory):
+    python benchmarks/bench_ann.py                      # 10k, 100k and 1M identities
+    python benchmarks/bench_ann.py --sizes 10000 --nprobe 4 8 16 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_gallery import EmbeddingGallery
+from ann_index import IVFFlatIndex
+
+DIM = 512
+CHUNK = 100000  # Identities generated per chunk (keeps peak memory near the gallery size)
+
+
+def unit_vectors(rng: np.random.Generator, count: int, dim: int = DIM) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build_gallery(size: int, seed: int, index=None) -> EmbeddingGallery:
+    """Fill a gallery with `size` random identities (rows written directly, in chunks)"""
+    rng = np.random.default_rng(seed)
+    gallery = EmbeddingGallery(dim=DIM, capacity=size, index=index)
+    for start in range(0, size, CHUNK):
+        count = min(CHUNK, size - start)
+        gallery._matrix[start:start + count] = unit_vectors(rng, count)
+    gallery._ids[:size] = [f"student_{i}" for i in range(size)]
+    gallery._row_of = {f"student_{i}": i for i in range(size)}
+    gallery._size = size
+    return gallery
+
+
+def make_queries(gallery: EmbeddingGallery, num_queries: int, noise: float, seed: int):
+    """Noisy copies of random enrolled identities, like a live face vs. its enrollment"""
+    rng = np.random.default_rng(seed + 1)
+    rows = rng.choice(len(gallery), num_queries, replace=False)
+    queries = gallery._matrix[rows] + noise * unit_vectors(rng, num_queries)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.astype(np.float32)
+
+
+def timed_search(gallery: EmbeddingGallery, queries: np.ndarray, top_k: int, batch: int):
+    latencies = []
+    results = []
+    for start in range(0, len(queries), batch):
+        t0 = time.perf_counter()
+        results.extend(gallery.search(queries[start:start + batch], top_k=top_k))
+        latencies.append((time.perf_counter() - t0) * 1000 / len(queries[start:start + batch]))
+    return results, np.array(latencies)
+
+
+def run(size: int, nprobes, num_queries: int, top_k: int, batch: int, noise: float, seed: int):
+    print(f"\n[Bench] Gallery size {size:,}")
+    gallery = build_gallery(size, seed)
+    queries = make_queries(gallery, num_queries, noise, seed)
+
+    exact, exact_lat = timed_search(gallery, queries, top_k, batch)
+    exact_top1 = [r[0][0] for r in exact]
+    exact_topk = [set(sid for sid, _ in r) for r in exact]
+    report = {
+        "size": size,
+        "exact": {"p50_ms": float(np.percentile(exact_lat, 50)), "p95_ms": float(np.percentile(exact_lat, 95))},
+        "ivf": [],
+    }
+    print(f"[Bench]   exact: p50 {report['exact']['p50_ms']:.3f} ms/query")
+
+    index = IVFFlatIndex(min_gallery_size=0, seed=seed)
+    t0 = time.perf_counter()
+    gallery.index = index
+    index.train(gallery._matrix[:size])
+    build_s = time.perf_counter() - t0
+    print(f"[Bench]   ivf build: {build_s:.1f}s ({index.centroids.shape[0]} lists)")
+
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        approx, lat = timed_search(gallery, queries, top_k, batch)
+        recall1 = np.mean([bool(a) and a[0][0] == e for a, e in zip(approx, exact_top1)])
+        recallk = np.mean([len(set(sid for sid, _ in a) & e) / len(e) for a, e in zip(approx, exact_topk)])
+        entry = {
+            "nprobe": nprobe,
+            "build_s": build_s,
+            "recall@1": float(recall1),
+            f"recall@{top_k}": float(recallk),
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+        }
+        report["ivf"].append(entry)
+        print(f"[Bench]   ivf nprobe={nprobe:<3} recall@1 {recall1:.3f}  recall@{top_k} {recallk:.3f}  "
+              f"p50 {entry['p50_ms']:.3f} ms/query  ({report['exact']['p50_ms'] / max(entry['p50_ms'], 1e-9):.1f}x)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF-flat vs exact gallery search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=10, help="Faces matched per search call")
+    parser.add_argument("--noise", type=float, default=0.8, help="Query noise (0.8 ~ cosine 0.78 to its identity)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    reports = [run(size, args.nprobe, args.queries, args.top_k, args.batch, args.noise, args.seed)
+               for size in args.sizes]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n[Bench] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
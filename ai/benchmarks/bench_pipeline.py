@@ -0,0 +1,305 @@
+"""
+Detection / recognition hot-path benchmark
+Times each stage of FaceRecognizer on synthetic frames and galleries and reports
+p50/p95/p99 latency and frames per second:
+  detect      detect_faces_yolo on one frame
+  preprocess  preprocess_face for every face in the frame
+  align       face_crops: landmark alignment of every face in the frame in one warp batch
+  embed       generate_embeddings (batched) for every face in the frame
+  match       match_embeddings for every face in the frame, per gallery size
+  end_to_end  recognize_all_faces on one frame
+
+With --models stub (the default) YOLO and ArcFace are replaced by stand-ins that return
+fixed boxes (with template landmarks) and a random projection, so the suite runs offline without model weights and
+measures the code around the models. --models real loads the actual models.
+
+Usage (from the ai/ directory):
+    python benchmarks/bench_pipeline.py --output before.json
+    python benchmarks/bench_pipeline.py --output after.json --baseline before.json
+    python benchmarks/bench_pipeline.py --compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_module_yolo import FaceRecognizer, FACE_SIZE
+from embedding_gallery import EmbeddingGallery
+from face_alignment import ARCFACE_TEMPLATE, CROP_MODE, TEMPLATE_SIZE
+from detection_profiles import ProfileRegistry
+from frame_gate import GateRegistry
+from bench_ann import build_gallery, unit_vectors
+
+DIM = 512
+FRAME_SHAPE = (720, 1280, 3)
+FACE_COUNTS = [1, 10, 60]
+GALLERY_SIZES = [100, 1000, 10000, 100000, 1000000]
+END_TO_END_GALLERY = 1000
+REGRESSION_THRESHOLD = 0.10  # Flag a stage when p50 or p95 grows by more than this fraction
+
+
+class _StubArray:
+    """Mimics the torch tensors in ultralytics results (.cpu().numpy())"""
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _StubBoxes:
+    def __init__(self, boxes: np.ndarray):
+        self.xyxy = _StubArray(boxes[:, :4])
+        self.conf = _StubArray(boxes[:, 4])
+
+    def __len__(self):
+        return len(self.xyxy.array)
+
+
+class _StubKeypoints:
+    def __init__(self, boxes: np.ndarray):
+        # ArcFace template landmarks scaled into each box
+        scale = (boxes[:, 2:4] - boxes[:, 0:2]) / TEMPLATE_SIZE
+        self.xy = _StubArray(boxes[:, None, 0:2] + ARCFACE_TEMPLATE[None] * scale[:, None])
+
+
+class _StubResult:
+    def __init__(self, boxes: np.ndarray):
+        self.boxes = _StubBoxes(boxes)
+        self.keypoints = _StubKeypoints(boxes)
+
+
+class StubYOLO:
+    """Stands in for the ultralytics model: returns the same boxes for every frame"""
+
+    class model:
+        pt_path = "stub"
+
+    def __init__(self):
+        self.boxes = np.zeros((0, 5), dtype=np.float32)
+
+    def __call__(self, source, conf=None, verbose=False):
+        frames = source if isinstance(source, list) else [source]
+        return [_StubResult(self.boxes) for _ in frames]
+
+
+class StubArcFace:
+    """Stands in for the ArcFace Keras model: a fixed random projection of the input"""
+
+    def __init__(self, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        pooled = (FACE_SIZE[0] // 4) * (FACE_SIZE[1] // 4) * 3
+        self.projection = rng.standard_normal((pooled, DIM), dtype=np.float32)
+
+    def __call__(self, batch, training=False):
+        pooled = np.ascontiguousarray(batch[:, ::4, ::4, :]).reshape(len(batch), -1)
+        return pooled @ self.projection
+
+
+def make_stub_recognizer(seed: int = 0) -> FaceRecognizer:
+    """FaceRecognizer wired to stub models and an empty in-memory gallery (no files touched)"""
+    recognizer = FaceRecognizer.__new__(FaceRecognizer)
+    recognizer.yolo_model = StubYOLO()
+    recognizer._model_logged = True
+    recognizer._arcface_model = StubArcFace(seed)
+    recognizer._arcface_lock = threading.Lock()
+    recognizer.fallback_detector = None
+    recognizer._fallback_lock = threading.Lock()
+    recognizer.offline = True
+    recognizer.ready = threading.Event()
+    recognizer.ready.set()
+    recognizer.model_status = {"yolo": "stub", "arcface": "stub", "warmup": "skipped"}
+    recognizer.load_seconds = {}
+    recognizer.gallery = EmbeddingGallery(dim=DIM)
+    recognizer.crop_mode = CROP_MODE
+    recognizer.store = None
+    recognizer.profiles = ProfileRegistry()
+    recognizer.gates = GateRegistry(enabled=False)
+    recognizer.embedding_cache = None  # Measure the model, not the cache
+    recognizer.refresh = None  # Never write the gallery from benchmark frames
+    recognizer._store_lock = threading.Lock()
+    return recognizer
+
+
+def synthetic_frame(rng: np.random.Generator, num_faces: int):
+    """Noise frame plus num_faces non-overlapping face boxes laid out on a grid"""
+    frame = rng.integers(0, 256, FRAME_SHAPE, dtype=np.uint8)
+    height, width = FRAME_SHAPE[:2]
+    cols = int(np.ceil(np.sqrt(num_faces * width / height)))
+    rows = int(np.ceil(num_faces / cols))
+    cell_w, cell_h = width // cols, height // rows
+    size = int(min(cell_w, cell_h) * 0.7)
+    boxes = []
+    for i in range(num_faces):
+        x1 = (i % cols) * cell_w + (cell_w - size) // 2
+        y1 = (i // cols) * cell_h + (cell_h - size) // 2
+        boxes.append((x1, y1, x1 + size, y1 + size, 0.9))
+    return frame, np.array(boxes, dtype=np.float32).reshape(-1, 5)
+
+
+def summarize(latencies_ms: List[float]) -> Dict:
+    lat = np.asarray(latencies_ms)
+    return {
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "mean_ms": float(lat.mean()),
+        "fps": float(1000.0 / lat.mean()) if lat.mean() > 0 else 0.0,
+        "iterations": len(lat),
+    }
+
+
+def time_stage(fn: Callable[[], object], iterations: int, warmup: int) -> Dict:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return summarize(latencies)
+
+
+def quiet(fn: Callable[[], object]) -> Callable[[], object]:
+    """Drop the recognizer's per-call console output so printing is not what gets measured"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+
+def fill_gallery(recognizer: FaceRecognizer, size: int, seed: int):
+    if size == 0:
+        recognizer.gallery = EmbeddingGallery(dim=DIM)
+    else:
+        recognizer.gallery = build_gallery(size, seed, index=recognizer._make_ann_index())
+
+
+def run(recognizer: FaceRecognizer, face_counts: List[int], gallery_sizes: List[int],
+        iterations: int, warmup: int, seed: int, stub: bool) -> Dict[str, Dict]:
+    rng = np.random.default_rng(seed)
+    results: Dict[str, Dict] = {}
+
+    def record(name: str, fn: Callable[[], object], count: Optional[int] = None):
+        results[name] = time_stage(fn, iterations if count is None else count, warmup)
+        r = results[name]
+        print(f"[Bench] {name:<34} p50 {r['p50_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms  "
+              f"p99 {r['p99_ms']:8.3f} ms  {r['fps']:9.1f} fps")
+
+    for num_faces in face_counts:
+        frame, boxes = synthetic_frame(rng, num_faces)
+        if stub:
+            recognizer.yolo_model.boxes = boxes
+        detections = recognizer.detect_faces_yolo(frame) or [tuple(int(v) for v in b[:4]) for b in boxes]
+        crops = [c for c in recognizer.face_crops(frame, detections) if c is not None]
+        embeddings = unit_vectors(rng, len(crops) or 1)
+
+        record(f"detect/faces={num_faces}", lambda: recognizer.detect_faces_yolo(frame))
+        record(f"preprocess/faces={num_faces}",
+               lambda: [recognizer.preprocess_face(frame, d[:4]) for d in detections])
+        record(f"align/faces={num_faces}", lambda: recognizer.face_crops(frame, detections))
+        record(f"embed/faces={num_faces}", lambda: recognizer.generate_embeddings(crops))
+
+        for size in gallery_sizes:
+            fill_gallery(recognizer, size, seed)
+            record(f"match/faces={num_faces}/gallery={size}",
+                   lambda: recognizer.match_embeddings(embeddings))
+
+        fill_gallery(recognizer, END_TO_END_GALLERY, seed)
+        record(f"end_to_end/faces={num_faces}/gallery={END_TO_END_GALLERY}",
+               quiet(lambda: recognizer.recognize_all_faces(frame)))
+    return results
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Print per-stage p50/p95 changes; returns the stages that regressed beyond threshold"""
+    regressions = []
+    base_stages = baseline["results"]
+    print(f"\n[Bench] Comparison against baseline (regression threshold {threshold:.0%})")
+    for name, cur in current["results"].items():
+        base = base_stages.get(name)
+        if base is None:
+            print(f"[Bench] {name:<34} (new stage)")
+            continue
+        changes = {key: (cur[key] - base[key]) / base[key] if base[key] > 0 else 0.0
+                   for key in ("p50_ms", "p95_ms")}
+        regressed = any(change > threshold for change in changes.values())
+        if regressed:
+            regressions.append(name)
+        print(f"[Bench] {name:<34} p50 {changes['p50_ms']:+7.1%}  p95 {changes['p95_ms']:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    if baseline.get("meta", {}).get("models") != current.get("meta", {}).get("models"):
+        print("[Bench] Warning: runs used different model backends")
+    print(f"[Bench] {len(regressions)} regression(s)")
+    return regressions
+
+
+def load_report(path: str) -> Dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection/recognition hot paths")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub",
+                        help="stub: no weights needed; real: load YOLOv8-face and ArcFace")
+    parser.add_argument("--faces", type=int, nargs="+", default=FACE_COUNTS, help="Faces per frame")
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=GALLERY_SIZES)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Compare this run against an earlier JSON report")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Only compare two existing reports")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(load_report(args.compare[0]), load_report(args.compare[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    stub = args.models == "stub"
+    recognizer = make_stub_recognizer(args.seed) if stub else FaceRecognizer()
+    report = {
+        "meta": {
+            "models": args.models,
+            "iterations": args.iterations,
+            "frame_shape": list(FRAME_SHAPE),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time(),
+        },
+        "results": run(recognizer, args.faces, args.gallery_sizes, args.iterations, args.warmup,
+                       args.seed, stub),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[Bench] Report written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(load_report(args.baseline), report, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
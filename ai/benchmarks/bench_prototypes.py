@@ -0,0 +1,146 @@
+"""
+Prototype gallery benchmark: one median embedding vs several prototypes per student
+Synthetic identities are enrolled with embeddings drawn from a few "conditions" (lighting,
+glasses, pose) around the identity, then probed with fresh samples from those conditions
+and with unenrolled impostors. For each configuration it reports:
+  - rows / bytes per student (gallery memory)
+  - search latency per batch of faces (one matmul + pooling)
+  - rank-1 identification accuracy on enrolled probes
+  - true-accept rate at the threshold that lets through 1% of impostors (open-set accuracy)
+
+Usage (from the ai/ directory):
+    python benchmarks/bench_prototypes.py
+    python benchmarks/bench_prototypes.py --students 5000 --modes 3 --output prototypes.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_gallery import EmbeddingGallery
+from prototypes import select_prototypes
+
+DIM = 512
+TARGET_FAR = 0.01
+
+# (name, max prototypes, clustering method, pooling)
+CONFIGS = [
+    ("median", 1, "kmeans", "max"),
+    ("kmeans-3/max", 3, "kmeans", "max"),
+    ("kmeans-3/softmax", 3, "kmeans", "softmax"),
+    ("kmedoids-3/max", 3, "kmedoids", "max"),
+    ("kmeans-5/max", 5, "kmeans", "max"),
+]
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def make_identity(rng: np.random.Generator, modes: int, mode_spread: float):
+    """Identity center plus one center per capture condition"""
+    center = unit(rng.standard_normal(DIM))
+    return unit(center + mode_spread * unit(rng.standard_normal((modes, DIM))))
+
+
+def sample(rng: np.random.Generator, mode_centers: np.ndarray, count: int, noise: float,
+           weights: np.ndarray) -> np.ndarray:
+    picks = rng.choice(len(mode_centers), count, p=weights)
+    return unit(mode_centers[picks] + noise * unit(rng.standard_normal((count, DIM))))
+
+
+def build(args, rng: np.random.Generator):
+    """Enrollment sets, enrolled probes and impostor probes"""
+    enroll, probes, labels = {}, [], []
+    for i in range(args.students):
+        modes = make_identity(rng, args.modes, args.mode_spread)
+        # Uneven conditions: most enrollment frames come from one of them
+        weights = rng.dirichlet(np.full(args.modes, 2.0))
+        enroll[f"student_{i}"] = sample(rng, modes, args.enroll, args.noise, weights)
+        probes.append(sample(rng, modes, args.probes, args.noise, np.full(args.modes, 1.0 / args.modes)))
+        labels += [f"student_{i}"] * args.probes
+    uniform = np.full(args.modes, 1.0 / args.modes)
+    impostors = [sample(rng, make_identity(rng, args.modes, args.mode_spread), 1, args.noise, uniform)
+                 for _ in range(args.impostors)]
+    return enroll, np.concatenate(probes), labels, np.concatenate(impostors)
+
+
+def timed_search(gallery: EmbeddingGallery, queries: np.ndarray, batch: int):
+    latencies, results = [], []
+    for start in range(0, len(queries), batch):
+        t0 = time.perf_counter()
+        results.extend(gallery.search(queries[start:start + batch], top_k=1))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return [r[0] for r in results], np.array(latencies)
+
+
+def run(config, enroll, probes, labels, impostors, batch: int):
+    name, max_prototypes, method, pooling = config
+    gallery = EmbeddingGallery(dim=DIM, pooling=pooling)
+    t0 = time.perf_counter()
+    for student_id, embeddings in enroll.items():
+        gallery.set_prototypes(student_id, select_prototypes(list(embeddings), max_prototypes=max_prototypes,
+                                                             method=method))
+    train_s = time.perf_counter() - t0
+
+    genuine, latency = timed_search(gallery, probes, batch)
+    impostor, _ = timed_search(gallery, impostors, batch)
+    genuine_scores = np.array([score for _, score in genuine])
+    impostor_scores = np.array([score for _, score in impostor])
+    threshold = float(np.quantile(impostor_scores, 1.0 - TARGET_FAR))
+    correct = np.array([student_id == label for (student_id, _), label in zip(genuine, labels)])
+
+    rows_per_student = len(gallery) / len(enroll)
+    entry = {
+        "config": name,
+        "rows_per_student": round(rows_per_student, 2),
+        "bytes_per_student": int(rows_per_student * DIM * 4),
+        "train_s": round(train_s, 2),
+        "p50_ms_per_batch": float(np.percentile(latency, 50)),
+        "p95_ms_per_batch": float(np.percentile(latency, 95)),
+        "rank1_accuracy": float(correct.mean()),
+        "threshold_at_far": threshold,
+        "tar_at_far": float(np.mean(correct & (genuine_scores > threshold))),
+    }
+    print(f"[Bench]   {name:<17} {entry['rows_per_student']:>5.2f} rows/student  "
+          f"p50 {entry['p50_ms_per_batch']:.3f} ms/batch  rank-1 {entry['rank1_accuracy']:.3f}  "
+          f"TAR@FAR={TARGET_FAR:.0%} {entry['tar_at_far']:.3f} (threshold {threshold:.3f})")
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prototype galleries against a single median embedding")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--modes", type=int, default=3, help="Capture conditions per student")
+    parser.add_argument("--mode-spread", type=float, default=0.8, help="Distance of conditions from the identity")
+    parser.add_argument("--noise", type=float, default=0.6, help="Per-frame noise around a condition")
+    parser.add_argument("--enroll", type=int, default=30, help="Enrollment embeddings per student")
+    parser.add_argument("--probes", type=int, default=3, help="Probe faces per student")
+    parser.add_argument("--impostors", type=int, default=2000, help="Probe faces of unenrolled people")
+    parser.add_argument("--batch", type=int, default=10, help="Faces matched per search call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    enroll, probes, labels, impostors = build(args, rng)
+    print(f"[Bench] {args.students:,} students x {args.modes} conditions, {len(probes):,} probes, "
+          f"{len(impostors):,} impostors")
+    report = {
+        "students": args.students,
+        "modes": args.modes,
+        "results": [run(config, enroll, probes, labels, impostors, args.batch) for config in CONFIGS],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[Bench] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Camera ingestion pipeline
+Pulls RTSP/HTTP streams (or local video files standing in for cameras) directly with
+cv2.VideoCapture instead of receiving re-encoded JPEG uploads from the backend.
+  - One decode thread per camera keeps only the latest frame (stale frames are dropped)
+  - One pipeline thread takes the newest unseen frame of every camera, runs batched
+    detection/recognition on them, and pushes recognition events to subscribers
+
+Offline usage (local files behave like live cameras, paced at their native FPS):
+    python camera_ingest.py lecture_a.mp4 lecture_b.mp4
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+RECONNECT_DELAY = 2.0  # Seconds before reopening a stream that failed
+IDLE_SLEEP = 0.005  # Pipeline sleep when no camera has a new frame
+DEFAULT_MAX_BATCH = 8  # Max camera frames per detection/recognition pass
+WEBHOOK_QUEUE_SIZE = 256  # Events buffered for the webhook before the oldest are dropped
+WEBHOOK_TIMEOUT = 5.0
+
+
+def is_file_source(source: Any) -> bool:
+    return isinstance(source, str) and os.path.isfile(source)
+
+
+class CameraStream:
+    """Decodes one camera in a background thread, keeping only the most recent frame"""
+
+    def __init__(self, camera_id: str, source: Any, loop: bool = False, realtime: Optional[bool] = None):
+        """
+        Args:
+            camera_id: Identifier used in events
+            source: RTSP/HTTP URL, device index, or path to a local video file
+            loop: Restart local files at the end (simulates a camera that never stops)
+            realtime: Pace reads at the stream FPS (default True for files, False for live streams)
+        """
+        self.camera_id = camera_id
+        self.source = source
+        self.loop = loop
+        self.realtime = is_file_source(source) if realtime is None else realtime
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._seq = 0  # Increments for every decoded frame
+        self._timestamp = 0.0
+        self.frames_decoded = 0
+        self.frames_dropped = 0  # Decoded but replaced before the pipeline consumed them
+        self._consumed_seq = 0
+        self.error: Optional[str] = None
+        self.finished = False
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"camera-{camera_id}", daemon=True)
+
+    def start(self) -> "CameraStream":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return None
+        # Keep the driver-side buffer minimal so we read fresh frames on live streams
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture
+
+    def _run(self):
+        while not self._stop.is_set():
+            capture = self._open()
+            if capture is None:
+                self.error = f"Could not open source: {self.source}"
+                if is_file_source(self.source) and not self.loop:
+                    break
+                self._stop.wait(RECONNECT_DELAY)
+                continue
+
+            self.error = None
+            fps = capture.get(cv2.CAP_PROP_FPS) or 0
+            interval = 1.0 / fps if self.realtime and fps > 0 else 0.0
+            next_read = time.perf_counter()
+
+            while not self._stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                with self._lock:
+                    if self._seq > self._consumed_seq:
+                        self.frames_dropped += 1
+                    self._frame = frame
+                    self._seq += 1
+                    self._timestamp = time.time()
+                    self.frames_decoded += 1
+                if interval:
+                    next_read += interval
+                    delay = next_read - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_read = time.perf_counter()
+            capture.release()
+
+            if is_file_source(self.source) and not self.loop:
+                break
+            if not is_file_source(self.source):
+                self.error = "Stream ended, reconnecting"
+                self._stop.wait(RECONNECT_DELAY)
+        self.finished = True
+
+    def take_latest(self):
+        """Return (seq, frame, timestamp) for a frame not yet consumed, or None"""
+        with self._lock:
+            if self._frame is None or self._seq == self._consumed_seq:
+                return None
+            self._consumed_seq = self._seq
+            return self._seq, self._frame, self._timestamp
+
+    def status(self) -> Dict:
+        return {
+            "camera_id": self.camera_id,
+            "source": str(self.source),
+            "frames_decoded": self.frames_decoded,
+            "frames_dropped": self.frames_dropped,
+            "last_frame_at": self._timestamp or None,
+            "running": self._thread.is_alive(),
+            "error": self.error,
+        }
+
+
+class IngestionPipeline:
+    """Feeds the newest frame of every camera into a shared detection/recognition pass"""
+
+    def __init__(self, process_frames: Callable[[List[np.ndarray], List[str]], List[List[Dict]]],
+                 max_batch_size: int = DEFAULT_MAX_BATCH, lock: Optional[threading.Lock] = None):
+        """
+        Args:
+            process_frames: Batched recognizer called with (frames, camera_ids)
+            max_batch_size: Max camera frames per pass
+            lock: Optional lock held around process_frames (shared with other model users)
+        """
+        self.process_frames = process_frames
+        self.max_batch_size = max(1, max_batch_size)
+        self.lock = lock
+        self._cameras: Dict[str, CameraStream] = {}
+        self._cameras_lock = threading.Lock()
+        self._subscribers: List[Callable[[Dict], None]] = []
+        self._next_camera = 0  # Round-robin start so every camera gets a turn when over capacity
+        self.frames_processed = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="camera-pipeline", daemon=True)
+        self._thread.start()
+
+    def add_camera(self, camera_id: str, source: Any, loop: bool = False,
+                   realtime: Optional[bool] = None) -> CameraStream:
+        self.remove_camera(camera_id)
+        stream = CameraStream(camera_id, source, loop=loop, realtime=realtime).start()
+        with self._cameras_lock:
+            self._cameras[camera_id] = stream
+        print(f"[Ingest] Camera {camera_id} added ({source})")
+        return stream
+
+    def remove_camera(self, camera_id: str) -> bool:
+        with self._cameras_lock:
+            stream = self._cameras.pop(camera_id, None)
+        if stream is None:
+            return False
+        stream.stop()
+        print(f"[Ingest] Camera {camera_id} removed")
+        return True
+
+    def cameras(self) -> List[Dict]:
+        with self._cameras_lock:
+            return [stream.status() for stream in self._cameras.values()]
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """Register a callback receiving every recognition event"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        for camera_id in [c["camera_id"] for c in self.cameras()]:
+            self.remove_camera(camera_id)
+
+    def _collect(self) -> List[tuple]:
+        with self._cameras_lock:
+            streams = list(self._cameras.values())
+        if not streams:
+            return []
+        start = self._next_camera % len(streams)
+        ordered = streams[start:] + streams[:start]
+        batch = []
+        for stream in ordered:
+            latest = stream.take_latest()
+            if latest is not None:
+                batch.append((stream.camera_id,) + latest)
+                if len(batch) == self.max_batch_size:
+                    break
+        self._next_camera = start + len(batch)
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                self._stop.wait(IDLE_SLEEP)
+                continue
+
+            frames = [frame for _, _, frame, _ in batch]
+            camera_ids = [camera_id for camera_id, _, _, _ in batch]
+            try:
+                if self.lock is not None:
+                    with self.lock:
+                        all_results = self.process_frames(frames, camera_ids)
+                else:
+                    all_results = self.process_frames(frames, camera_ids)
+            except Exception as e:
+                print(f"[Ingest] Recognition error: {e}")
+                continue
+            self.frames_processed += len(frames)
+
+            for (camera_id, seq, _, timestamp), results in zip(batch, all_results):
+                self._publish({
+                    "camera_id": camera_id,
+                    "seq": seq,
+                    "timestamp": timestamp,
+                    "results": results,
+                    "recognized": any(r["recognized"] for r in results),
+                    "count": len(results),
+                })
+
+    def _publish(self, event: Dict):
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[Ingest] Subscriber error: {e}")
+
+
+class WebhookPublisher:
+    """Subscriber that POSTs recognition events as JSON to a URL from a background thread"""
+
+    def __init__(self, url: str, only_recognized: bool = True):
+        self.url = url
+        self.only_recognized = only_recognized
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+        threading.Thread(target=self._run, name="camera-webhook", daemon=True).start()
+
+    def __call__(self, event: Dict):
+        if self.only_recognized and not event["recognized"]:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            request = urllib.request.Request(self.url, data=json.dumps(event).encode("utf-8"),
+                                             headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT).close()
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[Ingest] Webhook delivery failed: {e}")
+
+
+if __name__ == "__main__":
+    from ai_module_yolo import FaceRecognizer
+    from face_tracker import TrackerRegistry
+
+    if len(sys.argv) < 2:
+        print("Usage: python camera_ingest.py <video file or RTSP URL> [...]")
+        sys.exit(1)
+
+    recognizer = FaceRecognizer()
+    trackers = TrackerRegistry()
+    pipeline = IngestionPipeline(lambda frames, camera_ids: recognizer.recognize_all_faces_batch(
+        frames, [trackers.get(c) for c in camera_ids], camera_ids))
+    pipeline.subscribe(lambda e: print(f"[Ingest] {e['camera_id']} #{e['seq']}: "
+                                       f"{[r['student_id'] for r in e['results'] if r['recognized']]} "
+                                       f"({e['count']} faces)"))
+    streams = [pipeline.add_camera(f"cam{i}", source) for i, source in enumerate(sys.argv[1:])]
+    try:
+        while not all(stream.finished for stream in streams):
+            time.sleep(0.5)
+        time.sleep(0.5)  # Let the pipeline drain the last frames
+    except KeyboardInterrupt:
+        pass
+    for status in pipeline.cameras():
+        print(f"[Ingest] {status}")
+    pipeline.stop()
@@ -0,0 +1,168 @@
+"""
+Per-camera detection profiles
+Each camera can run detection with its own settings instead of the full frame at 640px:
+  imgsz       inference size (multiple of 32): lower for close-up cameras, higher for wide rooms
+  roi         static regions of interest as polygons in normalized [0, 1] frame coordinates
+              (e.g. only the doorway of an entrance camera); the frame is cropped to their
+              bounding box before letterboxing, and faces centred outside them are dropped
+  tiles       [columns, rows] grid of overlapping tiles for high-resolution cameras, so small
+              faces at the back of a lecture hall are detected at near-native resolution
+  fullFrame   with tiles, also run the whole (ROI) frame once to catch faces larger than a tile
+
+Profiles are read from DETECTION_PROFILES_FILE (AI_DETECTION_PROFILES) at startup:
+    {
+      "default": {"imgsz": 640},
+      "cameras": {
+        "entrance": {"imgsz": 480, "roi": [[[0.3, 0.0], [0.7, 0.0], [0.7, 1.0], [0.3, 1.0]]]},
+        "hall-4k": {"imgsz": 960, "tiles": [3, 2], "tileOverlap": 0.15}
+      }
+    }
+Cameras without a profile (and requests without a cameraId) use "default", or the
+detector's own settings when there is no default.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from face_alignment import face_landmarks
+
+DETECTION_PROFILES_FILE = os.environ.get("AI_DETECTION_PROFILES", "detection_profiles.json")
+TILE_OVERLAP = 0.2  # Fraction of a tile shared with its neighbours (faces on a seam appear whole in one)
+TILE_NMS_IOU = 0.5  # Duplicates of one face found in overlapping tiles are merged above this IoU
+YOLO_STRIDE = 32
+
+Region = Tuple[int, int, int, int]
+Detection = Tuple  # (x1, y1, x2, y2, confidence[, landmarks])
+
+
+class DetectionProfile:
+    """Detection settings for one camera"""
+
+    def __init__(self, imgsz: Optional[int] = None, roi: Optional[List[Sequence[Sequence[float]]]] = None,
+                 tiles: Optional[Sequence[int]] = None, tile_overlap: float = TILE_OVERLAP, full_frame: bool = True):
+        """
+        Args:
+            imgsz: Inference size in pixels (None = detector default)
+            roi: Polygons of normalized (x, y) points; None = whole frame
+            tiles: (columns, rows) tile grid; None = no tiling
+            tile_overlap: Overlap between neighbouring tiles as a fraction of the tile size
+            full_frame: With tiles, also detect on the whole region
+        """
+        if imgsz is not None and (imgsz <= 0 or imgsz % YOLO_STRIDE):
+            raise ValueError(f"imgsz must be a positive multiple of {YOLO_STRIDE}, got {imgsz}")
+        if tiles is not None and (len(tiles) != 2 or min(tiles) < 1):
+            raise ValueError(f"tiles must be [columns, rows], got {tiles}")
+        if not 0.0 <= tile_overlap < 1.0:
+            raise ValueError(f"tileOverlap must be in [0, 1), got {tile_overlap}")
+        self.imgsz = imgsz
+        self.roi = [np.clip(np.asarray(polygon, dtype=np.float32).reshape(-1, 2), 0.0, 1.0)
+                    for polygon in roi] if roi else None
+        self.tiles = tuple(int(t) for t in tiles) if tiles else None
+        self.tile_overlap = tile_overlap
+        self.full_frame = full_frame
+        self._layouts: Dict[Tuple[int, int], Tuple[List[Region], Optional[np.ndarray]]] = {}  # (h, w) -> (regions, mask)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DetectionProfile":
+        return cls(imgsz=data.get("imgsz"), roi=data.get("roi"), tiles=data.get("tiles"),
+                   tile_overlap=data.get("tileOverlap", TILE_OVERLAP), full_frame=data.get("fullFrame", True))
+
+    def to_dict(self) -> Dict:
+        return {
+            "imgsz": self.imgsz,
+            "roi": [polygon.tolist() for polygon in self.roi] if self.roi else None,
+            "tiles": list(self.tiles) if self.tiles else None,
+            "tileOverlap": self.tile_overlap,
+            "fullFrame": self.full_frame,
+        }
+
+    def _layout(self, shape: Tuple[int, ...]) -> Tuple[List[Region], Optional[np.ndarray]]:
+        """Detection regions and ROI mask for a frame size (computed once per size)"""
+        h, w = shape[:2]
+        layout = self._layouts.get((h, w))
+        if layout is not None:
+            return layout
+
+        mask = None
+        bounds = (0, 0, w, h)
+        if self.roi:
+            polygons = [np.round(polygon * [w - 1, h - 1]).astype(np.int32) for polygon in self.roi]
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, polygons, 1)
+            points = np.concatenate(polygons)
+            bounds = (int(points[:, 0].min()), int(points[:, 1].min()),
+                      int(points[:, 0].max()) + 1, int(points[:, 1].max()) + 1)
+
+        regions = [bounds] if not self.tiles or self.full_frame else []
+        if self.tiles:
+            regions.extend(self._tile(bounds))
+        layout = self._layouts[(h, w)] = (regions, mask)
+        return layout
+
+    def _tile(self, bounds: Region) -> List[Region]:
+        x1, y1, x2, y2 = bounds
+        cols, rows = self.tiles
+        tile_w = (x2 - x1) / (cols - (cols - 1) * self.tile_overlap)
+        tile_h = (y2 - y1) / (rows - (rows - 1) * self.tile_overlap)
+        step_w, step_h = tile_w * (1 - self.tile_overlap), tile_h * (1 - self.tile_overlap)
+        return [(int(x1 + c * step_w), int(y1 + r * step_h),
+                 min(x2, int(round(x1 + c * step_w + tile_w))), min(y2, int(round(y1 + r * step_h + tile_h))))
+                for r in range(rows) for c in range(cols)]
+
+    def crops(self, frame: np.ndarray) -> List[np.ndarray]:
+        """Views of the frame to run detection on (no copies)"""
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self._layout(frame.shape)[0]]
+
+    def merge(self, shape: Tuple[int, ...], region_detections: List[List[Detection]]) -> List[Detection]:
+        """Map per-crop detections back to frame coordinates, drop tile duplicates and faces outside the ROI"""
+        regions, mask = self._layout(shape)
+        detections = [(x1 + rx, y1 + ry, x2 + rx, y2 + ry, conf,
+                       None if landmarks is None else landmarks + np.array([rx, ry], dtype=np.float32))
+                      for (rx, ry, _, _), found in zip(regions, region_detections)
+                      for (x1, y1, x2, y2, conf), landmarks in ((d[:5], face_landmarks(d)) for d in found)]
+        if len(regions) > 1 and len(detections) > 1:
+            keep = cv2.dnn.NMSBoxes([[x1, y1, x2 - x1, y2 - y1] for x1, y1, x2, y2, *_ in detections],
+                                    [d[4] for d in detections], 0.0, TILE_NMS_IOU)
+            detections = [detections[i] for i in np.array(keep, dtype=np.int64).reshape(-1)]
+        if mask is not None:
+            h, w = mask.shape
+            detections = [d for d in detections
+                          if mask[min(h - 1, max(0, (d[1] + d[3]) // 2)), min(w - 1, max(0, (d[0] + d[2]) // 2))]]
+        return sorted(detections, key=lambda d: -d[4])
+
+
+class ProfileRegistry:
+    """Detection profile per camera ID, with an optional default"""
+
+    def __init__(self, profiles: Optional[Dict[str, DetectionProfile]] = None,
+                 default: Optional[DetectionProfile] = None):
+        self.profiles = profiles or {}
+        self.default = default
+
+    @classmethod
+    def load(cls, path: str = DETECTION_PROFILES_FILE) -> "ProfileRegistry":
+        """Read profiles from a JSON file (an empty registry when there is none)"""
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            default = DetectionProfile.from_dict(data["default"]) if data.get("default") else None
+            profiles = {str(camera_id): DetectionProfile.from_dict(profile)
+                        for camera_id, profile in data.get("cameras", {}).items()}
+        except Exception as e:
+            print(f"[AI] ✗ Ignoring invalid detection profiles in {path}: {e}")
+            return cls()
+        print(f"[AI] ✓ Loaded detection profiles for {len(profiles)} camera(s) from {path}")
+        return cls(profiles, default)
+
+    def get(self, camera_id: Optional[str]) -> Optional[DetectionProfile]:
+        """Profile for a camera (None = detect on the full frame with the detector's defaults)"""
+        return self.profiles.get(camera_id, self.default) if camera_id else self.default
+
+    def __bool__(self) -> bool:
+        return bool(self.profiles) or self.default is not None
@@ -0,0 +1,115 @@
+"""
+Embedding cache keyed on face-crop content
+Identical crops (backend retries, duplicate uploads, enrollment frames reused when a student
+is re-trained, unchanged frames from static cameras) skip the ArcFace forward pass.
+Keys are a 128-bit BLAKE2b hash of the crop pixels plus its shape, entries expire after
+a TTL, and the least recently used entries are evicted to stay within both an entry and
+a memory limit. Safe to share between threads.
+
+Hits and misses are exported as ai_embedding_cache_total on /metrics and summarized on
+/embedding-cache-stats.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+EMBEDDING_CACHE_ENTRIES = int(os.environ.get("AI_EMBEDDING_CACHE_ENTRIES", "4096"))  # 0 disables the cache
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get("AI_EMBEDDING_CACHE_MB", "32"))
+EMBEDDING_CACHE_TTL = float(os.environ.get("AI_EMBEDDING_CACHE_TTL", "600"))  # Seconds
+ENTRY_OVERHEAD_BYTES = 200  # Key, timestamp and OrderedDict bookkeeping per entry (approximate)
+
+
+def crop_key(crop: np.ndarray) -> bytes:
+    """Content hash of a face crop (pixels, shape and dtype)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(crop).data)
+    digest.update(f"{crop.shape}{crop.dtype}".encode("ascii"))
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of {crop hash: embedding} with TTL, entry and memory limits"""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_ENTRIES, max_mb: float = EMBEDDING_CACHE_MAX_MB,
+                 ttl: float = EMBEDDING_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[np.ndarray, float]]" = OrderedDict()  # key -> (embedding, stored at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_bytes(embedding: np.ndarray) -> int:
+        return embedding.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Cached embedding (read-only) or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[key]
+                self._bytes -= self._entry_bytes(entry[0])
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.observe("cache", "miss" if entry is None else "hit", 1)
+        return None if entry is None else entry[0]
+
+    def put(self, key: bytes, embedding: np.ndarray):
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        size = self._entry_bytes(embedding)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._entry_bytes(previous[0])
+            self._entries[key] = (embedding, time.time())
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+            }
+
+
+def make_embedding_cache() -> Optional[EmbeddingCache]:
+    """The configured cache, or None when AI_EMBEDDING_CACHE_ENTRIES=0"""
+    return EmbeddingCache() if EMBEDDING_CACHE_ENTRIES > 0 else None
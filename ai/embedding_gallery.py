@@ -0,0 +1,336 @@
+"""
+Embedding Gallery for vectorized face matching
+Keeps every enrolled embedding in one contiguous float32 matrix with a parallel ID array,
+so all detected faces in a frame are matched against all students with a single matmul.
+An optional ANN index (see ann_index.py) takes over search once the gallery is large.
+A student may own several rows (prototypes, see prototypes.py); search then pools each
+student's rows into one score (max or softmax) before ranking.
+"""
+
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from prototypes import (PROTOTYPE_KEY_LIMIT, PROTOTYPE_POOLING, PROTOTYPE_SEPARATOR, PROTOTYPE_TEMPERATURE,
+                        prototype_key, student_of)
+
+DEFAULT_CAPACITY = 1024  # Initial number of rows reserved in the matrix
+
+
+class EmbeddingGallery:
+    """Contiguous float32 embedding matrix with O(1) add/update/remove"""
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = DEFAULT_CAPACITY, index=None,
+                 pooling: str = PROTOTYPE_POOLING, temperature: float = PROTOTYPE_TEMPERATURE):
+        self.dim = dim
+        self.index = index  # Optional ANN index (e.g. IVFFlatIndex); None = always exact
+        self.pooling = pooling  # How a student's prototype rows combine: 'max' or 'softmax'
+        self.temperature = temperature
+        self._capacity = max(1, int(capacity))
+        self._matrix = np.zeros((self._capacity, dim), dtype=np.float32) if dim else None
+        self._ids = np.empty(self._capacity, dtype=object)
+        self._row_of = {}  # {student_id: row index}
+        # Optional sorted view over memory-mapped ids (see from_arrays), so loading a
+        # stored gallery does not have to build _row_of for every student up front
+        self._base_order = None
+        self._base_count = 0
+        self._size = 0
+        self._prototype_rows = 0  # Rows keyed "<student_id>#<k>"; None = not counted yet
+        self._groups = None  # Cached (column order, group starts, student IDs) for pooling
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_dict(cls, embeddings: Dict[str, np.ndarray], index=None) -> "EmbeddingGallery":
+        """Build a gallery from a {student_id: embedding} dict (legacy encodings.npy format)"""
+        gallery = cls(capacity=max(DEFAULT_CAPACITY, len(embeddings)), index=index)
+        for student_id, embedding in embeddings.items():
+            gallery.add(student_id, embedding)
+        return gallery
+
+    @classmethod
+    def from_arrays(cls, matrix: np.ndarray, ids: np.ndarray, count: int,
+                    order: Optional[np.ndarray] = None, index=None) -> "EmbeddingGallery":
+        """
+        Adopt existing arrays without copying (e.g. memory-mapped by EmbeddingStore).
+        Args:
+            matrix: (capacity, dim) float32 array; rows [0, count) are valid and normalized
+            ids: (capacity,) array of student IDs aligned with matrix rows
+            count: Number of valid rows
+            order: argsort of ids[:count], used for O(log n) ID lookups
+            index: Optional ANN index
+        """
+        gallery = cls(dim=None, capacity=1, index=index)
+        gallery.dim = int(matrix.shape[1])
+        gallery._matrix = matrix
+        gallery._ids = ids
+        gallery._capacity = int(matrix.shape[0])
+        gallery._size = int(count)
+        gallery._prototype_rows = None  # Counted on first search, not at load time
+        if order is not None:
+            gallery._base_order = order
+            gallery._base_count = int(count)
+        else:
+            gallery._row_of = {str(ids[i]): i for i in range(count)}
+        return gallery
+
+    def _find_row(self, student_id: str) -> Optional[int]:
+        row = self._row_of.get(student_id)
+        if row is None and self._base_order is not None:
+            base_ids = self._ids[:self._base_count]
+            pos = int(np.searchsorted(base_ids, student_id, sorter=self._base_order))
+            if pos < self._base_count:
+                row = int(self._base_order[pos])
+                if base_ids[row] != student_id:
+                    row = None
+        return row
+
+    def _materialize(self):
+        """Switch to a plain dict + object ID array before rows start moving around"""
+        if self._base_order is not None:
+            self._row_of.update({str(self._ids[i]): i for i in range(self._base_count)})
+            self._base_order = None
+            self._base_count = 0
+        if self._ids.dtype != object:
+            ids = np.empty(self._capacity, dtype=object)
+            ids[:self._size] = [str(i) for i in self._ids[:self._size]]
+            self._ids = ids
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, student_id: str) -> bool:
+        with self._lock:
+            return self._find_row(student_id) is not None
+
+    def _is_prototype_key(self, key) -> bool:
+        return PROTOTYPE_SEPARATOR in str(key)
+
+    def _count_prototype_rows(self) -> int:
+        if self._prototype_rows is None:
+            ids = self._ids[:self._size]
+            if ids.dtype.kind == "U":
+                self._prototype_rows = int(np.count_nonzero(np.char.find(ids, PROTOTYPE_SEPARATOR) >= 0))
+            else:
+                self._prototype_rows = sum(1 for key in ids if self._is_prototype_key(key))
+        return self._prototype_rows
+
+    def student_count(self) -> int:
+        """Number of distinct students (rows minus extra prototypes)"""
+        with self._lock:
+            if self._count_prototype_rows() == 0:
+                return self._size
+            return len(self._student_groups()[2])
+
+    def prototype_keys(self, student_id: str) -> List[str]:
+        """Gallery keys of a student's stored prototypes"""
+        with self._lock:
+            return [key for key in (prototype_key(student_id, i) for i in range(PROTOTYPE_KEY_LIMIT))
+                    if self._find_row(key) is not None]
+
+    def set_prototypes(self, student_id: str, prototypes: np.ndarray) -> List[str]:
+        """
+        Replace all of a student's rows with the given prototypes (first = primary).
+        Returns the keys that were written or removed, e.g. to persist them.
+        """
+        prototypes = np.atleast_2d(np.asarray(prototypes, dtype=np.float32))
+        with self._lock:
+            keys = [prototype_key(student_id, i) for i in range(len(prototypes))]
+            stale = [key for key in self.prototype_keys(student_id) if key not in keys]
+            for key in stale:
+                self.remove(key)
+            for key, vector in zip(keys, prototypes):
+                self.add(key, vector)
+            return keys + stale
+
+    def ids(self) -> List[str]:
+        """Return gallery keys (student IDs, plus "<student_id>#<k>" prototypes) in row order"""
+        with self._lock:
+            return [str(i) for i in self._ids[:self._size]]
+
+    def get(self, student_id: str) -> Optional[np.ndarray]:
+        """Return a copy of the stored embedding for a student, or None"""
+        with self._lock:
+            row = self._find_row(student_id)
+            if row is None:
+                return None
+            return np.array(self._matrix[row])
+
+    def as_dict(self) -> Dict[str, np.ndarray]:
+        """Return {student_id: embedding} (copies), e.g. for saving"""
+        with self._lock:
+            return {str(self._ids[i]): np.array(self._matrix[i]) for i in range(self._size)}
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if self.dim is not None and vector.shape[0] != self.dim:
+            raise ValueError(f"Embedding has dimension {vector.shape[0]}, gallery expects {self.dim}")
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
+
+    def _grow(self):
+        new_capacity = self._capacity * 2
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(new_capacity, dtype=object)
+        ids[:self._size] = [str(i) for i in self._ids[:self._size]] if self._ids.dtype != object else self._ids[:self._size]
+        self._matrix, self._ids, self._capacity = matrix, ids, new_capacity
+
+    def _set_id(self, row: int, student_id: str):
+        if self._ids.dtype != object and len(student_id) > self._ids.dtype.itemsize // 4:
+            # Fixed-width (memory-mapped) ID array cannot hold this ID
+            self._materialize()
+        self._ids[row] = student_id
+
+    def add(self, student_id: str, embedding: np.ndarray):
+        """Add a student, or update its embedding if it is already present"""
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(np.asarray(embedding).size)
+                self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            vector = self._normalize(embedding)
+
+            row = self._find_row(student_id)
+            if row is not None:
+                self._matrix[row] = vector
+                if self._index_active():
+                    self.index.update(row, vector)
+                return
+
+            if self._size == self._capacity:
+                self._grow()
+            row = self._size
+            self._matrix[row] = vector
+            self._set_id(row, student_id)
+            self._row_of[student_id] = row
+            self._size += 1
+            self._groups = None
+            if self._prototype_rows is not None and self._is_prototype_key(student_id):
+                self._prototype_rows += 1
+            if self._index_active():
+                self.index.add(row, vector)
+
+    # Updating is the same operation - the row is overwritten in place
+    update = add
+
+    def remove(self, student_id: str) -> bool:
+        """Remove a student by moving the last row into its slot. Returns False if unknown."""
+        with self._lock:
+            self._materialize()
+            row = self._row_of.pop(student_id, None)
+            if row is None:
+                return False
+            last = self._size - 1
+            if self._index_active():
+                self.index.remove(row)
+                if row != last:
+                    self.index.move(last, row)
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._row_of[self._ids[row]] = row
+            self._ids[last] = None
+            self._size -= 1
+            self._groups = None
+            if self._prototype_rows is not None and self._is_prototype_key(student_id):
+                self._prototype_rows -= 1
+            return True
+
+    def _index_active(self) -> bool:
+        return self.index is not None and self.index.is_trained
+
+    def search(self, queries: np.ndarray, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+        """
+        Match query embeddings against every stored embedding in one matmul.
+        Args:
+            queries: (num_faces, dim) or (dim,) array of unit-normalized embeddings
+            top_k: Number of best matches to return per query
+        Returns:
+            For each query, a list of (student_id, similarity) sorted best first.
+            Similarities are clamped to [0, 1] like FaceRecognizer.cosine_similarity.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if queries.shape[0] == 0:
+            return []
+
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(queries.shape[0])]
+            if self.index is not None and self._size >= self.index.min_gallery_size:
+                return self._search_index(queries, top_k)
+            scores = queries @ self._matrix[:self._size].T  # (num_faces, num_rows)
+            labels = self._ids
+            if self._count_prototype_rows() > 0:
+                scores, labels = self._pool(scores)  # (num_faces, num_students)
+
+            k = min(max(1, top_k), scores.shape[1])
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), (scores.shape[0], k))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.clip(np.take_along_axis(top_scores, order, axis=1), 0.0, 1.0)
+
+            return [
+                [(str(labels[j]), float(s)) for j, s in zip(row_idx, row_scores)]
+                for row_idx, row_scores in zip(top, top_scores)
+            ]
+
+    def _student_groups(self):
+        """
+        Column permutation that puts each student's rows next to each other, the start of
+        every group and the student IDs in group order. Rebuilt after adds/removes.
+        """
+        if self._groups is None:
+            owners = np.array([student_of(str(key)) for key in self._ids[:self._size]])
+            students, codes = np.unique(owners, return_inverse=True)
+            order = np.argsort(codes, kind="stable")
+            starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+            self._groups = (order, starts, students)
+        return self._groups
+
+    def _pool(self, scores: np.ndarray):
+        """Per-row scores -> per-student scores (max, or softmax-weighted mean of the rows)"""
+        order, starts, students = self._student_groups()
+        grouped = scores[:, order]
+        if self.pooling == "softmax":
+            # Shift by the largest possible cosine (1.0) so exp never overflows
+            weights = np.exp((grouped - 1.0) / self.temperature)
+            pooled = np.add.reduceat(grouped * weights, starts, axis=1) / np.add.reduceat(weights, starts, axis=1)
+        else:
+            pooled = np.maximum.reduceat(grouped, starts, axis=1)
+        return pooled, students
+
+    def _search_index(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[str, float]]]:
+        """Approximate search through the ANN index (caller holds the lock)"""
+        if self.index.needs_training(self._size):
+            self.index.train(self._matrix[:self._size])
+        if self._count_prototype_rows() == 0:
+            results = []
+            for rows, scores in self.index.search(queries, self._matrix, max(1, top_k)):
+                scores = np.clip(scores, 0.0, 1.0)
+                results.append([(str(self._ids[r]), float(sc)) for r, sc in zip(rows, scores)])
+            return results
+        # Prototype rows: over-fetch candidate rows and keep each student's best one
+        # (only the candidates are known here, so pooling is always max)
+        results = []
+        for rows, scores in self.index.search(queries, self._matrix, max(1, top_k) * PROTOTYPE_KEY_LIMIT):
+            best = {}
+            for r, sc in zip(rows, np.clip(scores, 0.0, 1.0)):
+                student_id = student_of(str(self._ids[r]))
+                if student_id not in best:  # Candidates arrive best first
+                    best[student_id] = float(sc)
+            results.append(list(best.items())[:max(1, top_k)])
+        return results
+
+    def snapshot(self) -> Tuple[np.ndarray, List[str]]:
+        """Return copies of the valid matrix rows and their IDs (consistent under the lock)"""
+        with self._lock:
+            if self._size == 0:
+                return np.zeros((0, self.dim or 0), dtype=np.float32), []
+            return np.array(self._matrix[:self._size]), self.ids()
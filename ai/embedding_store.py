@@ -0,0 +1,267 @@
+"""
+Versioned, memory-mapped embedding store
+Replaces the pickled {student_id: embedding} dict in encodings.npy with:
+  - matrix-<gen>.npy  float32 (capacity, dim) matrix, memory-mapped zero-copy on load
+  - ids-<gen>.npy     fixed-width ID array aligned with the matrix rows
+  - order-<gen>.npy   argsort of the IDs (binary-search ID index)
+  - log-<gen>.bin     append-only log of upserts/deletes since the snapshot
+  - manifest.json     current generation, row count, file names and the crop mode the
+                      embeddings were computed from (swapped atomically)
+Loading maps the snapshot and replays a bounded log, so start-up time does not depend on
+roster size. The log is folded into a new snapshot generation every COMPACT_AFTER_RECORDS.
+Single writer (the training process); any number of readers can sync() from the log.
+"""
+
+import json
+import os
+import pickle
+import struct
+import zlib
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from embedding_gallery import EmbeddingGallery
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+LOG_MAGIC = b"EMBLOG1\n"
+COMPACT_AFTER_RECORDS = 256  # Fold the append log into a new snapshot after this many records
+SPARE_ROWS_FRACTION = 0.25  # Extra rows reserved in each snapshot so appends don't reallocate
+MIN_SPARE_ROWS = 1024
+MIN_ID_WIDTH = 32  # Characters reserved per ID (MongoDB ObjectIds are 24)
+
+DEFAULT_CROP_MODE = "box"  # Stores written before face alignment hold embeddings of box crops
+
+OP_UPSERT = 1
+OP_DELETE = 2
+_RECORD_HEADER = struct.Struct("<II")  # body length, crc32(body)
+_BODY_HEADER = struct.Struct("<BH")  # op, key length
+
+
+class EmbeddingStore:
+    """On-disk embedding store: memory-mapped snapshot + append log"""
+
+    def __init__(self, directory: str, compact_after: int = COMPACT_AFTER_RECORDS,
+                 crop_mode: str = DEFAULT_CROP_MODE):
+        """
+        Args:
+            directory: Store directory (created on first compact)
+            compact_after: Fold the log into a new snapshot after this many records
+            crop_mode: Face crops a new store's embeddings are computed from ("box" or "aligned");
+                replaced by the mode recorded in the manifest once an existing store is loaded
+        """
+        self.directory = os.path.abspath(directory)
+        self.compact_after = compact_after
+        self.crop_mode = crop_mode
+        self.manifest = None
+        self._log_offset = 0  # Bytes of the current log already applied by this process
+        self._log_records = 0
+
+    # ------------------------------------------------------------------ paths
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path(MANIFEST_FILE))
+
+    def _read_manifest(self) -> Dict:
+        with open(self._path(MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported embedding store version: {manifest.get('format_version')}")
+        return manifest
+
+    # ------------------------------------------------------------------ load
+    def load_gallery(self, index=None) -> EmbeddingGallery:
+        """Map the current snapshot and replay the append log into a gallery"""
+        self.manifest = self._read_manifest()
+        self.crop_mode = self.manifest.get("crop_mode", DEFAULT_CROP_MODE)
+        count = self.manifest["count"]
+        if count > 0:
+            # Copy-on-write mapping: in-place gallery updates never touch the snapshot file
+            matrix = np.load(self._path(self.manifest["matrix"]), mmap_mode="c")
+            ids = np.load(self._path(self.manifest["ids"]), mmap_mode="c")
+            order = np.load(self._path(self.manifest["order"]), mmap_mode="r")
+            gallery = EmbeddingGallery.from_arrays(matrix, ids, count, order=order, index=index)
+        else:
+            gallery = EmbeddingGallery(dim=self.manifest.get("dim"), index=index)
+
+        self._log_offset = len(LOG_MAGIC)
+        self._log_records = 0
+        self._replay(gallery)
+        return gallery
+
+    def sync(self, gallery: EmbeddingGallery, index=None) -> EmbeddingGallery:
+        """
+        Bring a gallery up to date with changes written by another process.
+        Returns the same gallery with new log records applied, or a freshly loaded
+        gallery if the store was compacted into a new generation meanwhile.
+        """
+        manifest = self._read_manifest()
+        if self.manifest is None or manifest["generation"] != self.manifest["generation"]:
+            return self.load_gallery(index=index)
+        self._replay(gallery)
+        return gallery
+
+    def _read_log(self, start: int) -> Tuple[List[Tuple[int, str, Optional[np.ndarray]]], int]:
+        """Read complete, checksummed records from byte offset start. Returns (records, end offset)."""
+        path = self._path(self.manifest["log"])
+        if not os.path.exists(path):
+            return [], start
+        records = []
+        with open(path, "rb") as f:
+            if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+                raise ValueError(f"Corrupt embedding log: {path}")
+            f.seek(start)
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                length, crc = _RECORD_HEADER.unpack(header)
+                body = f.read(length)
+                if len(body) < length or zlib.crc32(body) != crc:
+                    break  # Torn write at the tail - ignore it
+                op, key_len = _BODY_HEADER.unpack_from(body)
+                key = body[_BODY_HEADER.size:_BODY_HEADER.size + key_len].decode("utf-8")
+                vector = None
+                if op == OP_UPSERT:
+                    vector = np.frombuffer(body, dtype="<f4", offset=_BODY_HEADER.size + key_len).copy()
+                records.append((op, key, vector))
+                start = f.tell()
+        return records, start
+
+    def _replay(self, gallery: EmbeddingGallery):
+        records, self._log_offset = self._read_log(self._log_offset)
+        for op, key, vector in records:
+            if op == OP_UPSERT:
+                gallery.add(key, vector)
+            elif op == OP_DELETE:
+                gallery.remove(key)
+        self._log_records += len(records)
+
+    # ------------------------------------------------------------------ write
+    def _append(self, op: int, key: str, vector: Optional[np.ndarray] = None):
+        key_bytes = key.encode("utf-8")
+        body = _BODY_HEADER.pack(op, len(key_bytes)) + key_bytes
+        if vector is not None:
+            body += np.asarray(vector, dtype="<f4").tobytes()
+        record = _RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+        path = self._path(self.manifest["log"])
+        # Append right after the last complete record: a torn record left by a crash is cut
+        # off, otherwise every record written after it would be unreadable on replay
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        end = self._read_log(self._log_offset)[1] if size >= len(LOG_MAGIC) else 0
+        with open(path, "r+b" if end else "wb") as f:
+            if end == 0:
+                f.write(LOG_MAGIC)
+            else:
+                if end < size:
+                    print(f"[AI] ⚠ Dropped a torn record ({size - end} bytes) at the end of {path}")
+                f.seek(end)
+                f.truncate()
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+        self._log_records += 1
+
+    def append_upsert(self, gallery: EmbeddingGallery, key: str, vector: np.ndarray):
+        """Persist one added/updated embedding (compacting if the log grew too long)"""
+        self._append(OP_UPSERT, key, vector)
+        self._maybe_compact(gallery)
+
+    def append_delete(self, gallery: EmbeddingGallery, key: str):
+        """Persist one removal (compacting if the log grew too long)"""
+        self._append(OP_DELETE, key)
+        self._maybe_compact(gallery)
+
+    def _maybe_compact(self, gallery: EmbeddingGallery):
+        if self._log_records >= self.compact_after:
+            self.compact(gallery)
+
+    def compact(self, gallery: EmbeddingGallery):
+        """Write the gallery as a new snapshot generation with an empty log"""
+        os.makedirs(self.directory, exist_ok=True)
+        matrix, ids = gallery.snapshot()
+        count = len(ids)
+        generation = (self.manifest["generation"] + 1) if self.manifest else 1
+        names = {
+            "matrix": f"matrix-{generation:06d}.npy",
+            "ids": f"ids-{generation:06d}.npy",
+            "order": f"order-{generation:06d}.npy",
+            "log": f"log-{generation:06d}.bin",
+        }
+
+        if count > 0:
+            capacity = count + max(MIN_SPARE_ROWS, int(count * SPARE_ROWS_FRACTION))
+            out = np.lib.format.open_memmap(self._path(names["matrix"]), mode="w+",
+                                            dtype=np.float32, shape=(capacity, matrix.shape[1]))
+            out[:count] = matrix
+            out.flush()
+            del out
+
+            width = max(MIN_ID_WIDTH, max(len(i) for i in ids))
+            id_array = np.zeros(capacity, dtype=f"<U{width}")
+            id_array[:count] = ids
+            np.save(self._path(names["ids"]), id_array)
+            np.save(self._path(names["order"]), np.argsort(id_array[:count], kind="stable"))
+
+        with open(self._path(names["log"]), "wb") as f:
+            f.write(LOG_MAGIC)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "generation": generation,
+            "count": count,
+            "dim": int(matrix.shape[1]) if count else gallery.dim,
+            "crop_mode": self.crop_mode,
+            **names,
+        }
+        tmp_path = self._path(f"{MANIFEST_FILE}.{os.getpid()}.tmp")  # Per process: never renamed away by another writer
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(MANIFEST_FILE))
+
+        old = self.manifest
+        self.manifest = manifest
+        self._log_offset = len(LOG_MAGIC)
+        self._log_records = 0
+        if old:
+            # Readers that still map the old files keep them alive until they reload
+            for key in ("matrix", "ids", "order", "log"):
+                try:
+                    os.remove(self._path(old[key]))
+                except OSError:
+                    pass
+        print(f"[AI] ✓ Compacted embedding store: {count} embeddings (generation {generation})")
+
+    # ------------------------------------------------------------------ migration
+    def migrate_legacy(self, npy_path: str, pkl_path: str, index=None) -> Optional[EmbeddingGallery]:
+        """
+        Import a legacy encodings.npy (pickled dict) or student_embeddings.pkl into a new store.
+        The legacy files are left in place. Returns the loaded gallery, or None if nothing to migrate.
+        """
+        embeddings = None
+        for path in (npy_path, pkl_path):
+            if not os.path.exists(path):
+                continue
+            try:
+                if path.endswith(".npy"):
+                    embeddings = np.load(path, allow_pickle=True).item()
+                else:
+                    with open(path, "rb") as f:
+                        embeddings = pickle.load(f)
+                print(f"[AI] Migrating {len(embeddings)} legacy embeddings from {path}")
+                break
+            except Exception as e:
+                print(f"[AI] Could not read legacy embeddings {path}: {e}")
+        if embeddings is None:
+            return None
+
+        gallery = EmbeddingGallery.from_dict(embeddings, index=index)
+        self.crop_mode = DEFAULT_CROP_MODE  # Legacy embeddings predate face alignment
+        self.compact(gallery)
+        return self.load_gallery(index=index)
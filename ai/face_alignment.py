@@ -0,0 +1,85 @@
+"""
+Landmark-based face alignment
+YOLOv8-face predicts five keypoints per face (eyes, nose tip, mouth corners). Every face of a
+frame is mapped onto the standard ArcFace 112x112 template with a similarity transform
+(rotation, uniform scale, translation): the transforms of all faces are solved at once in
+closed form and the faces are warped into one (num_faces, 112, 112, 3) batch. The aligned
+faces are exactly the embedder's input size, so they skip ArcFace's resize/letterbox step.
+
+Embeddings of aligned and unaligned crops differ, so the embedding store records the crop mode
+it was enrolled with and the recognizer keeps using that mode whatever AI_ALIGN_FACES says:
+stores enrolled before alignment existed stay on box crops until students are re-enrolled
+into a fresh store.
+"""
+
+import os
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+ALIGN_ENABLED = os.environ.get("AI_ALIGN_FACES", "1") == "1"
+CROP_MODE = "aligned" if ALIGN_ENABLED else "box"  # Crop mode of newly created embedding stores
+# Reference landmark positions of the 112x112 ArcFace training crops (insightface)
+ARCFACE_TEMPLATE = np.array([
+    [38.2946, 51.6963],  # Left eye
+    [73.5318, 51.5014],  # Right eye
+    [56.0252, 71.7366],  # Nose tip
+    [41.5493, 92.3655],  # Left mouth corner
+    [70.7299, 92.2041],  # Right mouth corner
+], dtype=np.float32)
+TEMPLATE_SIZE = 112
+
+
+def face_landmarks(detection: Sequence) -> Optional[np.ndarray]:
+    """5 (x, y) landmarks carried by a detection tuple (6th element), or None"""
+    if len(detection) > 5 and detection[5] is not None:
+        return np.asarray(detection[5], dtype=np.float32).reshape(-1, 2)
+    return None
+
+
+def similarity_transforms(landmarks: np.ndarray, template: np.ndarray = ARCFACE_TEMPLATE) -> np.ndarray:
+    """
+    Least-squares similarity transforms from each face's landmarks to the template.
+    Args:
+        landmarks: (num_faces, 5, 2) landmarks in frame pixels
+        template: (5, 2) target positions
+    Returns:
+        (num_faces, 2, 3) affine matrices mapping frame -> aligned face
+    """
+    src = np.asarray(landmarks, dtype=np.float64)
+    dst = np.asarray(template, dtype=np.float64)[None]
+    src_mean, dst_mean = src.mean(axis=1, keepdims=True), dst.mean(axis=1, keepdims=True)
+    s, d = src - src_mean, dst - dst_mean
+    denom = np.maximum((s ** 2).sum(axis=(1, 2)), 1e-12)
+    # [x'] = [a -b][x] + t, solved in closed form (no reflection)
+    a = (s[..., 0] * d[..., 0] + s[..., 1] * d[..., 1]).sum(axis=1) / denom
+    b = (s[..., 0] * d[..., 1] - s[..., 1] * d[..., 0]).sum(axis=1) / denom
+    sx, sy = src_mean[:, 0, 0], src_mean[:, 0, 1]
+    tx = dst_mean[:, 0, 0] - (a * sx - b * sy)
+    ty = dst_mean[:, 0, 1] - (b * sx + a * sy)
+    return np.stack([np.stack([a, -b, tx], axis=1), np.stack([b, a, ty], axis=1)], axis=1)
+
+
+def align_faces(frame: np.ndarray, landmarks: np.ndarray, size: Tuple[int, int] = (TEMPLATE_SIZE, TEMPLATE_SIZE)) -> np.ndarray:
+    """
+    Warp every face of a frame to the ArcFace template.
+    Args:
+        frame: BGR frame
+        landmarks: (num_faces, 5, 2) landmarks in frame pixels
+        size: (height, width) of the aligned faces (the template is scaled to it)
+    Returns:
+        (num_faces, height, width, 3) uint8 batch of aligned faces
+    """
+    height, width = size
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 5, 2)
+    faces = np.zeros((len(landmarks), height, width) + frame.shape[2:], dtype=frame.dtype)
+    if len(landmarks) == 0:
+        return faces
+    template = ARCFACE_TEMPLATE * np.array([width, height], dtype=np.float32) / TEMPLATE_SIZE
+    # warpAffine per face into the shared batch: faster than one cv2.remap over stacked
+    # per-face maps, which have to be built in numpy first
+    for face, m in zip(faces, similarity_transforms(landmarks, template)):
+        cv2.warpAffine(frame, m, (width, height), dst=face, flags=cv2.INTER_LINEAR,
+                       borderMode=cv2.BORDER_CONSTANT)
+    return faces
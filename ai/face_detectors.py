@@ -0,0 +1,128 @@
+"""
+Fallback face detectors, used when YOLOv8-face is not loaded or raises
+Both work on the in-memory BGR frame and build their model once:
+  RetinaFaceDetector  the RetinaFace model DeepFace ships with (most accurate, slow on CPU)
+  OpenCVFaceDetector  OpenCV's res10 SSD face detector when its files are in models/,
+                      else the Haar cascade bundled with opencv-python (fast, no downloads)
+Pick the tier with AI_FALLBACK_DETECTOR: "retinaface" (RetinaFace, then OpenCV if it is
+unavailable) or "opencv" (skip RetinaFace to keep throughput up without YOLO).
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FALLBACK_DETECTOR = os.environ.get("AI_FALLBACK_DETECTOR", "retinaface")
+RETINAFACE_WEIGHTS = "retinaface.h5"
+RETINAFACE_MIN_FACE = 20  # Smaller RetinaFace boxes are dropped (as before)
+# OpenCV DNN face detector (opencv/samples/dnn/face_detector)
+OPENCV_DNN_PROTOTXT = os.path.join("models", "deploy.prototxt")
+OPENCV_DNN_WEIGHTS = os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel")
+OPENCV_DNN_INPUT = (300, 300)
+OPENCV_DNN_MEAN = (104.0, 177.0, 123.0)
+HAAR_CASCADE = "haarcascade_frontalface_default.xml"
+HAAR_CONFIDENCE = 0.5  # Haar gives no score; detections pass the default and training thresholds
+HAAR_MIN_FACE = (40, 40)
+
+Detection = Tuple  # (x1, y1, x2, y2, confidence[, landmarks])
+
+
+def deepface_weights_path(filename: str) -> str:
+    """Where DeepFace keeps (and would download) a weights file"""
+    return os.path.join(os.environ.get("DEEPFACE_HOME", str(Path.home())), ".deepface", "weights", filename)
+
+
+class RetinaFaceDetector:
+    """RetinaFace on an ndarray, with the Keras model built once"""
+
+    name = "retinaface"
+
+    def __init__(self):
+        from retinaface import RetinaFace  # Installed with deepface
+        self._retinaface = RetinaFace
+        self._model = RetinaFace.build_model()
+        self._lock = threading.Lock()
+
+    def detect(self, frame: np.ndarray, min_conf: float) -> List[Detection]:
+        with self._lock:
+            faces = self._retinaface.detect_faces(frame, threshold=min_conf, model=self._model)
+        detections = []
+        if not isinstance(faces, dict):  # No faces: older versions return a tuple
+            return detections
+        for face in faces.values():
+            x1, y1, x2, y2 = (int(v) for v in face["facial_area"])
+            confidence = float(face.get("score", 0.0))
+            if confidence >= min_conf and x2 - x1 > RETINAFACE_MIN_FACE and y2 - y1 > RETINAFACE_MIN_FACE:
+                detections.append((x1, y1, x2, y2, confidence, self._landmarks(face.get("landmarks"))))
+        return detections
+
+    @staticmethod
+    def _landmarks(points: Optional[dict]) -> Optional[np.ndarray]:
+        """RetinaFace landmarks in YOLOv8-face order (eyes, nose, mouth corners; left to right in the image)"""
+        try:
+            eyes = sorted((points["left_eye"], points["right_eye"]), key=lambda p: p[0])
+            mouth = sorted((points["mouth_left"], points["mouth_right"]), key=lambda p: p[0])
+            return np.array([*eyes, points["nose"], *mouth], dtype=np.float32)
+        except (KeyError, TypeError):
+            return None
+
+
+class OpenCVFaceDetector:
+    """OpenCV res10 SSD (if its files exist) or Haar cascade"""
+
+    def __init__(self, prototxt: str = OPENCV_DNN_PROTOTXT, weights: str = OPENCV_DNN_WEIGHTS):
+        self._lock = threading.Lock()  # cv2.dnn.Net is not safe to share between threads
+        if os.path.exists(prototxt) and os.path.exists(weights):
+            self.name = "opencv-dnn"
+            self._net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+            self._cascade = None
+        else:
+            self.name = "haar"
+            self._net = None
+            if not hasattr(cv2, "CascadeClassifier"):
+                raise RuntimeError(f"This OpenCV build has no Haar cascades; add {OPENCV_DNN_PROTOTXT} "
+                                   f"and {OPENCV_DNN_WEIGHTS} to use the DNN face detector")
+            self._cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, HAAR_CASCADE))
+            if self._cascade.empty():
+                raise RuntimeError(f"Could not load {HAAR_CASCADE}")
+
+    def detect(self, frame: np.ndarray, min_conf: float) -> List[Detection]:
+        if self._net is None:
+            return self._detect_haar(frame, min_conf)
+        h, w = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, OPENCV_DNN_INPUT), 1.0, OPENCV_DNN_INPUT, OPENCV_DNN_MEAN)
+        with self._lock:
+            self._net.setInput(blob)
+            output = self._net.forward()[0, 0]  # (N, 7): _, _, confidence, x1, y1, x2, y2 (relative)
+        output = output[output[:, 2] >= min_conf]
+        boxes = np.clip(output[:, 3:7], 0.0, 1.0) * [w, h, w, h]
+        return [(int(x1), int(y1), int(x2), int(y2), float(conf))
+                for (x1, y1, x2, y2), conf in zip(boxes, output[:, 2]) if x2 > x1 and y2 > y1]
+
+    def _detect_haar(self, frame: np.ndarray, min_conf: float) -> List[Detection]:
+        if HAAR_CONFIDENCE < min_conf:
+            return []
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        faces = self._cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=HAAR_MIN_FACE)
+        return [(int(x), int(y), int(x + w), int(y + h), HAAR_CONFIDENCE) for x, y, w, h in faces]
+
+
+def build_fallback_detector(preferred: str = FALLBACK_DETECTOR, offline: bool = False):
+    """The best fallback detector that can be built here, trying RetinaFace first unless preferred is "opencv" """
+    if preferred == "retinaface":
+        if offline and not os.path.exists(deepface_weights_path(RETINAFACE_WEIGHTS)):
+            print(f"[AI] Offline mode: RetinaFace weights not found - using the OpenCV face detector")
+        else:
+            try:
+                detector = RetinaFaceDetector()
+                print(f"[AI] ✓ Fallback face detector: RetinaFace")
+                return detector
+            except Exception as e:
+                print(f"[AI] ⚠ RetinaFace unavailable ({e}) - using the OpenCV face detector")
+    detector = OpenCVFaceDetector()
+    print(f"[AI] ✓ Fallback face detector: OpenCV ({detector.name})")
+    return detector
@@ -0,0 +1,108 @@
+"""
+Face quality scoring between detection and embedding
+Cheap checks on each face crop decide whether it is worth an ArcFace pass:
+  - size       shorter side of the detection box
+  - sharpness  variance of the Laplacian of the crop, resized to QUALITY_SAMPLE_SIZE so crops of
+               different resolutions are comparable (low = blurred / out of focus)
+  - brightness mean gray level (too dark or blown out)
+  - pose       yaw and pitch estimated from the 5 YOLO-face landmarks, when the detector
+               provides them (profiles and faces looking down rarely match)
+Crops below any floor are skipped. The overall score in [0, 1] is the geometric mean of the
+component scores; it is returned with every recognition result and used by training to keep
+only the best enrollment frames. Skipped crops are exported as ai_face_quality_skipped_total.
+"""
+
+import os
+from typing import Dict, Optional, Sequence
+
+import cv2
+import numpy as np
+
+import metrics
+from face_alignment import face_landmarks
+
+QUALITY_ENABLED = os.environ.get("AI_FACE_QUALITY", "1") == "1"
+QUALITY_MIN_SIZE = float(os.environ.get("AI_QUALITY_MIN_SIZE", "24"))  # Pixels
+QUALITY_GOOD_SIZE = 112.0  # ArcFace input size: larger faces score 1.0
+QUALITY_MIN_SHARPNESS = float(os.environ.get("AI_QUALITY_MIN_SHARPNESS", "15"))  # Laplacian variance
+QUALITY_GOOD_SHARPNESS = 150.0
+QUALITY_MIN_BRIGHTNESS = float(os.environ.get("AI_QUALITY_MIN_BRIGHTNESS", "35"))  # Mean gray level
+QUALITY_MAX_BRIGHTNESS = float(os.environ.get("AI_QUALITY_MAX_BRIGHTNESS", "225"))
+QUALITY_MAX_YAW = float(os.environ.get("AI_QUALITY_MAX_YAW", "0.6"))  # Nose offset / eye distance (~50 degrees)
+QUALITY_PITCH_RANGE = (0.15, 0.85)  # Nose height between eyes and mouth for a roughly level face
+QUALITY_SAMPLE_SIZE = (112, 112)  # Crops are resized to this before the blur / brightness checks
+
+
+def pose_score(landmarks: Sequence) -> Optional[Dict[str, float]]:
+    """
+    Yaw / pitch proxies from 5 landmarks (left eye, right eye, nose, left mouth, right mouth).
+    Returns {"yaw", "pitch"} (yaw 0 = frontal, pitch ~0.5 = level) or None if unusable.
+    """
+    points = np.asarray(landmarks, dtype=np.float32).reshape(-1, 2)
+    if points.shape[0] < 5 or not np.all(np.isfinite(points)):
+        return None
+    left_eye, right_eye, nose, left_mouth, right_mouth = points[:5]
+    eye_center = (left_eye + right_eye) / 2
+    mouth_center = (left_mouth + right_mouth) / 2
+    eye_distance = np.linalg.norm(right_eye - left_eye)
+    face_height = mouth_center[1] - eye_center[1]
+    if eye_distance < 1e-3 or face_height < 1e-3:
+        return None
+    return {
+        "yaw": float(abs(nose[0] - eye_center[0]) / eye_distance),
+        "pitch": float((nose[1] - eye_center[1]) / face_height),
+    }
+
+
+def assess(crop: np.ndarray, bbox: Sequence, landmarks: Optional[Sequence] = None) -> Dict:
+    """
+    Score one face crop.
+    Args:
+        crop: BGR face crop (from preprocess_face)
+        bbox: Detection box (x1, y1, x2, y2, ...)
+        landmarks: Optional 5 (x, y) landmarks in frame coordinates
+    Returns:
+        {"score": 0..1, "usable": bool, "issue": first failed floor or None,
+         "size", "sharpness", "brightness"[, "yaw", "pitch"]}
+    """
+    x1, y1, x2, y2 = bbox[:4]
+    size = float(min(x2 - x1, y2 - y1))
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    gray = cv2.resize(gray, QUALITY_SAMPLE_SIZE, interpolation=cv2.INTER_AREA)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+    brightness = float(gray.mean())
+
+    report = {"size": size, "sharpness": round(sharpness, 1), "brightness": round(brightness, 1)}
+    components = [
+        np.clip((size - QUALITY_MIN_SIZE) / (QUALITY_GOOD_SIZE - QUALITY_MIN_SIZE), 0.0, 1.0),
+        np.clip(sharpness / QUALITY_GOOD_SHARPNESS, 0.0, 1.0),
+        np.clip(1.0 - abs(brightness - 128.0) / 128.0, 0.0, 1.0),
+    ]
+    issue = None
+    if size < QUALITY_MIN_SIZE:
+        issue = "size"
+    elif sharpness < QUALITY_MIN_SHARPNESS:
+        issue = "blur"
+    elif not QUALITY_MIN_BRIGHTNESS <= brightness <= QUALITY_MAX_BRIGHTNESS:
+        issue = "brightness"
+
+    pose = pose_score(landmarks) if landmarks is not None else None
+    if pose is not None:
+        report.update({k: round(v, 3) for k, v in pose.items()})
+        low, high = QUALITY_PITCH_RANGE
+        components.append(np.clip(1.0 - pose["yaw"] / QUALITY_MAX_YAW, 0.0, 1.0))
+        if issue is None and (pose["yaw"] > QUALITY_MAX_YAW or not low <= pose["pitch"] <= high):
+            issue = "pose"
+
+    # Geometric mean; the small floor keeps one zero component from hiding the others
+    score = float(np.exp(np.mean(np.log(np.maximum(components, 1e-3)))))
+    report.update({"score": round(score, 3), "usable": issue is None, "issue": issue})
+    return report
+
+
+def gate(crop: np.ndarray, detection: Sequence) -> Dict:
+    """assess() a detection's crop, counting skipped crops by issue"""
+    report = assess(crop, detection, face_landmarks(detection))
+    if not report["usable"]:
+        metrics.observe("quality", report["issue"], 1)
+    return report
@@ -0,0 +1,172 @@
+"""
+IoU face tracker so known identities aren't re-embedded every frame
+Each camera gets a FaceTracker that associates YOLO boxes with existing tracks by IoU.
+A track is only re-embedded when it is new, every REEMBED_INTERVAL frames, or while its
+last match similarity is low; in between, its cached identity vote is reused.
+"""
+
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+IOU_THRESHOLD = 0.3  # Minimum IoU to continue a track
+MAX_MISSED_FRAMES = 30  # Drop a track after this many frames without a matching box
+REEMBED_INTERVAL = 15  # Re-embed every track at least this often (frames)
+LOW_CONFIDENCE_SIMILARITY = 0.70  # Below this, re-embed more often
+LOW_CONFIDENCE_INTERVAL = 3  # Re-embed interval (frames) for low-confidence tracks
+VOTE_DECAY = 0.9  # Older votes fade so a mis-assigned track can recover
+TRACKER_IDLE_TTL = 300.0  # Seconds before an unused camera's tracker is discarded
+
+
+class Track:
+    """One face followed across frames, with accumulated identity votes"""
+
+    def __init__(self, track_id: int, bbox: Tuple[int, int, int, int]):
+        self.track_id = track_id
+        self.bbox = bbox  # (x1, y1, x2, y2)
+        self.hits = 1
+        self.missed = 0
+        self.frames_since_embed = None  # None = never embedded
+        self.last_similarity = 0.0
+        self.votes: Dict[str, float] = {}  # {student_id: decayed similarity-weighted votes}
+        self.best_similarity: Dict[str, float] = {}
+
+    @property
+    def identity(self) -> Optional[str]:
+        """Student with the most votes, or None"""
+        if not self.votes:
+            return None
+        return max(self.votes, key=self.votes.get)
+
+    def record_match(self, student_id: Optional[str], similarity: float, recognized: bool):
+        """Fold a fresh embedding match into the track's identity votes"""
+        self.frames_since_embed = 0
+        self.last_similarity = similarity
+        for key in self.votes:
+            self.votes[key] *= VOTE_DECAY
+        if recognized and student_id:
+            self.votes[student_id] = self.votes.get(student_id, 0.0) + similarity
+            self.best_similarity[student_id] = max(self.best_similarity.get(student_id, 0.0), similarity)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    a = a[:, None, :].astype(np.float32)
+    b = b[None, :, :].astype(np.float32)
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+class FaceTracker:
+    """Greedy IoU association of detections to tracks for a single camera"""
+
+    def __init__(self, iou_threshold: float = IOU_THRESHOLD, max_missed: int = MAX_MISSED_FRAMES,
+                 reembed_interval: int = REEMBED_INTERVAL, id_offset: int = 0, id_stride: int = 1):
+        """
+        Args:
+            id_offset, id_stride: Track IDs are id_offset + n * id_stride, so several
+                processes tracking the same camera never hand out the same ID
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reembed_interval = reembed_interval
+        self.tracks: List[Track] = []
+        self._next_id = id_offset
+        self._id_stride = id_stride
+        self.last_used = time.time()
+        self.embeds = 0
+        self.reuses = 0
+
+    def update(self, detections: List[Tuple]) -> List[Track]:
+        """
+        Associate this frame's detections with tracks.
+        Returns the Track for each detection (same order); unmatched detections start new tracks.
+        """
+        self.last_used = time.time()
+        boxes = np.array([d[:4] for d in detections], dtype=np.float32).reshape(-1, 4)
+        track_boxes = np.array([t.bbox for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+        ious = iou_matrix(boxes, track_boxes)
+
+        assigned: List[Optional[Track]] = [None] * len(detections)
+        used_tracks = set()
+        if ious.size:
+            # Greedy: take the highest-IoU pairs first
+            for flat in np.argsort(-ious, axis=None):
+                d, t = divmod(int(flat), ious.shape[1])
+                if ious[d, t] < self.iou_threshold:
+                    break
+                if assigned[d] is not None or t in used_tracks:
+                    continue
+                assigned[d] = self.tracks[t]
+                used_tracks.add(t)
+
+        for t, track in enumerate(self.tracks):
+            if t in used_tracks:
+                track.hits += 1
+                track.missed = 0
+            else:
+                track.missed += 1
+            if track.frames_since_embed is not None:
+                track.frames_since_embed += 1
+
+        for d, track in enumerate(assigned):
+            if track is None:
+                track = Track(self._next_id, tuple(int(v) for v in boxes[d]))
+                self._next_id += self._id_stride
+                self.tracks.append(track)
+                assigned[d] = track
+            else:
+                track.bbox = tuple(int(v) for v in boxes[d])
+
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return assigned
+
+    def needs_embedding(self, track: Track) -> bool:
+        """New track, periodic refresh, or low-confidence identity"""
+        if track.frames_since_embed is None:
+            return True
+        if track.frames_since_embed >= self.reembed_interval:
+            return True
+        return track.last_similarity < LOW_CONFIDENCE_SIMILARITY and track.frames_since_embed >= LOW_CONFIDENCE_INTERVAL
+
+
+class TrackerRegistry:
+    """Per-camera trackers, created on demand and discarded when idle"""
+
+    def __init__(self, id_offset: int = 0, id_stride: int = 1, idle_ttl: float = TRACKER_IDLE_TTL):
+        self.id_offset = id_offset
+        self.id_stride = id_stride
+        self.idle_ttl = idle_ttl
+        self._trackers: Dict[str, FaceTracker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id: Optional[str]) -> Optional[FaceTracker]:
+        """Tracker for a camera (None when the caller did not identify its camera)"""
+        if not camera_id:
+            return None
+        now = time.time()
+        with self._lock:
+            for key in [k for k, t in self._trackers.items() if now - t.last_used > self.idle_ttl]:
+                del self._trackers[key]
+            tracker = self._trackers.get(camera_id)
+            if tracker is None:
+                tracker = FaceTracker(id_offset=self.id_offset, id_stride=self.id_stride)
+                self._trackers[camera_id] = tracker
+            return tracker
+
+    def stats(self) -> Dict:
+        with self._lock:
+            trackers = list(self._trackers.values())
+        return {
+            "cameras": len(trackers),
+            "active_tracks": sum(len(t.tracks) for t in trackers),
+            "embeds": sum(t.embeds for t in trackers),
+            "reuses": sum(t.reuses for t in trackers),
+        }
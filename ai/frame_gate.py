@@ -0,0 +1,118 @@
+"""
+Motion / scene-change gating for camera frames
+Classroom cameras mostly send the same picture, so before detection each camera's frame is
+shrunk to a small grayscale thumbnail and compared with the thumbnail of the last frame that
+was fully processed. If too few pixels changed, the previous recognition result is returned
+instead of running YOLO and ArcFace again. A full pass is still forced every
+GATE_REFRESH_SECONDS so new enrollments and slow changes are picked up.
+
+Only frames that carry a camera ID are gated. In worker-pool mode every frame of a camera is
+routed to the same worker (see inference_pool.py), so its gate compares consecutive frames
+rather than whichever frame of that camera the worker last happened to see.
+Skipped/processed counts are exported as ai_frames_gated_total on /metrics and summarized
+on /gate-stats.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+import metrics
+
+GATE_ENABLED = os.environ.get("AI_FRAME_GATE", "1") == "1"
+GATE_REFRESH_SECONDS = float(os.environ.get("AI_GATE_REFRESH_SECONDS", "2.0"))  # Max age of a reused result
+GATE_THUMBNAIL_SIZE = (64, 36)  # (width, height) compared between frames; 16:9 like most cameras
+GATE_PIXEL_THRESHOLD = 12  # Gray-level difference for a thumbnail pixel to count as changed
+GATE_CHANGED_FRACTION = 0.004  # Frame counts as changed above this fraction of changed pixels (~9 pixels)
+GATE_IDLE_TTL = 300.0  # Seconds before an unused camera's gate is discarded
+
+
+def thumbnail(frame: np.ndarray) -> np.ndarray:
+    """Small blurred grayscale version of a frame (cheap to compare, robust to sensor noise)"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, GATE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (3, 3), 0)
+
+
+class FrameGate:
+    """Per-camera gate: remembers the last processed thumbnail and its results"""
+
+    def __init__(self, refresh_seconds: float = GATE_REFRESH_SECONDS,
+                 pixel_threshold: int = GATE_PIXEL_THRESHOLD, changed_fraction: float = GATE_CHANGED_FRACTION):
+        self.refresh_seconds = refresh_seconds
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self._lock = threading.Lock()
+        self._reference: Optional[np.ndarray] = None
+        self._results: Optional[List[Dict]] = None
+        self._processed_at = 0.0
+        self.last_used = time.time()
+        self.skipped = 0
+        self.processed = 0
+
+    def changed(self, small: np.ndarray) -> bool:
+        """Whether a thumbnail differs enough from the reference to need a full pass"""
+        if self._reference is None or self._reference.shape != small.shape:
+            return True
+        diff = cv2.absdiff(small, self._reference)
+        return np.count_nonzero(diff > self.pixel_threshold) > self.changed_fraction * diff.size
+
+    def check(self, frame: np.ndarray):
+        """
+        Returns (cached results or None, thumbnail). None means the frame must be processed;
+        pass the thumbnail and the new results to update() afterwards.
+        """
+        small = thumbnail(frame)
+        now = time.time()
+        with self._lock:
+            self.last_used = now
+            if (self._results is not None and now - self._processed_at < self.refresh_seconds
+                    and not self.changed(small)):
+                self.skipped += 1
+                metrics.observe("gate", "skipped", 1)
+                return [dict(result) for result in self._results], small
+            self.processed += 1
+        metrics.observe("gate", "processed", 1)
+        return None, small
+
+    def update(self, small: np.ndarray, results: List[Dict]):
+        with self._lock:
+            self._reference = small
+            self._results = [dict(result) for result in results]
+            self._processed_at = time.time()
+
+
+class GateRegistry:
+    """Per-camera frame gates, created on demand and discarded when idle"""
+
+    def __init__(self, enabled: bool = GATE_ENABLED, idle_ttl: float = GATE_IDLE_TTL):
+        self.enabled = enabled
+        self.idle_ttl = idle_ttl
+        self._gates: Dict[str, FrameGate] = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id: Optional[str]) -> Optional[FrameGate]:
+        """Gate for a camera (None when gating is off or the caller did not identify its camera)"""
+        if not self.enabled or not camera_id:
+            return None
+        now = time.time()
+        with self._lock:
+            for key in [k for k, g in self._gates.items() if now - g.last_used > self.idle_ttl]:
+                del self._gates[key]
+            gate = self._gates.get(camera_id)
+            if gate is None:
+                gate = self._gates[camera_id] = FrameGate()
+            return gate
+
+    def stats(self) -> Dict:
+        with self._lock:
+            gates = list(self._gates.values())
+        return {
+            "cameras": len(gates),
+            "skipped": sum(g.skipped for g in gates),
+            "processed": sum(g.processed for g in gates),
+        }
@@ -0,0 +1,326 @@
+"""
+Streaming frame transport: a length-prefixed binary protocol over TCP or a Unix socket
+One long-lived connection per camera replaces a multipart HTTP upload per frame. Frames
+are pipelined (several in flight per connection) and results come back asynchronously,
+matched by sequence number, as soon as each frame is done.
+
+Every message is a fixed 14-byte header followed by the payload:
+    type      u8   MSG_HELLO / MSG_ENCODED / MSG_RAW (client) or MSG_RESULT / MSG_ERROR (server)
+    seq       u32  chosen by the client, echoed in the reply
+    length    u32  payload bytes
+    height    u16  MSG_RAW only (else 0)
+    width     u16  MSG_RAW only (else 0)
+    channels  u8   MSG_RAW only (else 0)
+(network byte order). Payloads:
+    MSG_HELLO    JSON {"cameraId": "..."}: frames on this connection belong to that camera
+    MSG_ENCODED  JPEG/PNG bytes (decoded once, straight from the receive buffer)
+    MSG_RAW      height * width * channels uint8 pixels, BGR (3) or grayscale (1, converted
+                 to BGR on arrival); no decoding at all
+    MSG_RESULT   JSON {"results": [...], "recognized": bool, "count": n} like /recognize-live
+    MSG_ERROR    JSON {"error": "..."}
+
+Started by ai_server.py when AI_STREAM_PORT or AI_STREAM_SOCKET is set. Try it with:
+    python frame_stream.py client 127.0.0.1:8765 lecture.mp4 --camera room-101
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+import metrics
+
+HEADER = struct.Struct("!BIIHHB")
+MSG_HELLO = 1
+MSG_ENCODED = 2
+MSG_RAW = 3
+MSG_RESULT = 4
+MSG_ERROR = 5
+
+STREAM_MAX_PAYLOAD = 64 * 1024 * 1024  # Larger messages close the connection (a 4K BGR frame is ~25 MB)
+STREAM_MAX_IN_FLIGHT = 4  # Frames per connection being processed before the server stops reading
+STREAM_WORKERS = 8  # Threads processing frames across all connections
+STREAM_ENDPOINT = "stream"  # Label for ai_requests_total / ai_request_seconds
+
+
+class ProtocolError(Exception):
+    """Raised on a malformed message; the connection is closed"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytearray]:
+    """Read exactly size bytes into a new buffer (None if the peer closed the connection)"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            return None
+        received += count
+    return buffer
+
+
+def read_message(sock: socket.socket) -> Optional[Tuple[int, int, Tuple[int, int, int], bytearray]]:
+    """(type, seq, (height, width, channels), payload), or None at end of stream"""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    msg_type, seq, length, height, width, channels = HEADER.unpack(header)
+    if length > STREAM_MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {length} bytes exceeds {STREAM_MAX_PAYLOAD}")
+    payload = _recv_exact(sock, length) if length else bytearray()
+    if payload is None:
+        raise ProtocolError("Connection closed mid-message")
+    return msg_type, seq, (height, width, channels), payload
+
+
+def write_message(sock: socket.socket, msg_type: int, seq: int, payload, shape: Tuple[int, int, int] = (0, 0, 0)):
+    """Send one message; payload is any bytes-like object (sent without copying)"""
+    payload = memoryview(payload).cast("B")
+    sock.sendall(HEADER.pack(msg_type, seq, payload.nbytes, *shape))
+    if payload.nbytes:
+        sock.sendall(payload)
+
+
+def _listen(host: str, port: int, unix_path: Optional[str]) -> socket.socket:
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(unix_path)
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+    server.listen()
+    return server
+
+
+class FrameStreamServer:
+    """Accepts stream connections and answers each frame with its recognition results"""
+
+    def __init__(self, process: Callable[[Optional[bytearray], Optional[np.ndarray], Optional[str]], Any],
+                 host: str = "127.0.0.1", port: int = 0, unix_path: Optional[str] = None,
+                 workers: int = STREAM_WORKERS, max_in_flight: int = STREAM_MAX_IN_FLIGHT):
+        """
+        Args:
+            process: (encoded bytes or None, decoded frame or None, camera id) -> result list
+                (like /recognize-live "results"); raising sends MSG_ERROR for that frame
+            host, port: TCP address (ignored when unix_path is set)
+            unix_path: Listen on a Unix socket instead
+            workers: Frames processed concurrently across all connections
+            max_in_flight: Unanswered frames per connection before it stops being read (backpressure)
+        """
+        self.process = process
+        self.max_in_flight = max_in_flight
+        self._server = _listen(host, port, unix_path)
+        self.address = unix_path or "%s:%d" % self._server.getsockname()[:2]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-stream")
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.frames = 0
+        self.errors = 0
+
+    def start(self) -> "FrameStreamServer":
+        threading.Thread(target=self._accept, name="frame-stream-accept", daemon=True).start()
+        print(f"[Stream] Listening for frame streams on {self.address}")
+        return self
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"address": self.address, "connections": self.connections,
+                    "frames": self.frames, "errors": self.errors}
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return  # Listening socket closed
+            if conn.family != socket.AF_UNIX:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), name="frame-stream-conn", daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        camera_id = None
+        write_lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                message = read_message(conn)
+                if message is None:
+                    break
+                msg_type, seq, (height, width, channels), payload = message
+                if msg_type == MSG_HELLO:
+                    camera_id = json.loads(payload.decode("utf-8")).get("cameraId") or None
+                    continue
+                if msg_type == MSG_RAW:
+                    if height * width * channels != len(payload) or channels not in (1, 3):
+                        raise ProtocolError(f"Raw frame of {len(payload)} bytes does not match {height}x{width}x{channels}")
+                    # A view of the receive buffer - BGR pixels are never copied
+                    frame = np.frombuffer(payload, dtype=np.uint8).reshape(height, width, channels)
+                    if channels == 1:
+                        # The recognizer expects 3-channel BGR everywhere (crops, alignment, ArcFace)
+                        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                    data = None
+                elif msg_type == MSG_ENCODED:
+                    frame, data = None, payload
+                else:
+                    raise ProtocolError(f"Unexpected message type {msg_type}")
+                in_flight.acquire()
+                self._executor.submit(self._handle, conn, write_lock, in_flight, seq, data, frame, camera_id)
+        except (ProtocolError, ValueError) as e:
+            print(f"[Stream] Closing connection{f' for camera {camera_id}' if camera_id else ''}: {e}")
+        except OSError:
+            pass
+        finally:
+            # Let frames already submitted finish before closing
+            for _ in range(self.max_in_flight):
+                in_flight.acquire()
+            conn.close()
+            with self._lock:
+                self.connections -= 1
+
+    def _handle(self, conn: socket.socket, write_lock: threading.Lock, in_flight: threading.BoundedSemaphore,
+                seq: int, data: Optional[bytearray], frame: Optional[np.ndarray], camera_id: Optional[str]):
+        start = time.perf_counter()
+        try:
+            results = self.process(data, frame, camera_id)
+            msg_type = MSG_RESULT
+            body = {"results": results, "recognized": any(r["recognized"] for r in results), "count": len(results)}
+            status = 200
+        except Exception as e:
+            msg_type, body, status = MSG_ERROR, {"error": str(e) or type(e).__name__}, 500
+        metrics.record_request(STREAM_ENDPOINT, status, time.perf_counter() - start)
+        with self._lock:
+            self.frames += 1
+            self.errors += status != 200
+        try:
+            with write_lock:
+                write_message(conn, msg_type, seq, json.dumps(body).encode("utf-8"))
+        except OSError:
+            pass  # Client went away; the reader notices and closes the connection
+        finally:
+            in_flight.release()
+
+    def close(self):
+        self._server.close()
+        self._executor.shutdown(wait=False)
+
+
+class FrameStreamClient:
+    """Client side of the protocol: send() returns a Future resolved with the frame's result"""
+
+    def __init__(self, address: str, camera_id: Optional[str] = None):
+        """
+        Args:
+            address: "host:port" for TCP, or a Unix socket path
+            camera_id: Sent once in MSG_HELLO (enables per-camera tracking, gating and profiles)
+        """
+        if os.path.sep in address or not address.rpartition(":")[2].isdigit():
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        else:
+            host, _, port = address.rpartition(":")
+            self.sock = socket.create_connection((host, int(port)))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        if camera_id:
+            write_message(self.sock, MSG_HELLO, 0, json.dumps({"cameraId": camera_id}).encode("utf-8"))
+        threading.Thread(target=self._read, name="frame-stream-client", daemon=True).start()
+
+    def send(self, frame: Union[np.ndarray, bytes]) -> Future:
+        """Send a BGR frame (raw) or encoded image bytes; the Future resolves to the result dict"""
+        future: Future = Future()
+        with self._lock:
+            self._seq = (self._seq + 1) & 0xFFFFFFFF
+            seq = future.seq = self._seq
+            self._pending[seq] = future
+            if isinstance(frame, np.ndarray):
+                frame = np.ascontiguousarray(frame, dtype=np.uint8)
+                shape = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+                write_message(self.sock, MSG_RAW, seq, frame, shape)
+            else:
+                write_message(self.sock, MSG_ENCODED, seq, frame)
+        return future
+
+    def recognize(self, frame: Union[np.ndarray, bytes], timeout: Optional[float] = None) -> Dict:
+        return self.send(frame).result(timeout=timeout)
+
+    def _read(self):
+        try:
+            while True:
+                message = read_message(self.sock)
+                if message is None:
+                    break
+                msg_type, seq, _, payload = message
+                with self._lock:
+                    future = self._pending.pop(seq, None)
+                if future is None:
+                    continue
+                body = json.loads(payload.decode("utf-8"))
+                if msg_type == MSG_RESULT:
+                    future.set_result(body)
+                else:
+                    future.set_exception(RuntimeError(body.get("error", "Stream error")))
+        except (OSError, ProtocolError):
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ConnectionError("Frame stream closed"))
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frame stream client: send a video's frames, print results")
+    commands = parser.add_subparsers(dest="command", required=True)
+    client_cmd = commands.add_parser("client")
+    client_cmd.add_argument("address", help="host:port or Unix socket path")
+    client_cmd.add_argument("video", help="Video file or camera URL")
+    client_cmd.add_argument("--camera", help="Camera ID")
+    client_cmd.add_argument("--jpeg", action="store_true", help="Send JPEG instead of raw BGR")
+    client_cmd.add_argument("--max-frames", type=int, default=0)
+    args = parser.parse_args()
+
+    client = FrameStreamClient(args.address, camera_id=args.camera)
+    capture = cv2.VideoCapture(args.video)
+    futures = []
+    start = time.perf_counter()
+    while not args.max_frames or len(futures) < args.max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        futures.append(client.send(cv2.imencode(".jpg", frame)[1].tobytes() if args.jpeg else frame))
+        if len(futures) > STREAM_MAX_IN_FLIGHT:
+            futures[-STREAM_MAX_IN_FLIGHT - 1].result()  # Keep a bounded number of frames in flight
+    for future in futures:
+        try:
+            result = future.result()
+            print(f"[Stream] #{future.seq}: {[r['student_id'] for r in result['results'] if r['recognized']]} "
+                  f"({result['count']} faces)")
+        except Exception as e:
+            print(f"[Stream] #{future.seq}: error {e}")
+    elapsed = time.perf_counter() - start
+    print(f"[Stream] {len(futures)} frames in {elapsed:.2f}s ({len(futures) / elapsed if elapsed else 0:.1f} fps)")
+    client.close()
+    sys.exit(0)
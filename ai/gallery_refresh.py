@@ -0,0 +1,194 @@
+"""
+Online gallery refresh from high-confidence live recognitions
+Appearance drifts over a semester, so faces recognized with a wide margin are buffered as
+samples and, once enough of them agree, folded into the student's nearest prototype with a
+small exponential-moving-average step. Quality gates keep a bad update out of the gallery:
+  - per face: similarity, margin over the runner-up student, detection confidence, face size
+  - per update: samples must agree with each other, still match the student unambiguously,
+    and the updated prototype must stay close to its trained anchor (bounded drift)
+  - per student: at most one update every REFRESH_INTERVAL seconds (in worker mode enforced by
+    the pool's main process with a RefreshLimiter, since each worker only sees its own samples)
+
+Anchors are the prototypes written by the last /train, kept in their own embedding store
+(<store>/anchors) so the drift bound survives restarts. Updates are persisted as appends to
+the embedding store's log by the single writer (the recognizer in single-process mode, one
+pool worker at a time in worker mode). Outcomes are exported as ai_gallery_refresh_total.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from embedding_gallery import EmbeddingGallery
+from embedding_store import EmbeddingStore
+
+REFRESH_ENABLED = os.environ.get("AI_GALLERY_REFRESH", "1") == "1"
+REFRESH_MIN_SIMILARITY = float(os.environ.get("AI_REFRESH_MIN_SIMILARITY", "0.75"))  # Well above RECOGNITION_THRESHOLD
+REFRESH_MIN_MARGIN = 0.15  # Over the runner-up student
+REFRESH_MIN_DETECTION = 0.7  # YOLO confidence of the face
+REFRESH_MIN_FACE_SIZE = 80  # Pixels, shorter side of the face box
+REFRESH_MIN_SAMPLES = 5  # Agreeing samples folded in per update
+REFRESH_MIN_CONSISTENCY = 0.8  # Cosine of each sample to the samples' median
+REFRESH_RATE = float(os.environ.get("AI_REFRESH_RATE", "0.05"))  # EMA step toward the samples' median
+REFRESH_MIN_ANCHOR_SIMILARITY = 0.85  # Updated prototypes never drift further from their trained anchor
+REFRESH_INTERVAL = float(os.environ.get("AI_REFRESH_INTERVAL", "600"))  # Seconds between updates of a student
+ANCHORS_DIR = "anchors"  # Subdirectory of the embedding store
+
+REFRESH_OUTCOMES = ("sampled", "updated", "inconsistent", "unknown", "dissimilar", "ambiguous", "drift",
+                    "throttled")
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class RefreshLimiter:
+    """Per-student REFRESH_INTERVAL across every process that proposes updates for one writer"""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = REFRESH_INTERVAL if interval is None else interval
+        self._last_update: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def admit(self, proposals: Dict[str, List[np.ndarray]]) -> Dict[str, List[np.ndarray]]:
+        """The proposals of students not updated within the interval; the others are dropped"""
+        now = time.time()
+        admitted = {}
+        with self._lock:
+            for student_id, samples in proposals.items():
+                if now - self._last_update.get(student_id, 0.0) < self.interval:
+                    metrics.observe("refresh", "throttled", 1)
+                    continue
+                self._last_update[student_id] = now
+                admitted[student_id] = samples
+        return admitted
+
+
+class GalleryRefresh:
+    """Buffers refresh samples from live recognition and applies bounded prototype updates"""
+
+    def __init__(self, store_dir: str, enabled: bool = REFRESH_ENABLED):
+        self.enabled = enabled
+        self.apply_locally = True  # False in pool workers: drain() goes to the single writer instead
+        self.anchor_store = EmbeddingStore(os.path.join(store_dir, ANCHORS_DIR))
+        self._anchors: Optional[EmbeddingGallery] = None
+        self._samples: Dict[str, deque] = {}
+        self._last_update: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ sampling (any process)
+    def offer(self, student_id: str, embedding: np.ndarray, similarity: float, runner_up: float,
+              detection_confidence: float, face_size: float) -> bool:
+        """Buffer one recognized face as a refresh sample if it passes the per-face gates"""
+        if not self.enabled:
+            return False
+        if (similarity < REFRESH_MIN_SIMILARITY or similarity - runner_up < REFRESH_MIN_MARGIN
+                or detection_confidence < REFRESH_MIN_DETECTION or face_size < REFRESH_MIN_FACE_SIZE):
+            return False
+        with self._lock:
+            if time.time() - self._last_update.get(student_id, 0.0) < REFRESH_INTERVAL:
+                return False
+            samples = self._samples.setdefault(student_id, deque(maxlen=REFRESH_MIN_SAMPLES * 2))
+            samples.append(np.array(embedding, dtype=np.float32))
+        metrics.observe("refresh", "sampled", 1)
+        return True
+
+    def drain(self) -> Dict[str, List[np.ndarray]]:
+        """Take the buffered samples of every student that has enough (they are then rate limited)"""
+        now = time.time()
+        with self._lock:
+            ready = {s: list(q) for s, q in self._samples.items() if len(q) >= REFRESH_MIN_SAMPLES}
+            for student_id in ready:
+                del self._samples[student_id]
+                self._last_update[student_id] = now
+        return ready
+
+    # ------------------------------------------------------------------ updates (writer only)
+    def anchors(self) -> EmbeddingGallery:
+        """Trained prototypes, brought up to date with the anchor store"""
+        if self._anchors is None:
+            if self.anchor_store.exists():
+                self._anchors = self.anchor_store.load_gallery()
+            else:
+                self._anchors = EmbeddingGallery()
+                self.anchor_store.compact(self._anchors)
+        else:
+            self._anchors = self.anchor_store.sync(self._anchors)
+        return self._anchors
+
+    def _persist_anchor(self, anchors: EmbeddingGallery, key: str):
+        embedding = anchors.get(key)
+        if embedding is None:
+            self.anchor_store.append_delete(anchors, key)
+        else:
+            self.anchor_store.append_upsert(anchors, key, embedding)
+
+    def set_anchors(self, student_id: str, prototypes: np.ndarray):
+        """Record freshly trained prototypes as the drift reference (called after training)"""
+        try:
+            anchors = self.anchors()
+            for key in anchors.set_prototypes(student_id, prototypes):
+                self._persist_anchor(anchors, key)
+        except Exception as e:
+            print(f"[AI] Error saving refresh anchors for {student_id}: {e}")
+
+    def apply(self, gallery: EmbeddingGallery, proposals: Dict[str, List[np.ndarray]]) -> List[str]:
+        """
+        Fold buffered samples into the gallery.
+        Args:
+            gallery: Gallery to update in place
+            proposals: {student_id: samples} from drain()
+        Returns:
+            Gallery keys that were updated (to be appended to the embedding store)
+        """
+        anchors = self.anchors()
+        updated = []
+        for student_id, samples in proposals.items():
+            outcome, key = self._update(gallery, anchors, student_id, samples)
+            metrics.observe("refresh", outcome, 1)
+            if key is not None:
+                updated.append(key)
+        return updated
+
+    def _update(self, gallery: EmbeddingGallery, anchors: EmbeddingGallery, student_id: str,
+                samples: List[np.ndarray]) -> Tuple[str, Optional[str]]:
+        """One student's update; returns (outcome, updated key or None)"""
+        samples = np.stack([_unit(s) for s in samples])
+        center = _unit(np.median(samples, axis=0))
+        samples = samples[samples @ center >= REFRESH_MIN_CONSISTENCY]
+        if len(samples) < REFRESH_MIN_SAMPLES:
+            return "inconsistent", None
+        center = _unit(np.median(samples, axis=0))
+
+        keys = gallery.prototype_keys(student_id)
+        if not keys:
+            return "unknown", None  # Removed or retrained away since the samples were taken
+        candidates = gallery.search(center, top_k=2)[0]
+        runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+        if candidates[0][0] != student_id or candidates[0][1] - runner_up < REFRESH_MIN_MARGIN:
+            return "ambiguous", None
+
+        prototypes = np.stack([gallery.get(key) for key in keys])
+        nearest = int(np.argmax(prototypes @ center))
+        if float(prototypes[nearest] @ center) < REFRESH_MIN_SIMILARITY:
+            return "dissimilar", None
+        key = keys[nearest]
+        refreshed = _unit((1.0 - REFRESH_RATE) * prototypes[nearest] + REFRESH_RATE * center)
+
+        anchor = anchors.get(key)
+        if anchor is None:
+            # Enrolled before anchors existed: the current prototype becomes the reference
+            anchor = prototypes[nearest]
+            anchors.add(key, anchor)
+            self._persist_anchor(anchors, key)
+        if float(refreshed @ anchor) < REFRESH_MIN_ANCHOR_SIMILARITY:
+            return "drift", None
+
+        gallery.add(key, refreshed)
+        return "updated", key
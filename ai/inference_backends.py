@@ -0,0 +1,305 @@
+"""
+ONNX Runtime inference backend for YOLOv8-face and ArcFace
+With AI_INFERENCE_BACKEND=onnx, FaceRecognizer runs exported ONNX models instead of
+ultralytics / DeepFace's TensorFlow ArcFace (the default backend is unchanged).
+Execution providers are configurable, so OpenVINO can be used through onnxruntime-openvino
+(AI_ONNX_PROVIDERS=OpenVINOExecutionProvider,CPUExecutionProvider).
+
+Commands (from the ai/ directory):
+    python inference_backends.py export                  # writes models/yolov8n-face.onnx and models/arcface.onnx
+    python inference_backends.py parity <frames dir>     # compares ONNX vs default detections/embeddings
+    python inference_backends.py batch-parity <frames dir>  # batched ArcFace vs DeepFace.represent
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+ONNX_MODEL_DIR = "models"
+ONNX_YOLO_PATH = os.path.join(ONNX_MODEL_DIR, "yolov8n-face.onnx")
+ONNX_ARCFACE_PATH = os.path.join(ONNX_MODEL_DIR, "arcface.onnx")
+ONNX_THREADS = int(os.environ.get("AI_ONNX_THREADS", "0"))  # Intra-op threads (0 = onnxruntime default)
+ONNX_GRAPH_OPTIMIZATION = os.environ.get("AI_ONNX_GRAPH_OPT", "all")  # disable / basic / extended / all
+ONNX_PROVIDERS = os.environ.get("AI_ONNX_PROVIDERS", "CPUExecutionProvider").split(",")
+# "fp32" or "int8" (models quantized with `python model_quantization.py quantize <frames dir>`)
+ONNX_PRECISION = os.environ.get("AI_ONNX_PRECISION", "fp32")
+
+YOLO_INPUT_SIZE = 640
+YOLO_NMS_IOU = 0.7  # Same default as ultralytics predict
+LETTERBOX_COLOR = (114, 114, 114)
+
+# Parity tolerances (ONNX vs default backend)
+PARITY_MIN_BOX_IOU = 0.9
+PARITY_MAX_CONF_DIFF = 0.05
+PARITY_MIN_EMBEDDING_COSINE = 0.999
+
+
+def onnx_model_path(path: str, precision: str = ONNX_PRECISION) -> str:
+    """Path of a model at the given precision: models/arcface.onnx -> models/arcface.int8.onnx"""
+    if precision == "fp32":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{precision}{ext}"
+
+
+def make_session(path: str, threads: int = ONNX_THREADS, graph_optimization: str = ONNX_GRAPH_OPTIMIZATION,
+                 providers: Sequence[str] = ONNX_PROVIDERS):
+    """Create an onnxruntime InferenceSession with thread and graph-optimization controls"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("onnxruntime not installed. Install with: pip install onnxruntime")
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    options = ort.SessionOptions()
+    options.graph_optimization_level = levels[graph_optimization]
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    available = set(ort.get_available_providers())
+    providers = [p for p in providers if p in available] or ["CPUExecutionProvider"]
+    return ort.InferenceSession(path, sess_options=options, providers=providers)
+
+
+def _fixed_batch(session) -> Optional[int]:
+    """Batch size baked into the model input, or None when the batch dimension is dynamic"""
+    dim = session.get_inputs()[0].shape[0]
+    return dim if isinstance(dim, int) else None
+
+
+class OnnxFaceDetector:
+    """YOLOv8-face exported to ONNX: letterbox, one session run per batch, decode and NMS"""
+
+    def __init__(self, path: str = ONNX_YOLO_PATH, **session_options):
+        self.model_path = path
+        self.session = make_session(path, **session_options)
+        self.input_name = self.session.get_inputs()[0].name
+        self.batch = _fixed_batch(self.session)
+        size = self.session.get_inputs()[0].shape[2]
+        self.fixed_size = size if isinstance(size, int) else None  # Set when exported without dynamic=True
+
+    def _letterbox(self, frame: np.ndarray, size: int = YOLO_INPUT_SIZE):
+        """Resize keeping aspect ratio and pad to a square, like ultralytics LetterBox"""
+        h, w = frame.shape[:2]
+        gain = min(size / h, size / w)
+        new_w, new_h = int(round(w * gain)), int(round(h * gain))
+        pad_w, pad_h = (size - new_w) / 2, (size - new_h) / 2
+        if (new_w, new_h) != (w, h):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+        left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+        frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+        return frame, gain, left, top
+
+    def detect(self, frames: List[np.ndarray], conf: float, imgsz: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Returns one (N, 5 + extra) float array per frame: x1, y1, x2, y2, confidence in frame
+        pixels, followed by any extra model outputs (keypoints for yolov8-face), rescaled likewise.
+        imgsz (a multiple of 32) overrides the inference size unless the model has a fixed input size.
+        """
+        size = self.fixed_size or imgsz or YOLO_INPUT_SIZE
+        prepared = [self._letterbox(frame, size) for frame in frames]
+        blob = np.stack([img[:, :, ::-1].transpose(2, 0, 1) for img, _, _, _ in prepared]).astype(np.float32) / 255.0
+        chunk = self.batch or len(blob)
+        outputs = np.concatenate([self.session.run(None, {self.input_name: blob[i:i + chunk]})[0]
+                                  for i in range(0, len(blob), chunk)])
+        return [self._decode(output, frame.shape[:2], gain, left, top, conf)
+                for output, frame, (_, gain, left, top) in zip(outputs, frames, prepared)]
+
+    def _decode(self, output: np.ndarray, shape, gain: float, left: int, top: int, conf: float) -> np.ndarray:
+        # output: (channels, anchors) = cx, cy, w, h, score, [keypoints x, y, visibility ...]
+        preds = output.T
+        preds = preds[preds[:, 4] >= conf]
+        if len(preds) == 0:
+            return np.zeros((0, output.shape[0]), dtype=np.float32)
+        xywh = preds[:, :4]
+        boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+        keep = cv2.dnn.NMSBoxes(np.concatenate([boxes[:, :2], xywh[:, 2:]], axis=1).tolist(),
+                                preds[:, 4].tolist(), conf, YOLO_NMS_IOU)
+        keep = np.array(keep, dtype=np.int64).reshape(-1)
+        keep = keep[np.argsort(-preds[keep, 4])]
+        boxes, preds = boxes[keep], preds[keep].copy()
+
+        h, w = shape
+        boxes -= [left, top, left, top]
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        extra = preds[:, 5:]
+        if extra.shape[1] and extra.shape[1] % 3 == 0:
+            keypoints = extra.reshape(len(extra), -1, 3)
+            keypoints[:, :, 0] = (keypoints[:, :, 0] - left) / gain
+            keypoints[:, :, 1] = (keypoints[:, :, 1] - top) / gain
+            extra = keypoints.reshape(len(extra), -1)
+        return np.concatenate([boxes, preds[:, 4:5], extra], axis=1).astype(np.float32)
+
+
+class OnnxArcFace:
+    """ArcFace exported to ONNX; called like the Keras model: model(batch, training=False)"""
+
+    def __init__(self, path: str = ONNX_ARCFACE_PATH, **session_options):
+        self.model_path = path
+        self.session = make_session(path, **session_options)
+        self.input_name = self.session.get_inputs()[0].name
+        self.batch = _fixed_batch(self.session)
+
+    def __call__(self, batch: np.ndarray, training: bool = False) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        chunk = self.batch or len(batch)
+        return np.concatenate([self.session.run(None, {self.input_name: batch[i:i + chunk]})[0]
+                               for i in range(0, len(batch), chunk)])
+
+
+def export_yolo(pt_path: str, output_path: str = ONNX_YOLO_PATH) -> str:
+    """Export the YOLOv8-face weights to ONNX with a dynamic batch dimension"""
+    from ultralytics import YOLO
+    exported = YOLO(pt_path).export(format="onnx", imgsz=YOLO_INPUT_SIZE, dynamic=True, simplify=True)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    shutil.move(exported, output_path)
+    return output_path
+
+
+def export_arcface(output_path: str = ONNX_ARCFACE_PATH, opset: int = 13) -> str:
+    """Convert DeepFace's Keras ArcFace model to ONNX (NHWC float input, dynamic batch)"""
+    import tensorflow as tf
+    import tf2onnx
+    from deepface import DeepFace
+    model = DeepFace.build_model("ArcFace")
+    model = getattr(model, "model", model)
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+    return output_path
+
+
+def _box_iou(a, b) -> float:
+    iw = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def check_parity(frames_dir: str, max_frames: int = 50) -> bool:
+    """
+    Run the default and ONNX backends on the same frames and compare:
+      - detections: same count, box IoU >= PARITY_MIN_BOX_IOU, confidence within PARITY_MAX_CONF_DIFF
+      - embeddings of the default backend's crops: cosine >= PARITY_MIN_EMBEDDING_COSINE
+    """
+    from ai_module_yolo import FaceRecognizer
+
+    reference = FaceRecognizer(backend="default")
+    candidate = FaceRecognizer(backend="onnx")
+    if not isinstance(candidate.yolo_model, OnnxFaceDetector) or not isinstance(candidate._arcface_model, OnnxArcFace):
+        print(f"[Parity] ONNX models not loaded (run 'python inference_backends.py export' first)")
+        return False
+
+    files = sorted(f for f in os.listdir(frames_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))[:max_frames]
+    box_failures, emb_failures, faces, min_iou, min_cos = 0, 0, 0, 1.0, 1.0
+    for name in files:
+        frame = cv2.imread(os.path.join(frames_dir, name))
+        if frame is None:
+            continue
+        ref_dets = reference.detect_faces_yolo(frame)
+        onnx_dets = candidate.detect_faces_yolo(frame)
+        if len(ref_dets) != len(onnx_dets):
+            box_failures += 1
+            print(f"[Parity] {name}: {len(ref_dets)} faces (default) vs {len(onnx_dets)} (onnx)")
+        for ref in ref_dets:
+            best = max(onnx_dets, key=lambda d: _box_iou(ref, d), default=None)
+            iou = _box_iou(ref, best) if best else 0.0
+            min_iou = min(min_iou, iou)
+            if iou < PARITY_MIN_BOX_IOU or abs(ref[4] - best[4]) > PARITY_MAX_CONF_DIFF:
+                box_failures += 1
+                print(f"[Parity] {name}: box {ref[:4]} IoU {iou:.3f}, conf {ref[4]:.3f} vs {best[4] if best else 0:.3f}")
+
+        crops = [c for c in (reference.preprocess_face(frame, d[:4]) for d in ref_dets) if c is not None]
+        for ref_emb, onnx_emb in zip(reference.generate_embeddings(crops), candidate.generate_embeddings(crops)):
+            if ref_emb is None or onnx_emb is None:
+                continue
+            faces += 1
+            cosine = float(np.dot(ref_emb, onnx_emb))
+            min_cos = min(min_cos, cosine)
+            if cosine < PARITY_MIN_EMBEDDING_COSINE:
+                emb_failures += 1
+                print(f"[Parity] {name}: embedding cosine {cosine:.5f}")
+
+    print(f"[Parity] {len(files)} frames, {faces} faces: min box IoU {min_iou:.4f}, min embedding cosine {min_cos:.5f}")
+    print(f"[Parity] {box_failures} detection mismatches, {emb_failures} embedding mismatches")
+    return box_failures == 0 and emb_failures == 0
+
+
+def check_batch_parity(frames_dir: str, max_frames: int = 50) -> bool:
+    """
+    Compare the batched ArcFace path (generate_embeddings) against DeepFace.represent
+    (_represent, which built existing galleries) on the same real crops, both the aligned
+    crops and the plain box crops: cosine >= PARITY_MIN_EMBEDDING_COSINE for every face.
+    """
+    from ai_module_yolo import FaceRecognizer
+
+    recognizer = FaceRecognizer(backend="default")
+    recognizer.embedding_cache = None
+    if not recognizer._embedder_available() or isinstance(recognizer._arcface_model, OnnxArcFace):
+        print(f"[Parity] DeepFace ArcFace not available")
+        return False
+
+    files = sorted(f for f in os.listdir(frames_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))[:max_frames]
+    failures, faces, min_cos = 0, 0, 1.0
+    for name in files:
+        frame = cv2.imread(os.path.join(frames_dir, name))
+        if frame is None:
+            continue
+        detections = recognizer.detect_faces_yolo(frame)
+        crops = recognizer.face_crops(frame, detections) + [recognizer.preprocess_face(frame, d[:4]) for d in detections]
+        crops = [c for c in crops if c is not None]
+        for crop, batched in zip(crops, recognizer.generate_embeddings(crops)):
+            reference = recognizer._represent(crop)
+            if batched is None or reference is None:
+                continue
+            faces += 1
+            cosine = float(np.dot(batched, reference))
+            min_cos = min(min_cos, cosine)
+            if cosine < PARITY_MIN_EMBEDDING_COSINE:
+                failures += 1
+                print(f"[Parity] {name}: {crop.shape[1]}x{crop.shape[0]} crop, batched vs represent cosine {cosine:.5f}")
+
+    print(f"[Parity] {len(files)} frames, {faces} crops: min batched vs represent cosine {min_cos:.5f}")
+    print(f"[Parity] {failures} embedding mismatches")
+    return faces > 0 and failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX export and parity check for the AI models")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export YOLOv8-face and ArcFace to ONNX")
+    export.add_argument("--yolo-weights", default="yolov8n-face.pt")
+    export.add_argument("--skip-yolo", action="store_true")
+    export.add_argument("--skip-arcface", action="store_true")
+    parity = commands.add_parser("parity", help="Compare ONNX and default backends on a frames directory")
+    parity.add_argument("frames_dir")
+    parity.add_argument("--max-frames", type=int, default=50)
+    batch_parity = commands.add_parser("batch-parity",
+                                       help="Compare batched ArcFace embeddings with DeepFace.represent on a frames directory")
+    batch_parity.add_argument("frames_dir")
+    batch_parity.add_argument("--max-frames", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        if not args.skip_yolo:
+            print(f"[Export] YOLOv8-face -> {export_yolo(args.yolo_weights)}")
+        if not args.skip_arcface:
+            print(f"[Export] ArcFace -> {export_arcface()}")
+    elif args.command == "batch-parity":
+        sys.exit(0 if check_batch_parity(args.frames_dir, args.max_frames) else 1)
+    else:
+        sys.exit(0 if check_parity(args.frames_dir, args.max_frames) else 1)
@@ -0,0 +1,522 @@
+"""
+Multi-process inference pool for the AI server
+Runs N FaceRecognizer replicas, each in its own process with its own bounded task queue.
+  - Camera affinity: every frame of a camera goes to the same worker (crc32(camera_id) % N),
+    so its face tracks and motion gate see consecutive frames. Frames of several cameras
+    are split per worker (recognize_frames). Tasks without a camera go to any worker
+  - Backpressure: submit() raises PoolBusy when the queue is full (server answers 503)
+  - Frames are sent as encoded bytes and decoded inside the workers
+  - Live frames that arrive together are micro-batched inside each worker (batch_window_ms)
+  - The main process creates (or migrates) the embedding store before spawning the workers,
+    which only load and sync it
+  - Training runs on one worker at a time; afterwards every worker syncs its gallery
+    from the embedding store's append log
+  - Online gallery refresh samples collected by the workers are applied the same way:
+    on one worker at a time (the store's single writer), then every worker syncs. The
+    per-student refresh interval is enforced here, across all workers
+  - Workers send their stage timings back with each result; the main process replays them
+    into its metrics registry so /metrics covers every worker
+  - Cancelling a task's future (e.g. the client disconnected) drops the task if no worker
+    has started it yet
+  - The result thread watches the worker processes: when one dies (OOM, segfault) its queued
+    and running tasks fail at once, it stops counting as ready, and a replacement is started
+"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from batch_scheduler import BatchStats, collect_batch
+from face_tracker import TrackerRegistry
+from gallery_refresh import RefreshLimiter
+
+WORKER_POLL_INTERVAL = 0.5  # Seconds a worker waits for a task before checking control messages
+CLIP_FRAME_STRIDE = 3  # Default: vote on every 3rd frame of an uploaded clip
+REFRESH_TIMEOUT = 60.0  # Seconds to wait for a worker to apply gallery refresh samples
+CANCELLED_IDS_LIMIT = 1024  # Cancelled task IDs remembered per worker
+WORKER_CHECK_INTERVAL = 1.0  # Seconds between liveness checks of the worker processes
+WORKER_RESTART_DELAY = 5.0  # Minimum seconds between starts of one worker (no tight crash loops)
+# Per-replica thread caps; read by the math libraries when they load, so they must be in place at spawn
+WORKER_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                      "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS")
+
+_environ_lock = threading.Lock()
+
+
+class PoolBusy(Exception):
+    """Raised when the task queue is full"""
+
+
+class FrameDecodeError(Exception):
+    """Raised when an uploaded frame cannot be decoded"""
+
+
+def decode_frame(data: bytes):
+    """Decode an encoded image (JPEG/PNG bytes) into a BGR frame, or None"""
+    import cv2
+    import numpy as np
+    with metrics.stage("decode"):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def iter_batch_frames(frames_data: List[bytes], clip: Optional[bytes] = None, max_frames: int = 0,
+                      stride: int = CLIP_FRAME_STRIDE) -> Iterator:
+    """
+    Lazily decode the frames of a /recognize-batch request (encoded images, or every stride-th
+    frame of a video clip), so frames after an early exit are never decoded.
+    Undecodable images yield None.
+    """
+    if not clip:
+        for data in frames_data[:max_frames or None]:
+            yield decode_frame(data)
+        return
+
+    import cv2
+    # cv2.VideoCapture only reads from files
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as clip_file:
+        clip_file.write(clip)
+    capture = cv2.VideoCapture(clip_file.name)
+    try:
+        yielded = 0
+        for index in itertools.count():
+            if max_frames and yielded >= max_frames:
+                break
+            with metrics.stage("decode"):
+                ok = capture.grab()  # Skipped frames are never converted to BGR
+                frame = capture.retrieve()[1] if ok and index % max(1, stride) == 0 else None
+            if not ok:
+                break
+            if frame is not None:
+                yielded += 1
+                yield frame
+    finally:
+        capture.release()
+        os.unlink(clip_file.name)
+
+
+def run_task(recognizer, op: str, payload: Any, trackers=None) -> Any:
+    """Execute one task against a FaceRecognizer (shared by workers and in-process mode)"""
+    if op == "recognize":
+        frame = decode_frame(payload)
+        if frame is None:
+            raise FrameDecodeError("Failed to decode image")
+        return recognizer.recognize_face(frame)
+    if op == "recognize_live":
+        return run_live_batch(recognizer, [payload], trackers)[0]
+    if op == "recognize_frames":
+        # Already-decoded frames (camera ingestion pipeline)
+        frames, camera_ids = payload
+        return recognizer.recognize_all_faces_batch(frames, _trackers_for(trackers, camera_ids), camera_ids)
+    if op == "recognize_batch":
+        frames_data, clip, max_frames, stride, min_match = payload
+        frames = iter_batch_frames(frames_data, clip, max_frames, stride)
+        if min_match is None:
+            return recognizer.recognize_frames_voting(frames)
+        return recognizer.recognize_frames_voting(frames, min_match)
+    if op == "train":
+        frames_dir, student_id = payload
+        recognizer.sync_embeddings()  # Start from the latest gallery before appending to it
+        return recognizer.train_from_frames(frames_dir, student_id)
+    if op == "refresh":
+        recognizer.sync_embeddings()
+        return recognizer.apply_gallery_refresh(payload)
+    raise ValueError(f"Unknown task: {op}")
+
+
+def _trackers_for(trackers, camera_ids: List[Optional[str]]):
+    if trackers is None:
+        return None
+    return [trackers.get(camera_id) for camera_id in camera_ids]
+
+
+def run_live_batch(recognizer, payloads: List[Tuple[bytes, Optional[str]]], trackers=None) -> List[Any]:
+    """
+    Recognize several encoded live frames with one batched detection/embedding pass.
+    Args:
+        payloads: (encoded frame, camera id or None) per request
+        trackers: Optional TrackerRegistry for per-camera face tracking
+    Returns per-frame result lists, or a FrameDecodeError instance for undecodable frames.
+    """
+    frames = [decode_frame(data) for data, _ in payloads]
+    valid = [i for i, frame in enumerate(frames) if frame is not None]
+    outputs: List[Any] = [FrameDecodeError("Failed to decode image")] * len(frames)
+    if valid:
+        camera_ids = [payloads[i][1] for i in valid]
+        batch_results = recognizer.recognize_all_faces_batch(
+            [frames[i] for i in valid],
+            _trackers_for(trackers, camera_ids),
+            camera_ids
+        )
+        for i, results in zip(valid, batch_results):
+            outputs[i] = results
+    return outputs
+
+
+@contextmanager
+def _worker_environment(threads: int):
+    """
+    Set the thread caps in os.environ while a worker process starts. A spawned child inherits
+    them before it imports anything, whereas setting them in the child comes after numpy (and
+    the BLAS it loads) is already imported with the module.
+    """
+    values = {var: str(threads) for var in WORKER_THREAD_VARS}
+    values["AI_ONNX_THREADS"] = os.environ.get("AI_ONNX_THREADS", str(threads))
+    with _environ_lock:
+        saved = {var: os.environ.get(var) for var in values}
+        os.environ.update(values)
+        try:
+            yield
+        finally:
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+
+def _worker_main(worker_id: int, num_workers: int, batch_window_ms: float, max_batch_size: int,
+                 tasks, results, control, recognizer_factory: Optional[Callable] = None):
+    """
+    Worker process entry point: load one model replica and serve tasks until told to stop.
+    Its thread caps come from the environment set up by _worker_environment().
+    """
+    metrics.configure_logging()
+
+    if recognizer_factory is None:
+        from ai_module_yolo import FaceRecognizer
+        recognizer = FaceRecognizer(create_store=False)  # The main process created the store before spawning
+    else:
+        recognizer = recognizer_factory()
+    if recognizer.refresh is not None:
+        recognizer.refresh.apply_locally = False  # Samples go to the main process, which picks one writer
+    # A camera's tracks all live on its worker; interleaved IDs keep them unique pool-wide
+    trackers = TrackerRegistry(id_offset=worker_id, id_stride=num_workers)
+    results.put(("ready", worker_id, None, None, None))
+    cancelled: Dict[int, None] = {}  # Insertion-ordered set of task IDs to skip
+
+    def reply(task_id, run, wait_s, shared=None, replay_shared=False):
+        """
+        Run one task and send its result with its timing breakdown.
+        wait_s: Time the task spent in the pool queue
+        shared: Observations of a batched pass this task was part of (replayed once per batch)
+        """
+        with metrics.collect() as own:
+            metrics.record_wait("pool", wait_s)
+            try:
+                value = run()
+                if isinstance(value, Exception):
+                    raise value
+                ok = True
+            except Exception as e:
+                if not isinstance(e, FrameDecodeError):
+                    traceback.print_exc()
+                ok, value = False, (type(e).__name__, str(e))
+        timings = metrics.RequestTimings((shared.events if shared else []) + own.events)
+        replay = timings if replay_shared or not shared else own
+        results.put((task_id, ok, value, timings, replay))
+
+    while True:
+        try:
+            while True:
+                message = control.get_nowait()
+                if message == "stop":
+                    return
+                if message == "sync":
+                    recognizer.sync_embeddings()
+                elif isinstance(message, tuple) and message[0] == "cancel":
+                    cancelled[message[1]] = None
+                    if len(cancelled) > CANCELLED_IDS_LIMIT:
+                        cancelled.pop(next(iter(cancelled)))
+        except queue.Empty:
+            pass
+
+        try:
+            task = tasks.get(timeout=WORKER_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        if task is None:
+            return
+
+        batch = [task]
+        if task[1] == "recognize_live" and max_batch_size > 1 and batch_window_ms > 0:
+            batch = collect_batch(tasks, task, batch_window_ms / 1000.0, max_batch_size)
+        if cancelled:
+            batch = [t for t in batch if t is None or t[0] not in cancelled]
+
+        live = [t for t in batch if t is not None and t[1] == "recognize_live"]
+        if live and max_batch_size > 1 and batch_window_ms > 0:
+            started = time.time()
+            with metrics.collect() as shared:
+                try:
+                    outputs = run_live_batch(recognizer, [t[2] for t in live], trackers)
+                except Exception as e:
+                    outputs = [e] * len(live)
+            process_ms = (time.time() - started) * 1000
+            for n, ((task_id, _, _, queued_at), output) in enumerate(zip(live, outputs)):
+                reply(task_id, lambda: output, started - queued_at, shared, replay_shared=(n == 0))
+            results.put(("batch", worker_id, (len(live), [(started - t[3]) * 1000 for t in live], process_ms), None, None))
+        else:
+            live = []
+
+        for t in batch:
+            if t is None:
+                return
+            if live and t[1] == "recognize_live":
+                continue
+            task_id, op, payload, queued_at = t
+            reply(task_id, lambda: run_task(recognizer, op, payload, trackers), time.time() - queued_at)
+
+        if recognizer.refresh is not None and recognizer.refresh.enabled:
+            proposals = recognizer.refresh.drain()
+            if proposals:
+                results.put(("refresh", worker_id, proposals, None, None))
+
+
+def camera_worker(camera_id: str, num_workers: int) -> int:
+    """Worker that serves every frame of a camera (stable across processes and restarts)"""
+    return zlib.crc32(camera_id.encode("utf-8")) % num_workers
+
+
+class InferencePool:
+    """Pool of FaceRecognizer worker processes, each fed through its own bounded queue"""
+
+    def __init__(self, num_workers: int, queue_size: int = 32, threads_per_worker: Optional[int] = None,
+                 batch_window_ms: float = 0.0, max_batch_size: int = 1,
+                 recognizer_factory: Optional[Callable] = None):
+        """
+        Args:
+            queue_size: Pending tasks before PoolBusy, split evenly across the workers' queues
+            recognizer_factory: Picklable callable building each worker's recognizer
+                (default: FaceRecognizer backed by the embedding store)
+        """
+        self._ctx = multiprocessing.get_context("spawn")  # ML runtimes are not fork-safe
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+        self.num_workers = num_workers
+        self._worker_queue_size = max(1, -(-queue_size // num_workers))
+        self._worker_args = (num_workers, batch_window_ms, max_batch_size)
+        self._threads_per_worker = threads_per_worker
+        self._recognizer_factory = recognizer_factory
+        self._queues: List[Any] = [None] * num_workers
+        self._controls: List[Any] = [None] * num_workers
+        self._workers: List[Any] = [None] * num_workers
+        self._ready = [False] * num_workers
+        self._started_at = [0.0] * num_workers
+        self._down = [False] * num_workers  # Died; tasks failed, waiting for WORKER_RESTART_DELAY
+        self._closing = False
+        self._results = self._ctx.Queue()
+        self._pending: Dict[int, Tuple[Future, int]] = {}  # task ID -> (future, worker)
+        self._pending_lock = threading.Lock()
+        self._train_lock = threading.Lock()  # Only one writer to the embedding store
+        self._refresh_limiter = RefreshLimiter()
+        self._ids = itertools.count()
+        self._next_worker = itertools.count()  # Round robin for tasks without a camera
+        self.batch_stats = BatchStats()
+
+        if recognizer_factory is None:
+            # Create or migrate the embedding store once, here, so the workers only ever load and sync it
+            from ai_module_yolo import prepare_embedding_store
+            prepare_embedding_store()
+
+        for i in range(num_workers):
+            self._queues[i] = self._ctx.Queue(maxsize=self._worker_queue_size)
+            self._controls[i] = self._ctx.Queue()
+            self._start_worker(i)
+
+        self._dispatcher = threading.Thread(target=self._dispatch_results, name="ai-pool-results", daemon=True)
+        self._dispatcher.start()
+        print(f"[AI Pool] Started {num_workers} workers ({threads_per_worker} threads each, queue size {queue_size})")
+
+    def _start_worker(self, i: int):
+        worker = self._ctx.Process(
+            target=_worker_main, name=f"ai-worker-{i}", daemon=True,
+            args=(i, *self._worker_args, self._queues[i], self._results, self._controls[i], self._recognizer_factory))
+        # Keep each replica's math libraries from oversubscribing the cores
+        with _worker_environment(self._threads_per_worker):
+            worker.start()
+        self._workers[i] = worker
+        self._started_at[i] = time.time()
+        self._down[i] = False
+
+    @property
+    def ready_workers(self) -> int:
+        """Workers alive with their models loaded"""
+        return sum(self._ready)
+
+    def alive_workers(self) -> int:
+        return sum(1 for worker in self._workers if worker.is_alive())
+
+    def _check_workers(self):
+        """Fail the tasks of workers that died and start replacements"""
+        for i, worker in enumerate(self._workers):
+            if self._closing or worker.is_alive():
+                continue
+            if not self._down[i]:
+                self._down[i] = True
+                self._ready[i] = False
+                with self._pending_lock:
+                    # The dead process may hold its queues' locks: give the replacement fresh ones
+                    self._queues[i] = self._ctx.Queue(maxsize=self._worker_queue_size)
+                    self._controls[i] = self._ctx.Queue()
+                    lost = [task_id for task_id, (_, owner) in self._pending.items() if owner == i]
+                    futures = [self._pending.pop(task_id)[0] for task_id in lost]
+                print(f"[AI Pool] ⚠ Worker {i} died (exit code {worker.exitcode}); "
+                      f"failed {len(futures)} tasks, {self.ready_workers}/{self.num_workers} workers ready")
+                for future in futures:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(RuntimeError(f"Inference worker {i} died"))
+            if time.time() - self._started_at[i] >= WORKER_RESTART_DELAY:
+                print(f"[AI Pool] Restarting worker {i}")
+                self._start_worker(i)
+
+    def _dispatch_results(self):
+        checked = time.time()
+        while True:
+            if time.time() - checked >= WORKER_CHECK_INTERVAL:
+                self._check_workers()
+                checked = time.time()
+            try:
+                task_id, ok, value, timings, replay = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            if task_id == "ready":
+                self._ready[ok] = True
+                print(f"[AI Pool] Worker {ok} ready ({self.ready_workers}/{self.num_workers})")
+                continue
+            if task_id == "batch":
+                self.batch_stats.record(*value)
+                continue
+            if task_id == "refresh":
+                # Not on this thread: applying waits for a result that this thread delivers
+                threading.Thread(target=self._apply_refresh, args=(value,), name="ai-pool-refresh",
+                                 daemon=True).start()
+                continue
+            if replay is not None:
+                metrics.replay(replay)
+            with self._pending_lock:
+                future = self._pending.pop(task_id, (None, None))[0]
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            future.timings = timings
+            if ok:
+                future.set_result(value)
+            else:
+                name, message = value
+                error_type = FrameDecodeError if name == "FrameDecodeError" else RuntimeError
+                future.set_exception(error_type(message))
+
+    def _route(self, op: str, payload: Any) -> Optional[int]:
+        """Worker that must run a task (the one owning its camera), or None for any worker"""
+        if op == "recognize_live":
+            camera_ids = [payload[1]]
+        elif op == "recognize_frames":
+            camera_ids = payload[1]
+        else:
+            return None
+        workers = {camera_worker(c, self.num_workers) for c in camera_ids if c}
+        if len(workers) > 1:
+            raise ValueError("Frames of cameras served by different workers; use recognize_frames()")
+        return workers.pop() if workers else None
+
+    def submit(self, op: str, payload: Any) -> Future:
+        """
+        Queue a task without blocking: on its camera's worker, or the next worker with room.
+        Raises PoolBusy if the queue is full.
+        """
+        worker = self._route(op, payload)
+        if worker is None:
+            start = next(self._next_worker)
+            candidates = [(start + n) % self.num_workers for n in range(self.num_workers)]
+        else:
+            candidates = [worker]
+        task_id = next(self._ids)
+        future = Future()
+        with self._pending_lock:  # Never put into a queue that a dead worker's replacement dropped
+            for worker in candidates:
+                try:
+                    self._queues[worker].put_nowait((task_id, op, payload, time.time()))
+                    break
+                except queue.Full:
+                    continue
+            else:
+                raise PoolBusy("Inference queue is full")
+            self._pending[task_id] = (future, worker)
+        future.add_done_callback(lambda f: f.cancelled() and self._cancel(task_id))
+        return future
+
+    def _cancel(self, task_id: int):
+        """Forget a cancelled task and tell the workers to skip it if it is still queued"""
+        with self._pending_lock:
+            self._pending.pop(task_id, None)
+        self.broadcast(("cancel", task_id))
+
+    def call(self, op: str, payload: Any, timeout: Optional[float] = None) -> Any:
+        """Submit a task and wait for its result"""
+        return self.submit(op, payload).result(timeout=timeout)
+
+    def recognize_frames(self, frames: List, camera_ids: List[Optional[str]],
+                         timeout: Optional[float] = None) -> List[List[Dict]]:
+        """Recognize decoded frames of several cameras: one batched task per worker that owns some of them"""
+        groups: Dict[Optional[int], List[int]] = {}
+        for n, camera_id in enumerate(camera_ids):
+            groups.setdefault(camera_worker(camera_id, self.num_workers) if camera_id else None, []).append(n)
+        futures = []
+        try:
+            for indices in groups.values():
+                payload = ([frames[n] for n in indices], [camera_ids[n] for n in indices])
+                futures.append((indices, self.submit("recognize_frames", payload)))
+        except PoolBusy:
+            for _, future in futures:
+                future.cancel()
+            raise
+        results: List[Any] = [None] * len(frames)
+        for indices, future in futures:
+            for n, frame_results in zip(indices, future.result(timeout=timeout)):
+                results[n] = frame_results
+        return results
+
+    def train(self, frames_dir: str, student_id: str, timeout: Optional[float] = None) -> bool:
+        """Train on one worker (serialized), then propagate the gallery update to every worker"""
+        with self._train_lock:
+            success = self.call("train", (frames_dir, student_id), timeout=timeout)
+        if success:
+            self.broadcast("sync")
+        return success
+
+    def _apply_refresh(self, proposals: Dict):
+        """Apply a worker's gallery refresh samples on one worker (serialized with training), then sync all"""
+        proposals = self._refresh_limiter.admit(proposals)
+        if not proposals:
+            return
+        try:
+            with self._train_lock:
+                updated = self.call("refresh", proposals, timeout=REFRESH_TIMEOUT)
+        except PoolBusy:
+            print("[AI Pool] Dropped gallery refresh samples: inference queue is full")
+            return
+        except Exception as e:
+            print(f"[AI Pool] Gallery refresh failed: {e}")
+            return
+        if updated:
+            self.broadcast("sync")
+
+    def broadcast(self, message: Any):
+        for control in self._controls:
+            control.put(message)
+
+    def shutdown(self):
+        self._closing = True
+        self.broadcast("stop")
+        for worker in self._workers:
+            worker.join(timeout=5)
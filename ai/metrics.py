@@ -0,0 +1,257 @@
+"""
+Latency instrumentation for the AI server
+  - Per-stage histograms (decode, detect, preprocess, embed, match, ...), queue/lock wait
+    times, faces per frame, gallery size, motion-gated frames, embedding cache hits, face
+    crops skipped for quality and online gallery refresh outcomes, rendered in Prometheus text format for /metrics
+  - Optional per-request breakdowns: metrics.collect() gathers every observation made by
+    the current thread so a request can return its own timing
+  - Worker processes ship their observations back as RequestTimings and the main process
+    replays them, so /metrics covers the whole pool
+  - Level-controlled logging (AI_LOG_LEVEL) for the hot path instead of unconditional prints
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LOG_LEVEL = os.environ.get("AI_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "[%(name)s] %(levelname)s %(message)s"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FACE_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 40, 60, 100)
+
+
+def configure_logging(level: Optional[str] = None):
+    """Set up the "[AI] LEVEL message" log format (safe to call more than once)"""
+    logging.basicConfig(level=(level or LOG_LEVEL), format=LOG_FORMAT)
+    logging.getLogger().setLevel(level or LOG_LEVEL)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with optional labels"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {bucket_count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Last-value gauge with optional labels"""
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+STAGE_SECONDS = Histogram("ai_stage_seconds", "Time spent in each processing stage", labelnames=("stage",))
+WAIT_SECONDS = Histogram("ai_queue_wait_seconds", "Time spent waiting for a model (lock, batch window, worker queue)",
+                         labelnames=("queue",))
+FACES_PER_FRAME = Histogram("ai_faces_per_frame", "Faces detected per frame", buckets=FACE_BUCKETS)
+GALLERY_SIZE = Gauge("ai_gallery_size", "Enrolled students in the gallery searched last")
+FRAMES_GATED = Counter("ai_frames_gated_total", "Camera frames answered from the previous result (skipped) "
+                       "or fully processed by the motion gate", labelnames=("result",))
+EMBEDDING_CACHE = Counter("ai_embedding_cache_total", "Embedding cache lookups by result (hit or miss)",
+                          labelnames=("result",))
+FACE_QUALITY_SKIPPED = Counter("ai_face_quality_skipped_total", "Face crops not embedded because they failed a "
+                               "quality floor, by issue (size, blur, brightness, pose)", labelnames=("issue",))
+GALLERY_REFRESH = Counter("ai_gallery_refresh_total", "Online gallery refresh: live faces sampled, prototypes "
+                          "updated, and updates rejected by a quality gate", labelnames=("result",))
+REQUESTS = Counter("ai_requests_total", "HTTP requests handled", labelnames=("endpoint", "status"))
+REQUEST_SECONDS = Histogram("ai_request_seconds", "HTTP request latency", labelnames=("endpoint",))
+METRICS = [STAGE_SECONDS, WAIT_SECONDS, FACES_PER_FRAME, GALLERY_SIZE, FRAMES_GATED, EMBEDDING_CACHE, FACE_QUALITY_SKIPPED, GALLERY_REFRESH,
+           REQUESTS, REQUEST_SECONDS]
+
+
+class RequestTimings:
+    """Observations made while handling one request (picklable, so workers can send them back)"""
+
+    def __init__(self, events: Optional[List[Tuple[str, str, float]]] = None):
+        self.events: List[Tuple[str, str, float]] = events if events is not None else []  # (kind, label, value)
+
+    def add(self, kind: str, label: str, value: float):
+        self.events.append((kind, label, value))
+
+    def copy(self) -> "RequestTimings":
+        return RequestTimings(list(self.events))
+
+    def to_dict(self) -> Dict:
+        """Per-request breakdown: {"<stage>_ms": ..., "<queue>_wait_ms": ..., "faces": ..., "gallery_size": ..., "gate": ...}"""
+        breakdown: Dict = {}
+        for kind, label, value in self.events:
+            if kind == "stage":
+                key = f"{label}_ms"
+            elif kind == "wait":
+                key = f"{label}_wait_ms"
+            elif kind == "faces":
+                breakdown["faces"] = breakdown.get("faces", 0) + int(value)
+                continue
+            elif kind == "gate":
+                breakdown["gate"] = label
+                continue
+            elif kind == "cache":
+                key = "embedding_cache_hits" if label == "hit" else "embedding_cache_misses"
+                breakdown[key] = breakdown.get(key, 0) + int(value)
+                continue
+            elif kind == "quality":
+                breakdown["quality_skipped"] = breakdown.get("quality_skipped", 0) + int(value)
+                continue
+            elif kind == "refresh":
+                continue  # Gallery-wide, not part of a request's breakdown
+            else:
+                breakdown["gallery_size"] = int(value)
+                continue
+            breakdown[key] = breakdown.get(key, 0.0) + value * 1000
+        return {k: round(v, 3) if isinstance(v, float) else v for k, v in breakdown.items()}
+
+
+_local = threading.local()
+
+
+def _observe(kind: str, label: str, value: float):
+    if kind == "stage":
+        STAGE_SECONDS.observe(value, label)
+    elif kind == "wait":
+        WAIT_SECONDS.observe(value, label)
+    elif kind == "faces":
+        FACES_PER_FRAME.observe(value)
+    elif kind == "gallery":
+        GALLERY_SIZE.set(value)
+    elif kind == "gate":
+        FRAMES_GATED.inc(label, amount=value)
+    elif kind == "cache":
+        EMBEDDING_CACHE.inc(label, amount=value)
+    elif kind == "quality":
+        FACE_QUALITY_SKIPPED.inc(label, amount=value)
+    elif kind == "refresh":
+        GALLERY_REFRESH.inc(label, amount=value)
+
+
+def observe(kind: str, label: str, value: float):
+    """Record one observation in the registry and in the current thread's collector, if any"""
+    _observe(kind, label, value)
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings.add(kind, label, value)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as one processing stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage", name, time.perf_counter() - start)
+
+
+def record_wait(queue: str, seconds: float):
+    observe("wait", queue, max(0.0, seconds))
+
+
+def record_faces(count: int):
+    observe("faces", "", count)
+
+
+def set_gallery_size(size: int):
+    observe("gallery", "", size)
+
+
+@contextmanager
+def collect() -> Iterator[RequestTimings]:
+    """Gather the current thread's observations into a RequestTimings"""
+    previous = getattr(_local, "timings", None)
+    timings = RequestTimings()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def replay(timings: RequestTimings):
+    """Apply observations recorded in another process to this process's registry"""
+    for kind, label, value in timings.events:
+        _observe(kind, label, value)
+
+
+def record_request(endpoint: str, status: int, seconds: float):
+    REQUESTS.inc(endpoint, str(status))
+    REQUEST_SECONDS.observe(seconds, endpoint)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
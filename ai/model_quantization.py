@@ -0,0 +1,242 @@
+"""
+INT8 quantization of the ONNX models, with an accuracy/throughput report against FP32
+Static QDQ quantization (onnxruntime.quantization) calibrated on local enrollment frames:
+the detector sees letterboxed frames, ArcFace sees the face crops the detector finds in them.
+Select the quantized models with AI_INFERENCE_BACKEND=onnx AI_ONNX_PRECISION=int8.
+
+Commands (from the ai/ directory, after `python inference_backends.py export`):
+    python model_quantization.py quantize <frames dir>          # writes models/*.int8.onnx
+    python model_quantization.py evaluate <students root dir>   # FP32 vs INT8 report
+The evaluate directory holds one folder of frames per student (folder name = student ID),
+like bulk enrollment; each folder is split into enrollment and probe frames.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from inference_backends import ONNX_YOLO_PATH, ONNX_ARCFACE_PATH, OnnxFaceDetector, onnx_model_path
+
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+CALIBRATION_MAX_FRAMES = 200  # Calibration cost grows linearly; a few hundred frames is plenty
+EVAL_ENROLL_FRACTION = 0.5  # Share of each student's frames used for enrollment in evaluate
+MAX_ACCURACY_DROP = 0.01  # INT8 is recommended only if accuracy drops by at most this much
+MIN_EMBEDDING_COSINE = 0.98  # ... and INT8 embeddings stay this close to FP32 on average
+# Only the compute-heavy ops run in INT8. Everything after them stays float, in particular
+# YOLOv8's output Concat: boxes (0-640 px) and scores (0-1) share that tensor, and one uint8
+# scale for both rounds every score to 0
+QUANTIZED_OP_TYPES = ["Conv", "MatMul", "Gemm"]
+
+
+def list_frames(directory: str, max_frames: Optional[int] = None) -> List[str]:
+    """Image files under directory (recursively), evenly subsampled to max_frames"""
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(directory)
+        for name in files if name.lower().endswith(FRAME_EXTENSIONS)
+    )
+    if max_frames and len(paths) > max_frames:
+        paths = [paths[i] for i in np.linspace(0, len(paths) - 1, max_frames).astype(int)]
+    return paths
+
+
+class _ArrayReader:
+    """CalibrationDataReader over a list of input arrays"""
+
+    def __init__(self, input_name: str, samples: List[np.ndarray]):
+        self.input_name = input_name
+        self._samples = iter(samples)
+
+    def get_next(self):
+        sample = next(self._samples, None)
+        return None if sample is None else {self.input_name: sample[None]}
+
+    def rewind(self):
+        pass
+
+
+def _input_name(path: str) -> str:
+    import onnx
+    return onnx.load(path, load_external_data=False).graph.input[0].name
+
+
+def quantize_model(fp32_path: str, samples: List[np.ndarray], output_path: str) -> str:
+    """Static per-channel INT8 (QDQ) quantization calibrated on samples"""
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = output_path + ".prep.onnx"
+    # Symbolic shape inference (meant for transformers) gives up on the dynamic-batch YOLOv8
+    # export and leaves temp files behind; ONNX shape inference covers these CNNs
+    quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)
+    try:
+        quantize_static(
+            prepared, output_path, _ArrayReader(_input_name(prepared), samples),
+            quant_format=QuantFormat.QDQ,
+            op_types_to_quantize=QUANTIZED_OP_TYPES,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+    return output_path
+
+
+def quantize(frames_dir: str, max_frames: int = CALIBRATION_MAX_FRAMES):
+    """Quantize both ONNX models, calibrating on frames from frames_dir"""
+    from ai_module_yolo import FaceRecognizer, TRAIN_MIN_FACE_CONFIDENCE
+
+    frames = [f for f in (cv2.imread(p) for p in list_frames(frames_dir, max_frames)) if f is not None]
+    if not frames:
+        raise ValueError(f"No frames found in {frames_dir}")
+    print(f"[Quantize] Calibrating on {len(frames)} frames from {frames_dir}")
+
+    detector = OnnxFaceDetector(ONNX_YOLO_PATH)
+    yolo_samples = []
+    for frame in frames:
+        img = detector._letterbox(frame)[0]
+        yolo_samples.append(img[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0)
+    output = quantize_model(ONNX_YOLO_PATH, yolo_samples, onnx_model_path(ONNX_YOLO_PATH, "int8"))
+    print(f"[Quantize] YOLOv8-face -> {output}")
+
+    # ArcFace calibration data: the crops the FP32 pipeline would embed
+    recognizer = FaceRecognizer(backend="onnx", precision="fp32", create_store=False)
+    crops = []
+    for frame, detections in zip(frames, recognizer.detect_faces_yolo_batch(frames, min_conf=TRAIN_MIN_FACE_CONFIDENCE)):
+        for crop in recognizer.face_crops(frame, detections):
+            if crop is not None:
+                crops.append(recognizer._arcface_input(crop).astype(np.float32))
+    if not crops:
+        raise ValueError("No faces found in the calibration frames")
+    output = quantize_model(ONNX_ARCFACE_PATH, crops[:max_frames], onnx_model_path(ONNX_ARCFACE_PATH, "int8"))
+    print(f"[Quantize] ArcFace ({len(crops[:max_frames])} crops) -> {output}")
+
+
+def _load_split(root_dir: str) -> Dict[str, Dict[str, List[np.ndarray]]]:
+    """{student_id: {"enroll": frames, "probe": frames}}"""
+    split = {}
+    for student_id in sorted(os.listdir(root_dir)):
+        folder = os.path.join(root_dir, student_id)
+        if not os.path.isdir(folder):
+            continue
+        frames = [f for f in (cv2.imread(p) for p in list_frames(folder)) if f is not None]
+        if len(frames) < 2:
+            continue
+        cut = max(1, int(len(frames) * EVAL_ENROLL_FRACTION))
+        split[student_id] = {"enroll": frames[:cut], "probe": frames[cut:]}
+    return split
+
+
+def evaluate_precision(precision: str, split: Dict) -> Dict:
+    """Enroll every student in an in-memory gallery, then recognize the probe frames"""
+    from ai_module_yolo import FaceRecognizer, RECOGNITION_THRESHOLD
+    from embedding_gallery import EmbeddingGallery
+    from prototypes import select_prototypes
+
+    recognizer = FaceRecognizer(backend="onnx", precision=precision, create_store=False)
+    gallery = EmbeddingGallery()
+    for student_id, frames in split.items():
+        embeddings = [e for e in recognizer._embed_training_frames(frames["enroll"]) if e is not None]
+        if embeddings:
+            gallery.set_prototypes(student_id, select_prototypes(embeddings))
+    recognizer.gallery = gallery
+
+    correct = false_accepts = rejects = total = 0
+    probe_embeddings = []
+    start = time.perf_counter()
+    for student_id, frames in split.items():
+        for frame in frames["probe"]:
+            predicted = recognizer.recognize_face(frame)
+            total += 1
+            if predicted is None:
+                rejects += 1
+            elif predicted == student_id:
+                correct += 1
+            else:
+                false_accepts += 1
+    elapsed = time.perf_counter() - start
+    for frames in split.values():
+        probe_embeddings.extend(recognizer._embed_training_frames(frames["probe"]))
+
+    return {
+        "precision": precision,
+        "models": dict(recognizer.model_status),
+        "students_enrolled": gallery.student_count(),
+        "probe_frames": total,
+        "threshold": RECOGNITION_THRESHOLD,
+        "accuracy": correct / total if total else 0.0,
+        "false_accept_rate": false_accepts / total if total else 0.0,
+        "reject_rate": rejects / total if total else 0.0,
+        "frames_per_second": total / elapsed if elapsed > 0 else 0.0,
+        "ms_per_frame": elapsed * 1000 / total if total else 0.0,
+        "_embeddings": probe_embeddings,
+    }
+
+
+def evaluate(root_dir: str) -> Dict:
+    """FP32 vs INT8 accuracy at RECOGNITION_THRESHOLD, throughput and embedding drift"""
+    missing = [p for p in (onnx_model_path(ONNX_YOLO_PATH, "int8"), onnx_model_path(ONNX_ARCFACE_PATH, "int8"))
+               if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"INT8 models not found ({', '.join(missing)}); run the quantize command first")
+    split = _load_split(root_dir)
+    if not split:
+        raise ValueError(f"No student folders with at least 2 frames in {root_dir}")
+    fp32 = evaluate_precision("fp32", split)
+    if fp32["students_enrolled"] == 0:
+        raise ValueError(f"No student in {root_dir} produced an enrollment embedding (no faces passed quality gating)")
+    int8 = evaluate_precision("int8", split)
+
+    cosines = [float(np.dot(a, b)) for a, b in zip(fp32.pop("_embeddings"), int8.pop("_embeddings"))
+               if a is not None and b is not None]
+    accuracy_drop = fp32["accuracy"] - int8["accuracy"]
+    mean_cosine = float(np.mean(cosines)) if cosines else 0.0
+    report = {
+        "fp32": fp32,
+        "int8": int8,
+        "accuracy_drop": accuracy_drop,
+        "speedup": int8["frames_per_second"] / fp32["frames_per_second"] if fp32["frames_per_second"] else 0.0,
+        "embedding_cosine_mean": mean_cosine,
+        "embedding_cosine_min": float(np.min(cosines)) if cosines else 0.0,
+        "int8_recommended": accuracy_drop <= MAX_ACCURACY_DROP and mean_cosine >= MIN_EMBEDDING_COSINE,
+        "guardrails": {"max_accuracy_drop": MAX_ACCURACY_DROP, "min_embedding_cosine": MIN_EMBEDDING_COSINE},
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="INT8 quantization and FP32 vs INT8 evaluation")
+    commands = parser.add_subparsers(dest="command", required=True)
+    quantize_cmd = commands.add_parser("quantize", help="Write models/*.int8.onnx calibrated on a frames directory")
+    quantize_cmd.add_argument("frames_dir")
+    quantize_cmd.add_argument("--max-frames", type=int, default=CALIBRATION_MAX_FRAMES)
+    evaluate_cmd = commands.add_parser("evaluate", help="Compare FP32 and INT8 on per-student frame folders")
+    evaluate_cmd.add_argument("root_dir")
+    evaluate_cmd.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if args.command == "quantize":
+        quantize(args.frames_dir, args.max_frames)
+        sys.exit(0)
+
+    report = evaluate(args.root_dir)
+    for precision in ("fp32", "int8"):
+        r = report[precision]
+        print(f"[Evaluate] {precision}: accuracy {r['accuracy']:.3f}  false accepts {r['false_accept_rate']:.3f}  "
+              f"rejects {r['reject_rate']:.3f}  {r['frames_per_second']:.1f} fps")
+    print(f"[Evaluate] accuracy drop {report['accuracy_drop']:+.3f}, speedup {report['speedup']:.2f}x, "
+          f"embedding cosine mean {report['embedding_cosine_mean']:.4f} (min {report['embedding_cosine_min']:.4f})")
+    print(f"[Evaluate] INT8 {'recommended' if report['int8_recommended'] else 'NOT recommended'} for this deployment")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[Evaluate] Report written to {args.output}")
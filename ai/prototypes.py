@@ -0,0 +1,121 @@
+"""
+Prototype embeddings per student
+Instead of collapsing every enrollment embedding into one median vector, training keeps up
+to MAX_PROTOTYPES cluster representatives per student (spherical k-means or k-medoids over
+the enrollment embeddings), so a student enrolled with and without glasses, or under very
+different lighting, still matches one of their prototypes closely.
+
+Prototypes are stored as ordinary gallery rows: the first (largest cluster) under the plain
+student ID, so single-vector galleries and stores keep working unchanged, and the others
+under "<student_id>#<k>". EmbeddingGallery.search pools the rows of each student (max or
+softmax) in the same vectorized pass. See benchmarks/bench_prototypes.py for the memory /
+latency / accuracy trade-off.
+"""
+
+import os
+from typing import List, Optional
+
+import numpy as np
+
+PROTOTYPE_KEY_LIMIT = 16  # Hard cap on rows per student (bounds key probing in the gallery)
+MAX_PROTOTYPES = min(PROTOTYPE_KEY_LIMIT, max(1, int(os.environ.get("AI_PROTOTYPES", "3"))))  # 1 = single median
+PROTOTYPE_METHOD = os.environ.get("AI_PROTOTYPE_METHOD", "kmeans")  # 'kmeans' or 'kmedoids'
+PROTOTYPE_MIN_CLUSTER = int(os.environ.get("AI_PROTOTYPE_MIN_CLUSTER", "3"))  # Smaller clusters are outliers
+PROTOTYPE_MERGE_SIMILARITY = 0.9  # Prototypes closer than this to a larger one add nothing and are dropped
+PROTOTYPE_POOLING = os.environ.get("AI_PROTOTYPE_POOLING", "max")  # 'max' or 'softmax'
+PROTOTYPE_TEMPERATURE = float(os.environ.get("AI_PROTOTYPE_TEMPERATURE", "0.05"))  # Softmax pooling sharpness
+KMEANS_ITERATIONS = 20
+PROTOTYPE_SEPARATOR = "#"
+
+
+def prototype_key(student_id: str, index: int) -> str:
+    """Gallery key of a student's index-th prototype (0 is the plain student ID)"""
+    return student_id if index == 0 else f"{student_id}{PROTOTYPE_SEPARATOR}{index}"
+
+
+def student_of(key: str) -> str:
+    """Student ID owning a gallery key"""
+    return key.split(PROTOTYPE_SEPARATOR, 1)[0]
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans_pp_init(embeddings: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means++ seeding on cosine distance"""
+    centers = [embeddings[rng.integers(len(embeddings))]]
+    for _ in range(1, k):
+        distance = np.clip(1.0 - np.max(embeddings @ np.stack(centers).T, axis=1), 0.0, None)
+        total = distance.sum()
+        if total <= 0:
+            break  # Fewer distinct points than clusters
+        centers.append(embeddings[rng.choice(len(embeddings), p=distance / total)])
+    return np.stack(centers)
+
+
+def cluster(embeddings: np.ndarray, k: int, method: str = PROTOTYPE_METHOD, iterations: int = KMEANS_ITERATIONS,
+            seed: int = 0):
+    """
+    Spherical k-means / k-medoids over unit-normalized embeddings.
+    Args:
+        embeddings: (n, dim) unit-normalized embeddings
+        k: Number of clusters
+        method: 'kmeans' (centers are normalized means) or 'kmedoids' (centers are members)
+    Returns:
+        (centers (k', dim), labels (n,)); k' <= k when there are fewer distinct points
+    """
+    rng = np.random.default_rng(seed)
+    centers = _kmeans_pp_init(embeddings, k, rng)
+    labels = np.zeros(len(embeddings), dtype=np.int64)
+    for step in range(iterations):
+        new_labels = np.argmax(embeddings @ centers.T, axis=1)
+        if step > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(len(centers)):
+            members = embeddings[labels == c]
+            if len(members) == 0:
+                continue
+            if method == "kmedoids":
+                # Member with the highest total similarity to the rest of its cluster
+                centers[c] = members[np.argmax((members @ members.T).sum(axis=1))]
+            else:
+                centers[c] = _normalize_rows(members.mean(axis=0, keepdims=True))[0]
+    return centers, labels
+
+
+def select_prototypes(embeddings: List[np.ndarray], max_prototypes: int = MAX_PROTOTYPES,
+                      min_cluster: int = PROTOTYPE_MIN_CLUSTER, method: str = PROTOTYPE_METHOD,
+                      seed: int = 0) -> Optional[np.ndarray]:
+    """
+    Choose a student's prototypes from their enrollment embeddings.
+    Args:
+        embeddings: Enrollment embeddings (any norm)
+        max_prototypes: Upper bound on prototypes (1 = the single median embedding)
+        min_cluster: Clusters with fewer members are treated as outliers
+        method: 'kmeans' or 'kmedoids'
+    Returns:
+        (num_prototypes, dim) unit-normalized array, largest cluster first; None without embeddings
+    """
+    if not embeddings:
+        return None
+    vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    median = _normalize_rows(np.median(vectors, axis=0, keepdims=True))
+    k = min(max_prototypes, len(vectors) // max(1, min_cluster))
+    if k <= 1:
+        return median
+
+    centers, labels = cluster(vectors, k, method=method, seed=seed)
+    sizes = np.bincount(labels, minlength=len(centers))
+    kept = []
+    for c in np.argsort(-sizes, kind="stable"):
+        if sizes[c] < min_cluster:
+            break
+        if kept and np.max(np.stack(kept) @ centers[c]) > PROTOTYPE_MERGE_SIMILARITY:
+            continue
+        kept.append(centers[c])
+    if len(kept) <= 1:
+        return median  # Unimodal enrollment: keep the robust median like before
+    return np.stack(kept).astype(np.float32)
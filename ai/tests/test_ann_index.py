@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFFlatIndex
+from conftest import unit_vectors
+from embedding_gallery import EmbeddingGallery
+
+
+def clustered(rng, count, clusters=64, dim=64, noise=0.35):
+    """Unit vectors around random centers, like many students' embeddings"""
+    centers = unit_vectors(rng, clusters, dim)
+    vectors = centers[rng.integers(0, clusters, count)] + noise * rng.standard_normal((count, dim)) / np.sqrt(dim)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top_k(matrix, queries, top_k):
+    scores = queries @ matrix.T
+    return np.argsort(-scores, axis=1)[:, :top_k]
+
+
+def recall(index, matrix, queries, top_k):
+    expected = exact_top_k(matrix, queries, top_k)
+    hits = sum(len(set(rows.tolist()) & set(want.tolist()))
+               for (rows, _), want in zip(index.search(queries, matrix, top_k), expected))
+    return hits / expected.size
+
+
+def test_ivf_recall_against_exact_search(rng):
+    matrix = clustered(rng, 4000)
+    queries = clustered(rng, 100)
+    index = IVFFlatIndex(nlist=64, nprobe=16, min_gallery_size=0)
+    index.train(matrix)
+    assert recall(index, matrix, queries, 10) >= 0.95
+
+
+def test_probing_every_bucket_is_exact(rng):
+    matrix = clustered(rng, 2000)
+    queries = clustered(rng, 20)
+    index = IVFFlatIndex(nlist=32, nprobe=32, min_gallery_size=0)
+    index.train(matrix)
+    for (rows, scores), want in zip(index.search(queries, matrix, 5), exact_top_k(matrix, queries, 5)):
+        assert rows.tolist() == want.tolist()
+        assert np.all(np.diff(scores) <= 0)
+
+
+def test_needs_training():
+    index = IVFFlatIndex(nlist=4, min_gallery_size=100)
+    assert not index.needs_training(99)
+    assert index.needs_training(100)
+
+
+def test_gallery_keeps_index_consistent_through_updates_and_removes(rng):
+    vectors = clustered(rng, 1200)
+    index = IVFFlatIndex(nlist=16, nprobe=16, min_gallery_size=1000)
+    gallery = EmbeddingGallery()
+    gallery.index = index
+    for i, vector in enumerate(vectors[:1000]):
+        gallery.add(f"s{i}", vector)
+    queries = clustered(rng, 30)
+    gallery.search(queries)  # Trains the index
+    assert index.is_trained
+
+    for i in range(1000, 1200):
+        gallery.add(f"s{i}", vectors[i])  # Bucketed on add
+    for i in range(0, 1200, 7):
+        gallery.remove(f"s{i}")  # Swap-with-last moves rows inside the index
+    for i, vector in zip(range(1, 300, 11), clustered(rng, 30)):
+        gallery.update(f"s{i}", vector)  # Re-bucketed
+
+    exact = EmbeddingGallery.from_dict(gallery.as_dict())
+    for got, want in zip(gallery.search(queries, 5), exact.search(queries, 5)):
+        assert [k for k, _ in got] == [k for k, _ in want]
+        assert [s for _, s in got] == pytest.approx([s for _, s in want], abs=1e-5)
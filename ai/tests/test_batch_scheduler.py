@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from batch_scheduler import BatchStats, MicroBatcher, collect_batch
+
+
+def test_collect_batch_stops_at_max_size():
+    source = queue.Queue()
+    for i in range(10):
+        source.put(i)
+    assert collect_batch(source, "first", window_s=1.0, max_size=4) == ["first", 0, 1, 2]
+    assert source.qsize() == 7
+
+
+def test_collect_batch_stops_at_the_window():
+    source = queue.Queue()
+    started = time.perf_counter()
+    assert collect_batch(source, "first", window_s=0.05, max_size=8) == ["first"]
+    assert time.perf_counter() - started < 1.0
+
+
+def test_microbatcher_coalesces_and_keeps_order():
+    batches = []
+    release = threading.Event()
+
+    def process(payloads):
+        release.wait(5)
+        batches.append(list(payloads))
+        return [p * 10 for p in payloads]
+
+    batcher = MicroBatcher(process, window_ms=200, max_batch_size=4)
+    futures = [batcher.submit(i) for i in range(4)]
+    release.set()
+    assert [f.result(timeout=5) for f in futures] == [0, 10, 20, 30]
+    assert batches == [[0, 1, 2, 3]]
+    assert batcher.stats.snapshot()["batch_size_histogram"] == {"4": 1}
+    assert futures[0].timings is not None
+
+
+def test_microbatcher_drops_cancelled_frames():
+    seen = []
+    gate = threading.Event()
+
+    def process(payloads):
+        seen.extend(payloads)
+        return payloads
+
+    batcher = MicroBatcher(lambda payloads: gate.wait(5) and process(payloads), window_ms=100, max_batch_size=8)
+    blocker = batcher.submit("blocker")  # Holds the worker thread while the rest queue up
+    time.sleep(0.2)
+    kept, dropped = batcher.submit("kept"), batcher.submit("dropped")
+    assert dropped.cancel()
+    gate.set()
+    assert blocker.result(timeout=5) == "blocker"
+    assert kept.result(timeout=5) == "kept"
+    assert "dropped" not in seen
+
+
+def test_microbatcher_fails_every_frame_of_a_failed_batch():
+    def process(payloads):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(process, window_ms=50, max_batch_size=2)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=5)
+
+
+def test_microbatcher_queue_is_bounded():
+    gate = threading.Event()
+    batcher = MicroBatcher(lambda payloads: gate.wait(5) and payloads, window_ms=0, max_batch_size=1, max_queue=1)
+    batcher.submit(0)
+    time.sleep(0.1)  # The worker took frame 0 and is blocked on it
+    batcher.submit(1)
+    with pytest.raises(queue.Full):
+        batcher.submit(2)
+    gate.set()
+
+
+def test_batch_stats_snapshot():
+    stats = BatchStats()
+    stats.record(2, [1.0, 3.0], 10.0)
+    stats.record(4, [2.0, 2.0, 2.0, 2.0], 20.0)
+    snapshot = stats.snapshot()
+    assert snapshot["batches"] == 2
+    assert snapshot["frames"] == 6
+    assert snapshot["avg_batch_size"] == 3.0
+    assert snapshot["max_queue_wait_ms"] == 3.0
+    assert snapshot["avg_queue_wait_ms"] == 2.0
+    assert snapshot["last_batch"] == {"size": 4, "process_ms": 20.0, "max_wait_ms": 2.0}
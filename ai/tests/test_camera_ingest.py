@@ -0,0 +1,118 @@
+import time
+
+import cv2
+import numpy as np
+
+from camera_ingest import IngestionPipeline
+
+CLIP_FRAMES = 30
+CLIP_SIZE = (64, 48)  # (width, height)
+
+
+def write_clip(path, frames: int = CLIP_FRAMES, fps: float = 30.0) -> str:
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, CLIP_SIZE)
+    assert writer.isOpened()
+    for i in range(frames):
+        writer.write(np.full((CLIP_SIZE[1], CLIP_SIZE[0], 3), i * 8 % 256, np.uint8))
+    writer.release()
+    return str(path)
+
+
+class StubRecognizer:
+    """process_frames stand-in: one recognized face per frame, optionally slow"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, frames, camera_ids):
+        self.calls.append(list(camera_ids))
+        time.sleep(self.delay)
+        return [[{"student_id": "alice", "recognized": True, "bbox": [0, 0, 8, 8]}] for _ in frames]
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def run_until_finished(streams, events):
+    wait_until(lambda: all(stream.finished for stream in streams))
+    # The newest decoded frame of every camera is still processed after its stream ends
+    wait_until(lambda: all(any(e["camera_id"] == s.camera_id and e["seq"] == s.frames_decoded for e in events)
+                           for s in streams))
+
+
+def test_file_camera_publishes_events_and_ends_cleanly(tmp_path):
+    clip = write_clip(tmp_path / "lecture.avi")
+    pipeline = IngestionPipeline(StubRecognizer())
+    events = []
+    pipeline.subscribe(events.append)
+    try:
+        stream = pipeline.add_camera("room-1", clip, realtime=True)
+        run_until_finished([stream], events)
+
+        assert stream.frames_decoded == CLIP_FRAMES
+        wait_until(lambda: not pipeline.cameras()[0]["running"])  # Decode thread exited at the end of the file
+        assert pipeline.cameras()[0]["error"] is None
+        seqs = [e["seq"] for e in events]
+        assert seqs == sorted(set(seqs))
+        event = events[-1]
+        assert event["camera_id"] == "room-1"
+        assert event["recognized"] is True and event["count"] == 1
+        assert event["results"][0]["student_id"] == "alice"
+    finally:
+        pipeline.stop()
+
+
+def test_slow_recognition_drops_stale_frames(tmp_path):
+    clip = write_clip(tmp_path / "lecture.avi")
+    pipeline = IngestionPipeline(StubRecognizer(delay=0.05))
+    events = []
+    pipeline.subscribe(events.append)
+    try:
+        # Decoding as fast as possible outpaces a 50 ms recognition pass
+        stream = pipeline.add_camera("room-1", clip, realtime=False)
+        run_until_finished([stream], events)
+
+        processed = len(events)
+        assert stream.frames_dropped > 0
+        assert processed < CLIP_FRAMES
+        assert processed + stream.frames_dropped == stream.frames_decoded == CLIP_FRAMES
+        assert events[-1]["seq"] == CLIP_FRAMES  # The newest frame is never dropped
+    finally:
+        pipeline.stop()
+
+
+def test_cameras_share_batched_passes(tmp_path):
+    clips = [write_clip(tmp_path / f"room{i}.avi") for i in range(3)]
+    recognizer = StubRecognizer(delay=0.02)
+    pipeline = IngestionPipeline(recognizer, max_batch_size=2)
+    events = []
+    pipeline.subscribe(events.append)
+    try:
+        streams = [pipeline.add_camera(f"room-{i}", clip, realtime=True) for i, clip in enumerate(clips)]
+        run_until_finished(streams, events)
+
+        assert max(len(call) for call in recognizer.calls) == 2
+        assert all(len(set(call)) == len(call) for call in recognizer.calls)  # One frame per camera per pass
+        assert {e["camera_id"] for e in events} == {"room-0", "room-1", "room-2"}
+    finally:
+        pipeline.stop()
+
+
+def test_looping_file_keeps_running_until_removed(tmp_path):
+    clip = write_clip(tmp_path / "lecture.avi", frames=5)
+    pipeline = IngestionPipeline(StubRecognizer())
+    try:
+        stream = pipeline.add_camera("room-1", clip, loop=True, realtime=False)
+        wait_until(lambda: stream.frames_decoded > 20)
+        assert not stream.finished
+
+        assert pipeline.remove_camera("room-1")
+        assert stream.finished
+        assert pipeline.cameras() == []
+    finally:
+        pipeline.stop()
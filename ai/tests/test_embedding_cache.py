@@ -0,0 +1,138 @@
+import threading
+import types
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import ENTRY_OVERHEAD_BYTES, EmbeddingCache, crop_key
+
+DIM = 512
+ENTRY_BYTES = DIM * 4 + ENTRY_OVERHEAD_BYTES
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def embedding(value: float) -> np.ndarray:
+    return np.full(DIM, value, dtype=np.float32)
+
+
+def test_crop_key_depends_on_pixels_and_shape():
+    crop = np.zeros((4, 6, 3), np.uint8)
+
+    assert crop_key(crop) == crop_key(crop.copy())
+    assert crop_key(crop) != crop_key(crop.reshape(6, 4, 3))
+    changed = crop.copy()
+    changed[0, 0, 0] = 1
+    assert crop_key(crop) != crop_key(changed)
+
+
+def test_get_counts_hits_and_misses():
+    cache = EmbeddingCache(max_entries=10, max_mb=1, ttl=60)
+    cache.put(b"a", embedding(1))
+
+    np.testing.assert_array_equal(cache.get(b"a"), embedding(1))
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (2, 1, pytest.approx(2 / 3, abs=1e-4))
+
+
+def test_cached_embeddings_are_read_only():
+    cache = EmbeddingCache(max_entries=10, max_mb=1, ttl=60)
+    source = embedding(1)
+    cache.put(b"a", source)
+    source[0] = 5  # The cache keeps its own copy
+
+    cached = cache.get(b"a")
+    assert cached[0] == 1
+    with pytest.raises(ValueError):
+        cached[0] = 2
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = EmbeddingCache(max_entries=10, max_mb=1, ttl=60)
+    cache.put(b"a", embedding(1))
+
+    clock.now += 59
+    assert cache.get(b"a") is not None
+    clock.now += 2
+    assert cache.get(b"a") is None
+    assert len(cache) == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def test_entry_limit_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=3, max_mb=1, ttl=60)
+    for key in (b"a", b"b", b"c"):
+        cache.put(key, embedding(1))
+    cache.get(b"a")  # b is now the least recently used
+
+    cache.put(b"d", embedding(1))
+
+    assert cache.get(b"b") is None
+    assert all(cache.get(key) is not None for key in (b"a", b"c", b"d"))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_oldest_entries():
+    cache = EmbeddingCache(max_entries=100, max_mb=2.5 * ENTRY_BYTES / (1024 * 1024), ttl=60)
+    for key in (b"a", b"b", b"c"):
+        cache.put(key, embedding(1))
+
+    assert len(cache) == 2
+    assert cache.get(b"a") is None
+    assert cache.stats()["bytes"] == 2 * ENTRY_BYTES
+
+
+def test_replacing_an_entry_keeps_byte_count():
+    cache = EmbeddingCache(max_entries=10, max_mb=1, ttl=60)
+    cache.put(b"a", embedding(1))
+    cache.put(b"a", embedding(2))
+
+    assert len(cache) == 1
+    assert cache.stats()["bytes"] == ENTRY_BYTES
+    assert cache.get(b"a")[0] == 2
+
+
+def test_concurrent_put_and_get():
+    cache = EmbeddingCache(max_entries=64, max_mb=1, ttl=60)
+    threads, rounds = 8, 500
+    errors = []
+
+    def work(worker):
+        try:
+            for n in range(rounds):
+                key = f"{(worker * 7 + n) % 100}".encode()
+                cached = cache.get(key)
+                if cached is not None:
+                    assert cached[0] == float(key)  # Never a torn or foreign entry
+                cache.put(key, embedding(float(key)))
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=work, args=(w,)) for w in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert not errors
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == threads * rounds
+    assert stats["entries"] <= 64
+    assert stats["bytes"] == stats["entries"] * ENTRY_BYTES
@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+from conftest import unit_vectors
+from embedding_gallery import EmbeddingGallery
+from prototypes import prototype_key
+
+
+def brute_force(gallery_dict, queries, top_k):
+    """Reference top-k: explicit cosine against every stored vector, clamped like search()"""
+    ids = list(gallery_dict)
+    matrix = np.stack([gallery_dict[i] for i in ids])
+    results = []
+    for query in queries:
+        scores = np.clip(matrix @ query, 0.0, 1.0)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        results.append([(ids[j], float(scores[j])) for j in order])
+    return results
+
+
+def assert_same_matches(actual, expected):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert [s for _, s in got] == pytest.approx([s for _, s in want], abs=1e-5)
+        # Ties may come back in either order; the best match never ties with random vectors
+        assert got[0][0] == want[0][0]
+
+
+def test_search_matches_brute_force(rng):
+    vectors = unit_vectors(rng, 300)
+    gallery = EmbeddingGallery.from_dict({f"s{i}": v for i, v in enumerate(vectors)})
+    queries = unit_vectors(rng, 20)
+    for top_k in (1, 5, 300, 1000):
+        assert_same_matches(gallery.search(queries, top_k), brute_force(gallery.as_dict(), queries, top_k))
+
+
+def test_search_finds_stored_vector_with_similarity_one(rng):
+    vectors = unit_vectors(rng, 50)
+    gallery = EmbeddingGallery.from_dict({f"s{i}": v for i, v in enumerate(vectors)})
+    matches = gallery.search(vectors[7])
+    assert matches[0][0][0] == "s7"
+    assert matches[0][0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_search_edge_cases(rng):
+    gallery = EmbeddingGallery()
+    assert gallery.search(unit_vectors(rng, 2)) == [[], []]
+    gallery.add("a", unit_vectors(rng, 1)[0])
+    assert gallery.search(np.zeros((0, 64), dtype=np.float32)) == []
+    with pytest.raises(ValueError):
+        gallery.add("b", np.ones(32, dtype=np.float32))
+
+
+def test_add_normalizes_and_updates_in_place(rng):
+    gallery = EmbeddingGallery()
+    gallery.add("a", np.full(64, 3.0, dtype=np.float32))
+    assert np.linalg.norm(gallery.get("a")) == pytest.approx(1.0)
+    replacement = unit_vectors(rng, 1)[0]
+    gallery.update("a", replacement)
+    assert len(gallery) == 1
+    np.testing.assert_allclose(gallery.get("a"), replacement, atol=1e-6)
+
+
+def test_remove_moves_last_row_into_slot(rng):
+    vectors = unit_vectors(rng, 10)
+    gallery = EmbeddingGallery.from_dict({f"s{i}": v for i, v in enumerate(vectors)})
+    assert gallery.remove("s3")
+    assert not gallery.remove("s3")
+    assert len(gallery) == 9
+    assert "s3" not in gallery
+    assert gallery.ids()[3] == "s9"  # Swapped in from the end
+    for i in (0, 1, 2, 4, 5, 6, 7, 8, 9):
+        np.testing.assert_allclose(gallery.get(f"s{i}"), vectors[i], atol=1e-6)
+
+    queries = unit_vectors(rng, 10)
+    assert_same_matches(gallery.search(queries, 3), brute_force(gallery.as_dict(), queries, 3))
+
+
+def test_remove_everything_then_reuse(rng):
+    vectors = unit_vectors(rng, 4)
+    gallery = EmbeddingGallery.from_dict({f"s{i}": v for i, v in enumerate(vectors)})
+    for i in (0, 3, 1, 2):
+        assert gallery.remove(f"s{i}")
+    assert len(gallery) == 0
+    assert gallery.search(vectors[0]) == [[]]
+    gallery.add("again", vectors[0])
+    assert gallery.search(vectors[0])[0][0][0] == "again"
+
+
+def test_grows_past_initial_capacity(rng):
+    vectors = unit_vectors(rng, 40)
+    gallery = EmbeddingGallery(capacity=4)
+    for i, vector in enumerate(vectors):
+        gallery.add(f"s{i}", vector)
+    assert len(gallery) == 40
+    np.testing.assert_allclose(gallery.get("s0"), vectors[0], atol=1e-6)
+    np.testing.assert_allclose(gallery.get("s39"), vectors[39], atol=1e-6)
+
+
+def test_from_arrays_lookup_remove_and_long_ids(rng):
+    vectors = unit_vectors(rng, 6)
+    ids = np.array(["f", "b", "d", "a", "e", "c", "", ""], dtype="<U4")
+    matrix = np.zeros((8, 64), dtype=np.float32)
+    matrix[:6] = vectors
+    order = np.argsort(ids[:6], kind="stable")
+    gallery = EmbeddingGallery.from_arrays(matrix, ids, 6, order=order)
+
+    np.testing.assert_allclose(gallery.get("d"), vectors[2], atol=1e-6)
+    assert gallery.get("zz") is None
+    assert gallery.remove("b")
+    gallery.add("a-much-longer-id", vectors[1])  # Does not fit the fixed-width ID array
+    assert sorted(gallery.ids()) == sorted(["f", "d", "a", "e", "c", "a-much-longer-id"])
+    assert gallery.search(vectors[1])[0][0][0] == "a-much-longer-id"
+
+
+def test_prototypes_pool_to_one_score_per_student(rng):
+    vectors = unit_vectors(rng, 7)
+    gallery = EmbeddingGallery()
+    gallery.set_prototypes("alice", vectors[:3])
+    gallery.set_prototypes("bob", vectors[3:5])
+    gallery.add("carol", vectors[5])
+    assert gallery.student_count() == 3
+    assert gallery.prototype_keys("alice") == [prototype_key("alice", i) for i in range(3)]
+
+    query = vectors[1]
+    matches = dict(gallery.search(query, top_k=3)[0])
+    assert set(matches) == {"alice", "bob", "carol"}
+    assert matches["alice"] == pytest.approx(1.0, abs=1e-5)
+    assert matches["bob"] == pytest.approx(max(0.0, float(np.max(vectors[3:5] @ query))), abs=1e-5)
+
+
+def test_set_prototypes_drops_stale_keys(rng):
+    vectors = unit_vectors(rng, 3)
+    gallery = EmbeddingGallery()
+    gallery.set_prototypes("alice", vectors)
+    written = gallery.set_prototypes("alice", vectors[:1])
+    assert written == [prototype_key("alice", 0), prototype_key("alice", 1), prototype_key("alice", 2)]
+    assert gallery.prototype_keys("alice") == [prototype_key("alice", 0)]
+    assert len(gallery) == 1
+
+
+def test_softmax_pooling_lies_between_mean_and_max(rng):
+    vectors = unit_vectors(rng, 3)
+    gallery = EmbeddingGallery(pooling="softmax", temperature=0.05)
+    gallery.set_prototypes("alice", vectors)
+    query = vectors.sum(axis=0)
+    query /= np.linalg.norm(query)
+    score = gallery.search(query)[0][0][1]
+    raw = vectors @ query
+    assert raw.min() > 0
+    assert raw.mean() - 1e-6 <= score <= raw.max() + 1e-6
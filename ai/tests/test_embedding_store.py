@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+
+from conftest import unit_vectors
+from embedding_gallery import EmbeddingGallery
+from embedding_store import EmbeddingStore, LOG_MAGIC, MANIFEST_FILE
+
+
+def make_store(tmp_path, rng, count=5, **kwargs):
+    store = EmbeddingStore(str(tmp_path / "store"), **kwargs)
+    vectors = unit_vectors(rng, count)
+    gallery = EmbeddingGallery.from_dict({f"s{i}": v for i, v in enumerate(vectors)})
+    store.compact(gallery)
+    return store, store.load_gallery(), vectors
+
+
+def test_snapshot_roundtrip(tmp_path, rng):
+    store, gallery, vectors = make_store(tmp_path, rng)
+    loaded = EmbeddingStore(store.directory).load_gallery()
+    assert sorted(loaded.ids()) == sorted(gallery.ids())
+    for i, vector in enumerate(vectors):
+        np.testing.assert_allclose(loaded.get(f"s{i}"), vector, atol=1e-6)
+
+
+def test_log_replay_applies_upserts_and_deletes(tmp_path, rng):
+    store, gallery, vectors = make_store(tmp_path, rng)
+    new = unit_vectors(rng, 2)
+    gallery.add("s0", new[0])
+    store.append_upsert(gallery, "s0", new[0])
+    gallery.add("new", new[1])
+    store.append_upsert(gallery, "new", new[1])
+    gallery.remove("s1")
+    store.append_delete(gallery, "s1")
+
+    loaded = EmbeddingStore(store.directory).load_gallery()
+    assert "s1" not in loaded
+    np.testing.assert_allclose(loaded.get("s0"), new[0], atol=1e-6)
+    np.testing.assert_allclose(loaded.get("new"), new[1], atol=1e-6)
+    assert len(loaded) == len(gallery)
+
+
+def test_sync_picks_up_another_writers_records(tmp_path, rng):
+    store, gallery, _ = make_store(tmp_path, rng)
+    reader = EmbeddingStore(store.directory)
+    replica = reader.load_gallery()
+    vector = unit_vectors(rng, 1)[0]
+    gallery.add("late", vector)
+    store.append_upsert(gallery, "late", vector)
+
+    assert reader.sync(replica) is replica
+    np.testing.assert_allclose(replica.get("late"), vector, atol=1e-6)
+
+
+def test_append_after_torn_tail_is_replayed(tmp_path, rng):
+    store, gallery, _ = make_store(tmp_path, rng)
+    log_path = os.path.join(store.directory, store.manifest["log"])
+    with open(log_path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")  # Crash in the middle of a record
+
+    vector = unit_vectors(rng, 1)[0]
+    gallery.add("after-crash", vector)
+    store.append_upsert(gallery, "after-crash", vector)
+
+    loaded = EmbeddingStore(store.directory).load_gallery()
+    np.testing.assert_allclose(loaded.get("after-crash"), vector, atol=1e-6)
+    assert b"garbage" not in open(log_path, "rb").read()
+
+
+def test_torn_tail_is_ignored_on_load(tmp_path, rng):
+    store, gallery, _ = make_store(tmp_path, rng)
+    vector = unit_vectors(rng, 1)[0]
+    store.append_upsert(gallery, "kept", vector)
+    log_path = os.path.join(store.directory, store.manifest["log"])
+    with open(log_path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00torn")
+
+    loaded = EmbeddingStore(store.directory).load_gallery()
+    assert "kept" in loaded
+    assert len(loaded) == 6
+
+
+def test_compaction_folds_log_into_new_generation(tmp_path, rng):
+    store, gallery, _ = make_store(tmp_path, rng, compact_after=3)
+    first = dict(store.manifest)
+    for i, vector in enumerate(unit_vectors(rng, 3)):
+        gallery.add(f"n{i}", vector)
+        store.append_upsert(gallery, f"n{i}", vector)
+
+    assert store.manifest["generation"] == first["generation"] + 1
+    assert store.manifest["count"] == 8
+    assert not os.path.exists(os.path.join(store.directory, first["matrix"]))
+    with open(os.path.join(store.directory, store.manifest["log"]), "rb") as f:
+        assert f.read() == LOG_MAGIC
+    loaded = EmbeddingStore(store.directory).load_gallery()
+    assert sorted(loaded.ids()) == sorted(gallery.ids())
+
+
+def test_reader_reloads_after_compaction(tmp_path, rng):
+    store, gallery, _ = make_store(tmp_path, rng)
+    reader = EmbeddingStore(store.directory)
+    replica = reader.load_gallery()
+    gallery.remove("s0")
+    store.compact(gallery)
+
+    replica = reader.sync(replica)
+    assert "s0" not in replica
+    assert len(replica) == 4
+
+
+def test_migrate_legacy_npy(tmp_path, rng):
+    vectors = unit_vectors(rng, 3)
+    legacy = tmp_path / "encodings.npy"
+    np.save(legacy, {f"s{i}": v for i, v in enumerate(vectors)}, allow_pickle=True)
+    store = EmbeddingStore(str(tmp_path / "store"))
+    gallery = store.migrate_legacy(str(legacy), str(tmp_path / "missing.pkl"))
+    assert store.exists()
+    assert sorted(gallery.ids()) == ["s0", "s1", "s2"]
+
+
+def test_crop_mode_is_recorded_and_survives_compaction(tmp_path, rng):
+    store, gallery, _ = make_store(tmp_path, rng, crop_mode="aligned")
+    store.compact(gallery)
+    reader = EmbeddingStore(store.directory, crop_mode="box")
+    reader.load_gallery()
+    assert reader.crop_mode == "aligned"
+
+
+def test_store_without_crop_mode_holds_box_crops(tmp_path, rng):
+    store, _, _ = make_store(tmp_path, rng, crop_mode="aligned")
+    manifest_path = os.path.join(store.directory, MANIFEST_FILE)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    del manifest["crop_mode"]
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    reader = EmbeddingStore(store.directory, crop_mode="aligned")
+    reader.load_gallery()
+    assert reader.crop_mode == "box"
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+import pytest
+
+from face_alignment import ARCFACE_TEMPLATE, align_faces, face_landmarks, similarity_transforms
+
+LANDMARK_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255)]
+
+
+def to_frame(angle_deg: float, scale: float, translation) -> np.ndarray:
+    """(2, 3) similarity transform placing the template in a frame"""
+    theta = np.deg2rad(angle_deg)
+    rotation = scale * np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    return np.hstack([rotation, np.asarray(translation, dtype=np.float64)[:, None]])
+
+
+def apply(m: np.ndarray, points: np.ndarray) -> np.ndarray:
+    return points @ m[:, :2].T + m[:, 2]
+
+
+def inverse(m: np.ndarray) -> np.ndarray:
+    linear = np.linalg.inv(m[:, :2])
+    return np.hstack([linear, -(linear @ m[:, 2])[:, None]])
+
+
+@pytest.mark.parametrize("angle, scale, translation", [(0, 1, (0, 0)), (25, 2.5, (300, 140)), (-40, 0.7, (12, 80))])
+def test_similarity_transform_recovers_known_transform(angle, scale, translation):
+    placement = to_frame(angle, scale, translation)
+    landmarks = apply(placement, ARCFACE_TEMPLATE.astype(np.float64))
+
+    m = similarity_transforms(landmarks[None])[0]
+
+    np.testing.assert_allclose(m, inverse(placement), atol=1e-6)
+    np.testing.assert_allclose(apply(m, landmarks), ARCFACE_TEMPLATE, atol=1e-4)
+
+
+def test_similarity_transforms_solve_every_face_at_once():
+    placements = [to_frame(10, 2, (50, 60)), to_frame(-15, 1.5, (400, 30)), to_frame(90, 3, (200, 200))]
+    landmarks = np.stack([apply(p, ARCFACE_TEMPLATE.astype(np.float64)) for p in placements])
+
+    transforms = similarity_transforms(landmarks)
+
+    assert transforms.shape == (3, 2, 3)
+    for m, placement in zip(transforms, placements):
+        np.testing.assert_allclose(m, inverse(placement), atol=1e-6)
+
+
+@pytest.mark.parametrize("size", [(112, 112), (224, 224)])
+def test_align_faces_puts_landmarks_on_template(size):
+    frame = np.zeros((480, 640, 3), np.uint8)
+    faces = [to_frame(20, 3, (250, 60)), to_frame(-30, 2.5, (60, 200))]
+    landmarks = np.stack([apply(p, ARCFACE_TEMPLATE.astype(np.float64)) for p in faces])
+    for face in landmarks:
+        for (x, y), color in zip(face, LANDMARK_COLORS):
+            cv2.circle(frame, (int(round(x)), int(round(y))), 7, color, -1)
+
+    aligned = align_faces(frame, landmarks, size=size)
+
+    assert aligned.shape == (2,) + size + (3,)
+    template = ARCFACE_TEMPLATE * np.array([size[1], size[0]]) / 112
+    for face in aligned:
+        for (x, y), color in zip(template, LANDMARK_COLORS):
+            np.testing.assert_allclose(face[int(round(y)), int(round(x))], color, atol=40)
+
+
+def test_align_faces_without_faces():
+    assert align_faces(np.zeros((10, 10, 3), np.uint8), np.zeros((0, 5, 2))).shape == (0, 112, 112, 3)
+
+
+def test_face_landmarks_from_detection():
+    points = ARCFACE_TEMPLATE.ravel().tolist()
+
+    np.testing.assert_allclose(face_landmarks((0, 0, 10, 10, 0.9, points)), ARCFACE_TEMPLATE)
+    assert face_landmarks((0, 0, 10, 10, 0.9)) is None
+    assert face_landmarks((0, 0, 10, 10, 0.9, None)) is None
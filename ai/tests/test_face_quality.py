@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+import pytest
+
+import ai_module_yolo
+import face_quality
+import metrics
+from ai_module_yolo import FaceRecognizer, best_quality
+from face_alignment import ARCFACE_TEMPLATE
+
+FULL_BOX = (0, 0, 112, 112)
+
+
+def checkerboard(low: int, high: int, size: int = 112, square: int = 8) -> np.ndarray:
+    """Sharp-edged BGR test crop with a chosen gray range"""
+    y, x = np.indices((size, size))
+    gray = np.where((x // square + y // square) % 2, high, low).astype(np.uint8)
+    return np.repeat(gray[..., None], 3, axis=2)
+
+
+@pytest.fixture
+def sharp_crop():
+    return checkerboard(60, 200)
+
+
+def test_sharp_frontal_crop_passes(sharp_crop):
+    report = face_quality.assess(sharp_crop, FULL_BOX, ARCFACE_TEMPLATE)
+
+    assert report["usable"] is True
+    assert report["issue"] is None
+    assert report["yaw"] < 0.05
+    assert report["score"] > 0.9
+
+
+@pytest.mark.parametrize("crop, box, issue", [
+    (cv2.GaussianBlur(checkerboard(60, 200), (0, 0), 8), FULL_BOX, "blur"),
+    (checkerboard(60, 200), (0, 0, 16, 16), "size"),
+    (checkerboard(0, 40), FULL_BOX, "brightness"),
+    (checkerboard(215, 255), FULL_BOX, "brightness"),
+])
+def test_poor_crops_are_rejected(crop, box, issue, sharp_crop):
+    report = face_quality.assess(crop, box)
+
+    assert report["usable"] is False
+    assert report["issue"] == issue
+    assert report["score"] < face_quality.assess(sharp_crop, FULL_BOX)["score"]
+
+
+def test_turned_face_is_rejected_on_pose(sharp_crop):
+    landmarks = ARCFACE_TEMPLATE.copy()
+    landmarks[2, 0] += 30  # Nose far off the eye centre: face turned aside
+
+    report = face_quality.assess(sharp_crop, FULL_BOX, landmarks)
+
+    assert report["issue"] == "pose"
+    assert report["yaw"] > face_quality.QUALITY_MAX_YAW
+
+
+def test_unusable_landmarks_skip_the_pose_check(sharp_crop):
+    assert face_quality.pose_score(np.zeros((5, 2))) is None
+    assert face_quality.assess(sharp_crop, FULL_BOX, np.zeros((5, 2)))["usable"] is True
+
+
+def test_gate_counts_skipped_crops_by_issue(sharp_crop):
+    before = metrics.FACE_QUALITY_SKIPPED.value("size")
+
+    assert face_quality.gate(sharp_crop, (0, 0, 16, 16, 0.9))["usable"] is False
+    assert face_quality.gate(sharp_crop, FULL_BOX + (0.9,))["usable"] is True
+    assert metrics.FACE_QUALITY_SKIPPED.value("size") - before == 1
+
+
+class CropFramesRecognizer(FaceRecognizer):
+    """Enrollment on frames that are already face crops: one full-frame face each, no models"""
+
+    def __init__(self):
+        pass
+
+    def detect_faces_yolo_batch(self, frames, min_conf=None, profiles=None):
+        return [[(0, 0, frame.shape[1], frame.shape[0], 0.9)] for frame in frames]
+
+    def face_crops(self, frame, detections):
+        return [frame]
+
+    def generate_embeddings(self, face_imgs, batch_size=None):
+        return [np.ones(8, np.float32) / np.sqrt(8) for _ in face_imgs]
+
+
+def test_training_skips_frames_below_the_floors(monkeypatch, sharp_crop):
+    monkeypatch.setattr(ai_module_yolo, "QUALITY_ENABLED", True)
+    frames = [sharp_crop, cv2.GaussianBlur(sharp_crop, (0, 0), 8), checkerboard(60, 200, size=16),
+              checkerboard(0, 40), checkerboard(60, 200, size=70)]
+
+    embedded = CropFramesRecognizer()._embed_training_frames(frames, with_quality=True)
+
+    assert [e is not None for e in embedded] == [True, False, False, False, True]
+    assert embedded[0][1] > embedded[4][1]  # Smaller face, lower score
+
+
+def test_best_quality_keeps_highest_scores_best_first():
+    scored = [("a", 0.5), ("b", 0.9), ("c", 0.7), ("d", 0.9), ("e", 0.2)]
+
+    assert best_quality(scored, limit=3) == [("b", 0.9), ("d", 0.9), ("c", 0.7)]
+    assert best_quality(scored, limit=5) == scored
+    assert best_quality(scored, limit=0) == scored
@@ -0,0 +1,95 @@
+import socket
+
+import numpy as np
+import pytest
+
+from frame_stream import (FrameStreamClient, FrameStreamServer, MSG_ERROR, MSG_RAW, MSG_RESULT, read_message,
+                          write_message)
+
+
+@pytest.fixture
+def stream():
+    seen = []
+
+    def process(data, frame, camera_id):
+        if data is not None and bytes(data) == b"fail":
+            raise ValueError("bad frame")
+        seen.append((None if data is None else bytes(data), frame, camera_id))
+        return [{"recognized": True, "student_id": "s1"}]
+
+    server = FrameStreamServer(process, port=0, workers=2).start()
+    yield server, seen
+    server.close()
+
+
+def connect(server):
+    host, _, port = server.address.rpartition(":")
+    return socket.create_connection((host, int(port)))
+
+
+def test_raw_and_encoded_frames_are_answered_by_seq(stream):
+    server, seen = stream
+    client = FrameStreamClient(server.address, camera_id="room-1")
+    frame = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+    raw, encoded = client.send(frame), client.send(b"jpeg-bytes")
+    assert raw.result(timeout=5) == {"results": [{"recognized": True, "student_id": "s1"}],
+                                     "recognized": True, "count": 1}
+    assert encoded.result(timeout=5)["count"] == 1
+    client.close()
+
+    by_kind = {data is None: (data, received, camera) for data, received, camera in seen}
+    np.testing.assert_array_equal(by_kind[True][1], frame)
+    assert by_kind[True][2] == "room-1"
+    assert by_kind[False][0] == b"jpeg-bytes"
+
+
+def test_grayscale_raw_frames_arrive_as_bgr(stream):
+    server, seen = stream
+    client = FrameStreamClient(server.address)
+    gray = np.arange(6 * 7, dtype=np.uint8).reshape(6, 7)
+    client.recognize(gray, timeout=5)
+    client.close()
+
+    frame = seen[0][1]
+    assert frame.shape == (6, 7, 3)
+    for channel in range(3):
+        np.testing.assert_array_equal(frame[..., channel], gray)
+
+
+def test_processing_error_answers_that_frame_only(stream):
+    server, _ = stream
+    client = FrameStreamClient(server.address)
+    with pytest.raises(RuntimeError, match="bad frame"):
+        client.recognize(b"fail", timeout=5)
+    assert client.recognize(b"ok", timeout=5)["count"] == 1
+    client.close()
+
+
+@pytest.mark.parametrize("shape, size", [
+    ((4, 4, 3), 47),  # Payload shorter than the header's shape
+    ((4, 4, 4), 64),  # BGRA
+    ((4, 4, 2), 32),
+])
+def test_malformed_raw_frame_closes_the_connection(stream, shape, size):
+    server, seen = stream
+    sock = connect(server)
+    write_message(sock, MSG_RAW, 1, np.zeros(size, dtype=np.uint8), shape)
+    sock.settimeout(5)
+    assert read_message(sock) is None
+    sock.close()
+    assert seen == []
+
+
+def test_replies_carry_the_request_seq(stream):
+    server, _ = stream
+    sock = connect(server)
+    for seq in (7, 3):
+        write_message(sock, MSG_RAW, seq, np.zeros((2, 2, 3), dtype=np.uint8), (2, 2, 3))
+    replies = {}
+    sock.settimeout(5)
+    for _ in range(2):
+        msg_type, seq, _, _ = read_message(sock)
+        replies[seq] = msg_type
+    sock.close()
+    assert replies == {7: MSG_RESULT, 3: MSG_RESULT}
+    assert MSG_ERROR not in replies.values()
@@ -0,0 +1,169 @@
+import threading
+
+import numpy as np
+import pytest
+
+import metrics
+from ai_module_yolo import FaceRecognizer
+from embedding_gallery import EmbeddingGallery
+from embedding_store import EmbeddingStore
+from gallery_refresh import (GalleryRefresh, RefreshLimiter, REFRESH_MIN_ANCHOR_SIMILARITY, REFRESH_MIN_MARGIN,
+                             REFRESH_MIN_SAMPLES, REFRESH_MIN_SIMILARITY)
+
+DIM = 64
+
+
+def test_limiter_admits_each_student_once_per_interval():
+    limiter = RefreshLimiter(interval=600)
+    samples = [np.ones(4, dtype=np.float32)]
+    # The same student proposed by two workers: only the first proposal is applied
+    assert list(limiter.admit({"alice": samples, "bob": samples})) == ["alice", "bob"]
+    assert limiter.admit({"alice": samples}) == {}
+    assert list(limiter.admit({"carol": samples})) == ["carol"]
+
+
+def test_limiter_admits_again_after_the_interval():
+    limiter = RefreshLimiter(interval=0)
+    samples = [np.ones(4, dtype=np.float32)]
+    assert limiter.admit({"alice": samples})
+    assert limiter.admit({"alice": samples})
+
+
+def direction(angle_deg: float, axis: int = 1) -> np.ndarray:
+    """Unit vector angle_deg away from e0, rotated toward e_axis"""
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[0] = np.cos(np.deg2rad(angle_deg))
+    vector[axis] = np.sin(np.deg2rad(angle_deg))
+    return vector
+
+
+def samples_around(center: np.ndarray, rng, count: int = REFRESH_MIN_SAMPLES, noise: float = 0.01):
+    vectors = center + noise * rng.standard_normal((count, DIM)).astype(np.float32)
+    return list(vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+
+
+@pytest.fixture
+def refresh(tmp_path):
+    return GalleryRefresh(str(tmp_path / "store"), enabled=True)
+
+
+def offer(refresh, student_id="alice", embedding=None, similarity=0.9, runner_up=0.3, detection=0.9, size=120):
+    return refresh.offer(student_id, direction(0) if embedding is None else embedding, similarity, runner_up,
+                         detection, size)
+
+
+def test_offer_accepts_confident_wide_margin_faces(refresh):
+    assert offer(refresh)
+
+
+@pytest.mark.parametrize("gates", [
+    {"similarity": REFRESH_MIN_SIMILARITY - 0.01, "runner_up": 0.1},
+    {"similarity": 0.9, "runner_up": 0.9 - REFRESH_MIN_MARGIN + 0.01},
+    {"detection": 0.5},
+    {"size": 40},
+])
+def test_offer_rejects_faces_below_a_gate(refresh, gates):
+    assert not offer(refresh, **gates)
+    assert refresh.drain() == {}
+
+
+def test_drain_waits_for_enough_samples_then_rate_limits(refresh):
+    for _ in range(REFRESH_MIN_SAMPLES - 1):
+        assert offer(refresh)
+    assert refresh.drain() == {}
+
+    assert offer(refresh)
+    drained = refresh.drain()
+    assert list(drained) == ["alice"] and len(drained["alice"]) == REFRESH_MIN_SAMPLES
+    assert not offer(refresh)  # Within REFRESH_INTERVAL of the last update
+
+
+def outcome_counts():
+    return {outcome: metrics.GALLERY_REFRESH.value(outcome) for outcome in ("updated", "drift", "ambiguous",
+                                                                            "inconsistent")}
+
+
+def deltas(before):
+    return {outcome: value - before[outcome] for outcome, value in outcome_counts().items()}
+
+
+def test_update_moves_prototype_toward_samples(refresh, rng):
+    gallery = EmbeddingGallery.from_dict({"alice": direction(0), "bob": direction(90, axis=5)})
+    refresh.set_anchors("alice", direction(0)[None])
+
+    assert refresh.apply(gallery, {"alice": samples_around(direction(20), rng)}) == ["alice"]
+
+    assert 0 < float(gallery.get("alice") @ direction(20)) - float(direction(0) @ direction(20))
+    assert float(gallery.get("alice") @ direction(0)) > 0.99  # One small EMA step
+
+
+def test_update_rejects_ambiguous_samples(refresh, rng):
+    # Two students 20 degrees apart: samples between them match both about equally
+    gallery = EmbeddingGallery.from_dict({"alice": direction(0), "bob": direction(20)})
+    refresh.set_anchors("alice", direction(0)[None])
+    before = outcome_counts()
+
+    assert refresh.apply(gallery, {"alice": samples_around(direction(8), rng)}) == []
+
+    assert deltas(before)["ambiguous"] == 1
+    np.testing.assert_array_equal(gallery.get("alice"), direction(0))
+
+
+def test_update_rejects_inconsistent_samples(refresh):
+    gallery = EmbeddingGallery.from_dict({"alice": direction(0)})
+    before = outcome_counts()
+
+    scattered = [direction(60, axis=axis) for axis in range(1, REFRESH_MIN_SAMPLES + 1)]
+    assert refresh.apply(gallery, {"alice": scattered}) == []
+
+    assert deltas(before)["inconsistent"] == 1
+
+
+def test_update_rejects_step_past_the_anchor_bound(refresh, rng):
+    bound_angle = np.rad2deg(np.arccos(REFRESH_MIN_ANCHOR_SIMILARITY))
+    gallery = EmbeddingGallery.from_dict({"alice": direction(bound_angle - 0.1)})  # Already drifted to the edge
+    refresh.set_anchors("alice", direction(0)[None])
+    before = outcome_counts()
+
+    assert refresh.apply(gallery, {"alice": samples_around(direction(bound_angle + 15), rng)}) == []
+
+    assert deltas(before)["drift"] == 1
+    np.testing.assert_array_equal(gallery.get("alice"), direction(bound_angle - 0.1))
+
+
+def test_repeated_updates_stop_at_the_anchor_bound(refresh, rng):
+    gallery = EmbeddingGallery.from_dict({"alice": direction(0)})
+    refresh.set_anchors("alice", direction(0)[None])
+    target = direction(40)  # Beyond the bound, but close enough to the prototype to pass the similarity gate
+    before = outcome_counts()
+
+    for _ in range(200):
+        refresh.apply(gallery, {"alice": samples_around(target, rng)})
+        assert float(gallery.get("alice") @ direction(0)) >= REFRESH_MIN_ANCHOR_SIMILARITY - 1e-6
+
+    counts = deltas(before)
+    assert counts["updated"] > 0 and counts["drift"] > 0
+    assert counts["updated"] + counts["drift"] == 200
+
+
+def test_updates_replay_from_the_store_log(tmp_path, rng):
+    store_dir = str(tmp_path / "store")
+    store = EmbeddingStore(store_dir)
+    store.compact(EmbeddingGallery.from_dict({"alice": direction(0), "bob": direction(90, axis=5)}))
+
+    recognizer = FaceRecognizer.__new__(FaceRecognizer)  # Only the gallery / store / refresh plumbing
+    recognizer.store = store
+    recognizer.gallery = store.load_gallery()
+    recognizer.refresh = GalleryRefresh(store_dir, enabled=True)
+    recognizer._store_lock = threading.Lock()
+    recognizer.refresh.set_anchors("alice", direction(0)[None])
+    generation = store.manifest["generation"]
+
+    assert recognizer.apply_gallery_refresh({"alice": samples_around(direction(20), rng)}) == 1
+
+    assert store.manifest["generation"] == generation  # Appended to the log, not rewritten
+    reloaded = EmbeddingStore(store_dir).load_gallery()
+    np.testing.assert_allclose(reloaded.get("alice"), recognizer.gallery.get("alice"), atol=1e-6)
+    np.testing.assert_array_equal(reloaded.get("bob"), direction(90, axis=5))
+    # The drift reference survives a restart too
+    np.testing.assert_array_equal(GalleryRefresh(store_dir).anchors().get("alice"), direction(0))
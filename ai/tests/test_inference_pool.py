@@ -0,0 +1,158 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import inference_pool
+import metrics
+from frame_gate import GateRegistry
+from inference_pool import InferencePool, camera_worker
+
+FACE_BOX = (10, 10, 50, 50)
+# In a worker this module is imported (with numpy) while unpickling the recognizer factory,
+# before the worker's entry point runs
+OMP_THREADS_AT_IMPORT = os.environ.get("OMP_NUM_THREADS")
+
+
+class StubRecognizer:
+    """
+    Stands in for FaceRecognizer in the workers: one fixed face per frame, tracked per camera,
+    behind the same per-camera motion gate
+    """
+
+    refresh = None
+
+    def __init__(self):
+        self.gates = GateRegistry(enabled=True)
+
+    def sync_embeddings(self):
+        pass
+
+    def recognize_face(self, frame):
+        return OMP_THREADS_AT_IMPORT
+
+    def train_from_frames(self, frames_dir, student_id):
+        if frames_dir == "crash":
+            os._exit(3)  # Like a segfault or the OOM killer: no exception, no result
+        return True
+
+    def recognize_all_faces_batch(self, frames, trackers=None, camera_ids=None):
+        results = []
+        for n, frame in enumerate(frames):
+            gate = self.gates.get(camera_ids[n] if camera_ids else None)
+            cached, small = gate.check(frame) if gate else (None, None)
+            if cached is not None:
+                results.append(cached)
+                continue
+            tracker = trackers[n] if trackers else None
+            track = tracker.update([FACE_BOX])[0] if tracker else None
+            results.append([{"track_id": track.track_id if track else None, "worker_pid": os.getpid()}])
+            if gate:
+                gate.update(small, results[-1])
+        return results
+
+
+def wait_ready(pool, timeout=60):
+    deadline = time.time() + timeout
+    while pool.ready_workers < pool.num_workers and time.time() < deadline:
+        time.sleep(0.05)
+    assert pool.ready_workers == pool.num_workers
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = InferencePool(2, queue_size=16, threads_per_worker=1, recognizer_factory=StubRecognizer)
+    wait_ready(pool)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture(scope="module")
+def encoded_frame():
+    return cv2.imencode(".jpg", np.zeros((64, 64, 3), np.uint8))[1].tobytes()
+
+
+def noise_frames(rng, count):
+    """Frames different enough from each other that the motion gate processes every one"""
+    return [rng.integers(0, 256, (64, 64, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def cameras_on_different_workers(num_workers):
+    owners = {}
+    for n in range(100):
+        owners.setdefault(camera_worker(f"cam-{n}", num_workers), f"cam-{n}")
+        if len(owners) == num_workers:
+            return [owners[w] for w in range(num_workers)]
+    raise AssertionError("no camera IDs found for every worker")
+
+
+def test_one_camera_keeps_its_track_across_frames(pool, rng):
+    frames = [cv2.imencode(".png", frame)[1].tobytes() for frame in noise_frames(rng, 8)]
+    faces = [pool.call("recognize_live", (frame, "cam-1"), timeout=10)[0] for frame in frames]
+
+    assert len({face["worker_pid"] for face in faces}) == 1
+    assert len({face["track_id"] for face in faces}) == 1
+
+
+def test_recognize_frames_splits_cameras_by_worker(pool, rng):
+    first, second = cameras_on_different_workers(pool.num_workers)
+    camera_ids = [first, second, first, second, first]
+
+    for _ in range(2):
+        results = pool.recognize_frames(noise_frames(rng, len(camera_ids)), camera_ids, timeout=10)
+        faces = {camera: [r[0] for r, c in zip(results, camera_ids) if c == camera] for camera in (first, second)}
+        for camera_faces in faces.values():
+            assert len({face["worker_pid"] for face in camera_faces}) == 1
+            assert len({face["track_id"] for face in camera_faces}) == 1
+        assert faces[first][0]["worker_pid"] != faces[second][0]["worker_pid"]
+
+
+def test_frames_without_camera_use_every_worker(pool, encoded_frame):
+    faces = [pool.call("recognize_live", (encoded_frame, None), timeout=10)[0] for _ in range(4)]
+
+    assert len({face["worker_pid"] for face in faces}) == pool.num_workers
+    assert all(face["track_id"] is None for face in faces)
+
+
+def test_mixed_camera_task_is_rejected(pool):
+    first, second = cameras_on_different_workers(pool.num_workers)
+    frame = np.zeros((64, 64, 3), np.uint8)
+
+    with pytest.raises(ValueError):
+        pool.submit("recognize_frames", ([frame, frame], [first, second]))
+
+
+def test_unchanged_camera_frames_are_gated_on_one_worker(pool, encoded_frame):
+    skipped = metrics.FRAMES_GATED.value("skipped")
+    processed = metrics.FRAMES_GATED.value("processed")
+
+    faces = [pool.call("recognize_live", (encoded_frame, "cam-static"), timeout=10)[0] for _ in range(6)]
+
+    # Only the first frame is processed; the other five reuse its result
+    assert metrics.FRAMES_GATED.value("processed") - processed == 1
+    assert metrics.FRAMES_GATED.value("skipped") - skipped == 5
+    assert len({face["track_id"] for face in faces}) == 1
+
+
+def test_thread_caps_are_set_before_workers_import_numpy(pool, encoded_frame):
+    assert pool.call("recognize", encoded_frame, timeout=10) == "1"
+    assert os.environ.get("OMP_NUM_THREADS") == OMP_THREADS_AT_IMPORT  # Restored in this process
+
+
+def test_dead_worker_fails_its_tasks_and_is_restarted(monkeypatch, encoded_frame):
+    monkeypatch.setattr(inference_pool, "WORKER_CHECK_INTERVAL", 0.1)
+    monkeypatch.setattr(inference_pool, "WORKER_RESTART_DELAY", 1.0)
+    pool = InferencePool(2, queue_size=16, threads_per_worker=1, recognizer_factory=StubRecognizer)
+    try:
+        wait_ready(pool)
+        with pytest.raises(RuntimeError, match="died"):
+            pool.call("train", ("crash", "student-1"), timeout=10)
+        assert pool.ready_workers == 1
+
+        wait_ready(pool)
+        assert pool.alive_workers() == 2
+        assert pool.train("frames", "student-1", timeout=10) is True
+    finally:
+        pool.shutdown()
@@ -0,0 +1,64 @@
+import numpy as np
+
+from conftest import unit_vectors
+from prototypes import cluster, prototype_key, select_prototypes, student_of
+
+
+def modes(rng, centers, per_mode, noise=0.1):
+    """per_mode noisy samples around each center, shuffled"""
+    samples = np.concatenate([c + noise * rng.standard_normal((n, len(c))) / np.sqrt(len(c))
+                              for c, n in zip(centers, per_mode)])
+    return list(samples[rng.permutation(len(samples))].astype(np.float32))
+
+
+def test_prototype_keys_round_trip():
+    assert prototype_key("s1", 0) == "s1"
+    assert student_of(prototype_key("s1", 2)) == "s1"
+    assert student_of("s1") == "s1"
+
+
+def test_unimodal_enrollment_keeps_the_median(rng):
+    center = unit_vectors(rng, 1)[0]
+    embeddings = modes(rng, [center], [30])
+    prototypes = select_prototypes(embeddings, max_prototypes=3, min_cluster=3)
+    assert prototypes.shape == (1, 64)
+    vectors = np.stack(embeddings)
+    median = np.median(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), axis=0)
+    np.testing.assert_allclose(prototypes[0], median / np.linalg.norm(median), atol=1e-5)
+
+
+def test_one_prototype_per_mode_largest_first(rng):
+    centers = unit_vectors(rng, 3)
+    embeddings = modes(rng, centers, [20, 12, 6])
+    for method in ("kmeans", "kmedoids"):
+        prototypes = select_prototypes(embeddings, max_prototypes=3, min_cluster=3, method=method)
+        assert prototypes.shape == (3, 64)
+        np.testing.assert_allclose(np.linalg.norm(prototypes, axis=1), 1.0, atol=1e-5)
+        # Each prototype sits on its own mode, in order of cluster size
+        assert np.argmax(prototypes @ centers.T, axis=1).tolist() == [0, 1, 2]
+
+
+def test_small_clusters_are_dropped_as_outliers(rng):
+    centers = unit_vectors(rng, 2)
+    embeddings = modes(rng, centers, [25, 2])
+    prototypes = select_prototypes(embeddings, max_prototypes=2, min_cluster=3)
+    assert prototypes.shape == (1, 64)
+    assert float(prototypes[0] @ centers[0]) > 0.9
+
+
+def test_max_prototypes_and_empty_input(rng):
+    embeddings = modes(rng, unit_vectors(rng, 3), [10, 10, 10])
+    assert select_prototypes(embeddings, max_prototypes=1).shape == (1, 64)
+    assert len(select_prototypes(embeddings, max_prototypes=2, min_cluster=3)) <= 2
+    assert select_prototypes([]) is None
+
+
+def test_cluster_is_deterministic_and_labels_every_point(rng):
+    vectors = np.stack(modes(rng, unit_vectors(rng, 4), [8, 8, 8, 8]))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    centers, labels = cluster(vectors, 4, seed=1)
+    again, labels_again = cluster(vectors, 4, seed=1)
+    np.testing.assert_array_equal(labels, labels_again)
+    np.testing.assert_allclose(centers, again)
+    assert labels.shape == (32,)
+    assert set(labels.tolist()) == {0, 1, 2, 3}
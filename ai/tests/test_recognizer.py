@@ -0,0 +1,123 @@
+import pytest
+
+from conftest import unit_vectors
+from ai_module_yolo import FaceRecognizer, wilson_lower_bound
+from embedding_gallery import EmbeddingGallery
+
+
+def bare_recognizer(gallery: EmbeddingGallery) -> FaceRecognizer:
+    """FaceRecognizer without models or embedding store: just the gallery matching logic"""
+    recognizer = FaceRecognizer.__new__(FaceRecognizer)
+    recognizer.gallery = gallery
+    return recognizer
+
+
+class EmbeddingFramesRecognizer(FaceRecognizer):
+    """Voting on frames that already are face embeddings: one face per frame, no models"""
+
+    def __init__(self, gallery: EmbeddingGallery):
+        self.gallery = gallery
+
+    def detect_faces_yolo_batch(self, frames, min_conf=None, profiles=None):
+        return [[(0, 0, 10, 10, 0.9)] for _ in frames]
+
+    def face_crops(self, frame, detections):
+        return [frame]
+
+    def generate_embeddings(self, face_imgs, batch_size=None):
+        return list(face_imgs)
+
+
+def counted(frames, pulled):
+    """Lazy frame iterable that records how many frames were consumed"""
+    for frame in frames:
+        pulled.append(frame)
+        yield frame
+
+
+@pytest.fixture
+def students(rng):
+    return dict(zip(["a", "b", "c", "d", "e"], unit_vectors(rng, 5)))
+
+
+def test_match_embeddings_returns_best_student(rng):
+    vectors = unit_vectors(rng, 10)
+    recognizer = bare_recognizer(EmbeddingGallery.from_dict({f"s{i}": v for i, v in enumerate(vectors)}))
+
+    (student_id, similarity), = recognizer.match_embeddings(vectors[3][None, :])
+
+    assert student_id == "s3"
+    assert similarity == pytest.approx(1.0, abs=1e-5)
+
+
+def test_match_embeddings_without_positive_similarity_is_no_match(rng):
+    vector = unit_vectors(rng, 1)[0]
+    recognizer = bare_recognizer(EmbeddingGallery.from_dict({"s0": vector}))
+
+    assert recognizer.match_embeddings(-vector[None, :]) == [(None, 0.0)]
+    assert recognizer.match_embeddings(-vector[None, :], runner_up=True) == [(None, 0.0, 0.0)]
+
+
+def test_match_embeddings_on_empty_gallery(rng):
+    recognizer = bare_recognizer(EmbeddingGallery())
+
+    assert recognizer.match_embeddings(unit_vectors(rng, 2)) == [(None, 0.0), (None, 0.0)]
+
+
+@pytest.mark.parametrize("successes, trials, expected", [(10, 10, 0.7225), (5, 10, 0.2366), (4, 4, 0.5101), (0, 0, 0.0)])
+def test_wilson_lower_bound_known_values(successes, trials, expected):
+    assert wilson_lower_bound(successes, trials, z=1.96) == pytest.approx(expected, abs=1e-4)
+
+
+def test_wilson_lower_bound_tightens_with_more_trials():
+    bounds = [wilson_lower_bound(n // 2, n) for n in (4, 16, 64, 256)]
+
+    assert bounds == sorted(bounds)
+    assert all(bound < 0.5 for bound in bounds)
+
+
+def test_voting_stops_early_once_leader_clears_threshold(students):
+    recognizer = EmbeddingFramesRecognizer(EmbeddingGallery.from_dict(students))
+    pulled = []
+
+    vote = recognizer.recognize_frames_voting(counted([students["a"]] * 40, pulled),
+                                              min_match_percentage=0.25, chunk_size=4)
+
+    assert len(pulled) == 4  # Wilson bound of 4/4 is 0.51 >= 0.25: no further frame is decoded
+    assert vote["early_exit"] is True
+    assert vote["student_id"] == vote["best_match"] == "a"
+    assert vote["frames_processed"] == 4
+    assert vote["scores"]["a"] == {"votes": 4, "share": 1.0, "lower_bound": 0.5101,
+                                   "mean_similarity": 1.0, "max_similarity": 1.0}
+
+
+def test_voting_does_not_stop_on_split_vote(students):
+    recognizer = EmbeddingFramesRecognizer(EmbeddingGallery.from_dict(students))
+    frames = [students[s] for s in "abcde"] * 4
+    pulled = []
+
+    vote = recognizer.recognize_frames_voting(counted(frames, pulled), min_match_percentage=0.25, chunk_size=4)
+
+    assert len(pulled) == len(frames)
+    assert vote["early_exit"] is False
+    assert vote["student_id"] is None  # Every student won 20% of the frames
+    assert vote["frames_processed"] == 20
+    assert set(vote["scores"]) == set("abcde")
+    for score in vote["scores"].values():
+        assert score["votes"] == 4
+        assert score["share"] == 0.2
+        assert score["lower_bound"] == pytest.approx(wilson_lower_bound(4, 20), abs=1e-4)
+
+
+def test_voting_ignores_unmatched_and_missing_frames(students):
+    recognizer = EmbeddingFramesRecognizer(EmbeddingGallery.from_dict(students))
+    stranger = -students["a"]  # Not similar to anyone above the recognition threshold
+    frames = [students["b"], None, stranger, stranger, stranger, stranger, stranger, stranger]
+
+    vote = recognizer.recognize_frames_voting(frames, min_match_percentage=0.25, chunk_size=4)
+
+    assert vote["frames_processed"] == 7
+    assert vote["early_exit"] is False
+    assert vote["student_id"] is None  # 1 of 7 frames
+    assert vote["best_match"] == "b"
+    assert vote["scores"]["b"]["votes"] == 1
@@ -0,0 +1,193 @@
+"""
+Training job system
+/train no longer blocks the HTTP request: each request becomes a job that runs in the
+background, reports progress, and is persisted to TRAINING_JOBS_DIR so jobs interrupted
+by a restart are resumed (train_from_frames picks up its per-frame embedding cache).
+
+Bulk enrollment (one sub-folder of frames per student, folder name = student ID):
+    python training_jobs.py bulk-enroll /path/to/frames_root
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+TRAINING_JOBS_DIR = "training_jobs"
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+
+class TrainingJob:
+    """One student's enrollment job"""
+
+    def __init__(self, student_id: str, frames_dir: str, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.student_id = student_id
+        self.frames_dir = frames_dir
+        self.status = STATUS_QUEUED
+        self.frames_done = 0
+        self.frames_total = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict:
+        return {
+            "jobId": self.job_id,
+            "studentId": self.student_id,
+            "framesDir": self.frames_dir,
+            "status": self.status,
+            "framesDone": self.frames_done,
+            "framesTotal": self.frames_total,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TrainingJob":
+        job = cls(data["studentId"], data["framesDir"], job_id=data["jobId"])
+        job.status = data.get("status", STATUS_QUEUED)
+        job.frames_done = data.get("framesDone", 0)
+        job.frames_total = data.get("framesTotal", 0)
+        job.error = data.get("error")
+        job.created_at = data.get("createdAt", job.created_at)
+        job.started_at = data.get("startedAt")
+        job.finished_at = data.get("finishedAt")
+        if job.status in (STATUS_SUCCEEDED, STATUS_FAILED):
+            job.done.set()
+        return job
+
+
+class TrainingJobManager:
+    """Queues training jobs and runs them on background threads"""
+
+    def __init__(self, run_job: Callable[[TrainingJob, Callable[[int, int], None]], bool],
+                 jobs_dir: str = TRAINING_JOBS_DIR, concurrency: int = 1):
+        """
+        Args:
+            run_job: Trains one job, calling progress(frames_done, frames_total); returns success
+            jobs_dir: Where job records are persisted
+            concurrency: Jobs running at once (training shares the models with live recognition)
+        """
+        self.run_job = run_job
+        self.jobs_dir = jobs_dir
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._resume_jobs()
+        for i in range(max(1, concurrency)):
+            threading.Thread(target=self._worker, name=f"training-job-{i}", daemon=True).start()
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: TrainingJob):
+        tmp_path = self._job_path(job.job_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, self._job_path(job.job_id))
+
+    def _resume_jobs(self):
+        """Reload persisted jobs; re-queue the ones a restart interrupted"""
+        resumed = 0
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r") as f:
+                    job = TrainingJob.from_dict(json.load(f))
+            except Exception as e:
+                print(f"[Training] Skipping unreadable job record {name}: {e}")
+                continue
+            self._jobs[job.job_id] = job
+            if job.status in (STATUS_QUEUED, STATUS_RUNNING):
+                job.status = STATUS_QUEUED
+                self._queue.put(job)
+                resumed += 1
+        if resumed:
+            print(f"[Training] Resuming {resumed} interrupted job(s)")
+
+    def submit(self, student_id: str, frames_dir: str) -> TrainingJob:
+        job = TrainingJob(student_id, frames_dir)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._save(job)
+        self._queue.put(job)
+        print(f"[Training] Queued job {job.job_id} for student {student_id}")
+        return job
+
+    def bulk_enroll(self, root_dir: str) -> List[TrainingJob]:
+        """Queue one job per sub-folder of root_dir that contains frames (folder name = student ID)"""
+        jobs = []
+        for name in sorted(os.listdir(root_dir)):
+            folder = os.path.join(root_dir, name)
+            if not os.path.isdir(folder):
+                continue
+            if not any(f.lower().endswith(FRAME_EXTENSIONS) for f in os.listdir(folder)):
+                continue
+            jobs.append(self.submit(name, os.path.abspath(folder)))
+        return jobs
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[TrainingJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            job.status = STATUS_RUNNING
+            job.started_at = time.time()
+            self._save(job)
+
+            def progress(done: int, total: int):
+                job.frames_done, job.frames_total = done, total
+
+            try:
+                success = self.run_job(job, progress)
+                job.status = STATUS_SUCCEEDED if success else STATUS_FAILED
+                if not success:
+                    job.error = "Training failed (no faces found or other error)"
+            except Exception as e:
+                job.status = STATUS_FAILED
+                job.error = str(e)
+            job.finished_at = time.time()
+            self._save(job)
+            job.done.set()
+            print(f"[Training] Job {job.job_id} ({job.student_id}) {job.status} "
+                  f"in {job.finished_at - job.started_at:.1f}s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "bulk-enroll":
+        print("Usage: python training_jobs.py bulk-enroll <directory of student frame folders>")
+        sys.exit(1)
+
+    from ai_module_yolo import FaceRecognizer
+
+    recognizer = FaceRecognizer()
+    manager = TrainingJobManager(lambda job, progress: recognizer.train_from_frames(
+        job.frames_dir, job.student_id, progress=progress))
+    jobs = manager.bulk_enroll(sys.argv[2])
+    print(f"[Training] Bulk enrollment: {len(jobs)} student folder(s)")
+    for job in jobs:
+        job.done.wait()
+    succeeded = sum(1 for job in jobs if job.status == STATUS_SUCCEEDED)
+    print(f"[Training] Bulk enrollment finished: {succeeded}/{len(jobs)} students trained")
@@ -0,0 +1,90 @@
+// frameStream.js
+// Client for the AI server's streaming frame transport (ai/frame_stream.py): one long-lived
+// TCP connection per camera, frames pipelined and matched to results by sequence number.
+import net from "net";
+
+const HEADER_SIZE = 14; // type u8, seq u32, length u32, height u16, width u16, channels u8
+const MSG_HELLO = 1;
+const MSG_ENCODED = 2;
+const MSG_RESULT = 4;
+const MSG_ERROR = 5;
+
+function header(type, seq, length) {
+  const buf = Buffer.alloc(HEADER_SIZE);
+  buf.writeUInt8(type, 0);
+  buf.writeUInt32BE(seq, 1);
+  buf.writeUInt32BE(length, 5);
+  return buf; // height/width/channels stay 0 for encoded frames
+}
+
+class FrameStream {
+  constructor(port, host, cameraId) {
+    this.seq = 0;
+    this.pending = new Map(); // seq -> { resolve, reject, timer }
+    this.buffer = Buffer.alloc(0);
+    this.closed = false;
+    this.socket = net.connect({ port, host });
+    this.socket.setNoDelay(true);
+    this.socket.on("data", (chunk) => this.onData(chunk));
+    this.socket.on("error", (err) => this.fail(err));
+    this.socket.on("close", () => this.fail(new Error("Frame stream closed")));
+    if (cameraId) {
+      const hello = Buffer.from(JSON.stringify({ cameraId }));
+      this.socket.write(Buffer.concat([header(MSG_HELLO, 0, hello.length), hello]));
+    }
+  }
+
+  recognize(jpegBuffer, timeoutMs = 30000) {
+    this.seq = (this.seq + 1) >>> 0;
+    const seq = this.seq;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(seq);
+        reject(new Error(`Frame stream timeout after ${timeoutMs} ms`));
+      }, timeoutMs);
+      this.pending.set(seq, { resolve, reject, timer });
+      this.socket.write(header(MSG_ENCODED, seq, jpegBuffer.length));
+      this.socket.write(jpegBuffer);
+    });
+  }
+
+  onData(chunk) {
+    this.buffer = this.buffer.length ? Buffer.concat([this.buffer, chunk]) : chunk;
+    while (this.buffer.length >= HEADER_SIZE) {
+      const type = this.buffer.readUInt8(0);
+      const seq = this.buffer.readUInt32BE(1);
+      const length = this.buffer.readUInt32BE(5);
+      if (this.buffer.length < HEADER_SIZE + length) return;
+      const body = JSON.parse(this.buffer.subarray(HEADER_SIZE, HEADER_SIZE + length).toString("utf8"));
+      this.buffer = this.buffer.subarray(HEADER_SIZE + length);
+      const waiter = this.pending.get(seq);
+      if (!waiter) continue;
+      this.pending.delete(seq);
+      clearTimeout(waiter.timer);
+      if (type === MSG_RESULT) waiter.resolve(body);
+      else waiter.reject(new Error(type === MSG_ERROR ? body.error : `Unexpected message type ${type}`));
+    }
+  }
+
+  fail(err) {
+    this.closed = true;
+    for (const { reject, timer } of this.pending.values()) {
+      clearTimeout(timer);
+      reject(err);
+    }
+    this.pending.clear();
+  }
+}
+
+const streams = new Map(); // cameraId -> FrameStream
+
+// Result of one frame, shaped like the /recognize-live response ({ results, recognized, count })
+export function recognizeOverStream(jpegBuffer, cameraId, { port, host = "127.0.0.1", timeoutMs } = {}) {
+  const key = cameraId || "";
+  let stream = streams.get(key);
+  if (!stream || stream.closed) {
+    stream = new FrameStream(port, host, cameraId);
+    streams.set(key, stream);
+  }
+  return stream.recognize(jpegBuffer, timeoutMs);
+}
@@ -10,6 +10,7 @@ import path from "path";
 import ffmpeg from "fluent-ffmpeg";
 import ffmpegPath from "ffmpeg-static";
 import FormData from "form-data";
+import { recognizeOverStream } from "./frameStream.js";
 
 import Student from "./models/Student.js";
 import Attendance from "./models/Attendance.js";
@@ -274,9 +275,10 @@ app.post("/api/students/register", upload.single("video"), async (req, res) => {
           timeout: 300000, // 5 minutes timeout for training (YOLOv8-face + ArcFace can be slow)
         },
       )
-      .then(() => {
+      .then((response) => {
+        // The AI server queues training and answers 202 with a jobId (poll GET /train/:jobId)
         console.log(
-          `✅ AI training completed for student: ${student.name} (${student._id})`,
+          `✅ AI training queued for student: ${student.name} (${student._id}), job ${response.data.jobId}`,
         );
       })
       .catch((err) => {
@@ -1099,14 +1101,22 @@ app.post("/api/attendance/recognize-live", authenticate, async (req, res) => {
     // Send to Flask AI
     // Increased timeout to 30 seconds - YOLOv8-face + ArcFace recognition can take time
     // First inference may take longer as models load into memory
-    const aiRes = await axios.post(
-      "http://127.0.0.1:8000/recognize-live",
-      formData,
-      {
-        headers: formData.getHeaders(),
-        timeout: 30000, // 30 second timeout (increased from 5s for YOLOv8-face + ArcFace)
-      },
-    );
+    // With AI_STREAM_PORT set, frames go over one persistent connection per camera instead
+    const aiRes = process.env.AI_STREAM_PORT
+      ? {
+          data: await recognizeOverStream(buffer, req.body.cameraId, {
+            port: Number(process.env.AI_STREAM_PORT),
+            timeoutMs: 30000,
+          }),
+        }
+      : await axios.post(
+          "http://127.0.0.1:8000/recognize-live",
+          formData,
+          {
+            headers: formData.getHeaders(),
+            timeout: 30000, // 30 second timeout (increased from 5s for YOLOv8-face + ArcFace)
+          },
+        );
 
     console.log(`[Backend] AI Server returned ${aiRes.data.count || 0} results`);
 